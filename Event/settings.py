@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "event.metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -91,6 +92,15 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default=""),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -138,7 +148,110 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"]
 }
+# Server-Timing headers and the /metrics endpoint (see event.metrics)
+EVENT_METRICS_ENABLED = config("EVENT_METRICS_ENABLED", default=False, cast=bool)
+EVENT_LIST_PAGE_SIZE = config("EVENT_LIST_PAGE_SIZE", default=20, cast=int)
+EVENT_LIST_MAX_PAGE_SIZE = config("EVENT_LIST_MAX_PAGE_SIZE", default=100, cast=int)
+EVENT_REPRESENTATION_CACHE_TTL = config(
+    "EVENT_REPRESENTATION_CACHE_TTL", default=60 * 60, cast=int
+)
+# Largest batch of events created or changed by one bulk request
+EVENT_BULK_MAX_EVENTS = config("EVENT_BULK_MAX_EVENTS", default=500, cast=int)
+# Rows fetched per round trip by the streaming exports
+EVENT_EXPORT_CHUNK_SIZE = config("EVENT_EXPORT_CHUNK_SIZE", default=2000, cast=int)
+EVENT_NEARBY_DEFAULT_LIMIT = config("EVENT_NEARBY_DEFAULT_LIMIT", default=20, cast=int)
+EVENT_NEARBY_MAX_LIMIT = config("EVENT_NEARBY_MAX_LIMIT", default=100, cast=int)
+EVENT_NEARBY_INITIAL_RADIUS_KM = config(
+    "EVENT_NEARBY_INITIAL_RADIUS_KM", default=5, cast=float
+)
+EVENT_NEARBY_MAX_RADIUS_KM = config(
+    "EVENT_NEARBY_MAX_RADIUS_KM", default=1000, cast=float
+)
 GOOGLE_DIRECTION_SECRET_KEY = config("GOOGLE_DIRECTION_SECRET_KEY")
+GOOGLE_MAPS_API_URL = config(
+    "GOOGLE_MAPS_API_URL", default="https://maps.googleapis.com/maps/api"
+)
+GOOGLE_MAPS_CONNECT_TIMEOUT = config(
+    "GOOGLE_MAPS_CONNECT_TIMEOUT", default=3.05, cast=float
+)
+GOOGLE_MAPS_READ_TIMEOUT = config("GOOGLE_MAPS_READ_TIMEOUT", default=10, cast=float)
+GOOGLE_MAPS_RETRIES = config("GOOGLE_MAPS_RETRIES", default=2, cast=int)
+GOOGLE_MAPS_BACKOFF = config("GOOGLE_MAPS_BACKOFF", default=0.2, cast=float)
+GOOGLE_MAPS_BREAKER_THRESHOLD = config(
+    "GOOGLE_MAPS_BREAKER_THRESHOLD", default=5, cast=int
+)
+GOOGLE_MAPS_BREAKER_RESET = config("GOOGLE_MAPS_BREAKER_RESET", default=30, cast=float)
+GOOGLE_MAPS_POOL_SIZE = config("GOOGLE_MAPS_POOL_SIZE", default=20, cast=int)
+GOOGLE_DIRECTION_CACHE_SIZE = config(
+    "GOOGLE_DIRECTION_CACHE_SIZE", default=4096, cast=int
+)
+GOOGLE_DIRECTION_CACHE_TTL = config(
+    "GOOGLE_DIRECTION_CACHE_TTL", default=60 * 15, cast=int
+)
+GOOGLE_DIRECTION_NEGATIVE_CACHE_TTL = config(
+    "GOOGLE_DIRECTION_NEGATIVE_CACHE_TTL", default=60, cast=int
+)
+# Size in degrees of the grid direction origins are snapped to (~110m)
+GOOGLE_DIRECTION_ORIGIN_GRID = config(
+    "GOOGLE_DIRECTION_ORIGIN_GRID", default=0.001, cast=float
+)
+GOOGLE_DIRECTION_BATCH_MAX = config("GOOGLE_DIRECTION_BATCH_MAX", default=500, cast=int)
+GOOGLE_DIRECTION_BATCH_WORKERS = config(
+    "GOOGLE_DIRECTION_BATCH_WORKERS", default=8, cast=int
+)
+GOOGLE_GEOCODE_CACHE_SIZE = config("GOOGLE_GEOCODE_CACHE_SIZE", default=1024, cast=int)
+GOOGLE_GEOCODE_CACHE_TTL = config(
+    "GOOGLE_GEOCODE_CACHE_TTL", default=60 * 60 * 24 * 7, cast=int
+)
+GOOGLE_GEOCODE_NEGATIVE_CACHE_TTL = config(
+    "GOOGLE_GEOCODE_NEGATIVE_CACHE_TTL", default=60 * 10, cast=int
+)
+# Background jobs (see event.jobs)
+JOB_WORKERS = config("JOB_WORKERS", default=4, cast=int)
+JOB_MAX_ATTEMPTS = config("JOB_MAX_ATTEMPTS", default=5, cast=int)
+JOB_RETRY_BACKOFF = config("JOB_RETRY_BACKOFF", default=30, cast=float)
+JOB_RETRY_BACKOFF_MAX = config("JOB_RETRY_BACKOFF_MAX", default=60 * 60, cast=float)
+# Running jobs not finished after this many seconds are assumed to be orphaned
+JOB_STALE_AFTER = config("JOB_STALE_AFTER", default=60 * 10, cast=int)
+# Publish date driven status changes (see event.scheduler)
+EVENT_SCHEDULER_BATCH_SIZE = config("EVENT_SCHEDULER_BATCH_SIZE", default=500, cast=int)
+EVENT_SCHEDULER_LOOKAHEAD = config("EVENT_SCHEDULER_LOOKAHEAD", default=1000, cast=int)
+# Seconds between reloads of the upcoming transitions, the longest a new or
+# edited event can wait past its date
+EVENT_SCHEDULER_REFRESH_INTERVAL = config(
+    "EVENT_SCHEDULER_REFRESH_INTERVAL", default=60, cast=float
+)
+# Google Calendar (see event.googleapi.calendar)
+GOOGLE_CALENDAR_API_URL = config(
+    "GOOGLE_CALENDAR_API_URL", default="https://www.googleapis.com/calendar/v3/"
+)
+GOOGLE_CALENDAR_TIMEOUT = config("GOOGLE_CALENDAR_TIMEOUT", default=10, cast=float)
+# Clients kept per thread, one per set of credentials
+GOOGLE_CALENDAR_CLIENT_CACHE_SIZE = config(
+    "GOOGLE_CALENDAR_CLIENT_CACHE_SIZE", default=128, cast=int
+)
+GOOGLE_CALENDAR_BATCH_URL = config(
+    "GOOGLE_CALENDAR_BATCH_URL", default="https://www.googleapis.com/batch/calendar/v3"
+)
+# Calls per batch request; Google caps Calendar batches at 50
+GOOGLE_CALENDAR_BATCH_SIZE = config("GOOGLE_CALENDAR_BATCH_SIZE", default=50, cast=int)
+# Calendar calls per second, per process
+GOOGLE_CALENDAR_RATE_LIMIT = config(
+    "GOOGLE_CALENDAR_RATE_LIMIT", default=25, cast=float
+)
+# Jobs sharing the calendar sync of one event (see event.calendar_sync)
+GOOGLE_CALENDAR_SYNC_JOBS = config("GOOGLE_CALENDAR_SYNC_JOBS", default=4, cast=int)
+# Seconds after which entries claimed by a sync job that died are synced again
+GOOGLE_CALENDAR_SYNC_STALE_AFTER = config(
+    "GOOGLE_CALENDAR_SYNC_STALE_AFTER", default=60 * 5, cast=int
+)
+# OAuth tokens (see event.googleapi.tokens)
+GOOGLE_TOKEN_CACHE_SIZE = config("GOOGLE_TOKEN_CACHE_SIZE", default=1024, cast=int)
+GOOGLE_TOKEN_CACHE_TTL = config("GOOGLE_TOKEN_CACHE_TTL", default=60 * 5, cast=int)
+# Tokens are renewed this many seconds before they expire
+GOOGLE_TOKEN_REFRESH_MARGIN = config(
+    "GOOGLE_TOKEN_REFRESH_MARGIN", default=60 * 10, cast=int
+)
 CLIENT_ID = config("GOOGLE_OUTH_CLIENT_ID")
 CLIENT_SECRET = config("GOOGLE_OUTH_CLIENT_SECRET")
 TOKEN_ENDPOINT = config("GOOGLE_OAUTH2_TOKEN_ENDPOINT")
@@ -18,11 +18,13 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from event.metrics import metrics_view
 from event.views import Home_View
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/v1/", include("event.urls")),
+    path("metrics", metrics_view, name="metrics"),
     path("", Home_View.as_view(), name="home"),
 ]
 
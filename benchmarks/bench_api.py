@@ -0,0 +1,273 @@
+"""Load test of the event API, reported as JSON to diff between commits.
+
+Seeds a throwaway test database (see ``manage.py seed_events``) and drives
+list, retrieve, filter, reserve (sequential and concurrent on one event),
+direction and create through the full Django stack in process, with Google
+Maps replaced by a local stub. For every endpoint it reports throughput,
+latency percentiles and queries per request.
+
+    python -m benchmarks.bench_api --events 5000 --requests 300 --output a.json
+    python -m benchmarks.compare a.json b.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+from pathlib import Path
+
+from benchmarks.utils import setup_django, summarize, timer
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def image_file():
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+
+    image = BytesIO()
+    Image.new("RGB", (1, 1)).save(image, "PNG")
+    return SimpleUploadedFile("event.png", image.getvalue(), content_type="image/png")
+
+
+def measure(call, requests):
+    """Run ``call(index)`` ``requests`` times, one after the other."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    samples, queries, failures = [], [], 0
+    start = time.perf_counter()
+    for index in range(requests):
+        with CaptureQueriesContext(connection) as captured, timer(samples):
+            response = call(index)
+        queries.append(len(captured))
+        failures += response.status_code >= 400
+    elapsed = time.perf_counter() - start
+    return report(requests, elapsed, samples, queries, failures)
+
+
+def measure_concurrently(call, requests, concurrency):
+    """Run ``call(index)`` ``requests`` times from ``concurrency`` threads."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    samples, queries, failures = [], [], []
+    indices = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    index = next(indices, None)
+                if index is None:
+                    return
+                with CaptureQueriesContext(connection) as captured, timer(samples):
+                    response = call(index)
+                queries.append(len(captured))
+                failures.append(response.status_code >= 400)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        **report(requests, elapsed, samples, queries, sum(failures)),
+        "concurrency": concurrency,
+    }
+
+
+def report(requests, elapsed, samples, queries, failures):
+    return {
+        "requests": requests,
+        "failures": failures,
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency": summarize(samples),
+        "queries_per_request": {
+            "mean": round(sum(queries) / len(queries), 2),
+            "max": max(queries),
+        },
+    }
+
+
+def run(events, requests, concurrency, attendees):
+    from django.core.cache import cache
+    from django.test import override_settings
+    from django.urls import reverse
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+
+    from event.googleapi.stub import GoogleMapsStub
+    from event.googleapi.transport import reset_transport
+    from event.models import Event, EventLocationType, EventPaymentType, EventStatus
+    from event.seed import seed_events
+
+    uuids = seed_events(
+        events, onsite_ratio=0.5, max_attendees=attendees, batch_size=1000
+    )
+    rng = random.Random(7)
+    client = APIClient()
+    results = {}
+
+    results["list"] = measure(lambda i: client.get(reverse("event-list")), requests)
+
+    def list_uncached(index):
+        cache.clear()
+        return client.get(reverse("event-list"))
+
+    results["list_uncached"] = measure(list_uncached, requests)
+    results["retrieve"] = measure(
+        lambda i: client.get(reverse("event-detail", args=[rng.choice(uuids)])),
+        requests,
+    )
+    results["filter"] = measure(
+        lambda i: client.get(
+            reverse("event-list"),
+            {"event_status": EventStatus.OPEN, "event_payment_type": "free"},
+        ),
+        requests,
+    )
+
+    bookable = list(
+        Event.objects.filter(
+            event_status=EventStatus.OPEN,
+            event_payment_type=EventPaymentType.FREE,
+            event_max_participant_num__isnull=True,
+        ).values_list("event_uuid", flat=True)[:100]
+    )
+    results["reserve"] = measure(
+        lambda i: client.post(
+            reverse("event-reserve", args=[rng.choice(bookable)]),
+            {"attendee_email": f"bench{i}@example.com"},
+        ),
+        requests,
+    )
+
+    capacity = requests // 2
+    now = timezone.now()
+    crowded = Event.objects.create(
+        event_name="Crowded",
+        event_location_type=EventLocationType.VIRTUAL,
+        event_url_link="https://meet.google.com/abc",
+        event_published_date=now,
+        event_publish_end_date=now + timedelta(days=1),
+        event_status=EventStatus.OPEN,
+        event_max_participant_num=capacity,
+    )
+    crowded_url = reverse("event-reserve", args=[crowded.event_uuid])
+    results["reserve_concurrent"] = measure_concurrently(
+        lambda i: APIClient().post(
+            crowded_url, {"attendee_email": f"crowd{i}@example.com"}
+        ),
+        requests,
+        concurrency,
+    )
+    crowded.refresh_from_db()
+    results["reserve_concurrent"].update(
+        capacity=capacity,
+        booked=crowded.bookings.count(),
+        seats_taken=crowded.event_seats_taken,
+    )
+
+    onsite = list(
+        Event.objects.filter(event_location_type=EventLocationType.ONSITE).values_list(
+            "event_uuid", flat=True
+        )[:100]
+    )
+    with GoogleMapsStub() as stub:
+        with override_settings(
+            GOOGLE_MAPS_API_URL=stub.url, MEDIA_ROOT=tempfile.mkdtemp()
+        ):
+            reset_transport()
+            # Distinct origins, so every request goes out to the stub.
+            results["direction"] = measure(
+                lambda i: client.post(
+                    reverse("event-direction", args=[rng.choice(onsite)]),
+                    {
+                        "start_location_latitude": 6.5 + i * 0.01,
+                        "start_location_lognitude": 3.37,
+                    },
+                ),
+                requests,
+            )
+            results["create"] = measure(
+                lambda i: client.post(
+                    reverse("event-list"),
+                    {
+                        "event_name": f"Created {i}",
+                        "event_image": image_file(),
+                        "event_location_type": EventLocationType.ONSITE,
+                        "event_address": f"{i} Created Street, Lagos",
+                        "event_published_date": now.isoformat(),
+                        "event_publish_end_date": (now + timedelta(days=1)).isoformat(),
+                    },
+                ),
+                requests,
+            )
+            results["google_requests"] = len(stub.requests)
+            reset_transport()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--attendees", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", help="Write the report to this file")
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        endpoints = run(args.events, args.requests, args.concurrency, args.attendees)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            **vars(args),
+        },
+        "endpoints": endpoints,
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
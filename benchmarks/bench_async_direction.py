@@ -0,0 +1,165 @@
+"""Direction endpoint throughput: ASGI (uvicorn, async view) vs threaded WSGI.
+
+Both servers talk to a local Google Maps stub that answers after
+``--upstream-latency`` seconds, with the direction cache disabled, so the
+numbers show how many slow upstream calls each deployment keeps in flight.
+Uses the database configured in ``.env`` and removes its event afterwards.
+
+    python -m benchmarks.bench_async_direction --requests 500 --concurrency 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.utils import setup_django, summarize
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def start_server(command, env):
+    return subprocess.Popen(
+        [sys.executable, "-m", *command],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def drive(url, requests, concurrency):
+    samples, failures = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+
+        async def one(index):
+            nonlocal failures
+            # A distinct origin per request so nothing is served from cache.
+            origin = {
+                "start_location_latitude": 6.5 + index * 0.01,
+                "start_location_lognitude": 3.37,
+            }
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(url, json=origin)
+                samples.append(time.perf_counter() - start)
+                failures += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "throughput_rps": round(requests / elapsed, 2),
+        "failures": failures,
+        "latency": summarize(samples),
+    }
+
+
+def run(requests, concurrency, threads, upstream_latency):
+    from event.googleapi.stub import GoogleMapsStub
+    from event.models import Event, EventLocationType
+
+    event = Event.objects.create(
+        event_name="Benchmark",
+        event_location_type=EventLocationType.ONSITE,
+        event_address="1 Marina Road, Lagos",
+        event_location_latitude=6.45,
+        event_location_lognitude=3.4,
+    )
+    stub = GoogleMapsStub(delay=upstream_latency).start()
+    env = dict(
+        os.environ,
+        GOOGLE_MAPS_API_URL=stub.url,
+        GOOGLE_DIRECTION_CACHE_TTL="0",
+        GOOGLE_DIRECTION_NEGATIVE_CACHE_TTL="0",
+        GOOGLE_MAPS_POOL_SIZE=str(concurrency),
+    )
+    asgi_port, wsgi_port = free_port(), free_port()
+    servers = [
+        start_server(
+            [
+                "uvicorn",
+                "Event.asgi:application",
+                "--port",
+                str(asgi_port),
+                "--log-level",
+                "warning",
+            ],
+            env,
+        ),
+        start_server(
+            [
+                "benchmarks.wsgi_server",
+                "--port",
+                str(wsgi_port),
+                "--threads",
+                str(threads),
+            ],
+            env,
+        ),
+    ]
+    try:
+        wait_for_port(asgi_port)
+        wait_for_port(wsgi_port)
+        asgi_url = f"http://127.0.0.1:{asgi_port}/api/v1/async/events/{event.event_uuid}/direction/"
+        wsgi_url = (
+            f"http://127.0.0.1:{wsgi_port}/api/v1/events/{event.event_uuid}/direction/"
+        )
+        return {
+            "requests": requests,
+            "concurrency": concurrency,
+            "upstream_latency_s": upstream_latency,
+            "asgi": asyncio.run(drive(asgi_url, requests, concurrency)),
+            f"wsgi_{threads}_threads": asyncio.run(
+                drive(wsgi_url, requests, concurrency)
+            ),
+        }
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+        stub.stop()
+        event.delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=8, help="WSGI worker threads")
+    parser.add_argument("--upstream-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_django()
+    result = run(args.requests, args.concurrency, args.threads, args.upstream_latency)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
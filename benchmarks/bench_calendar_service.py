@@ -0,0 +1,88 @@
+"""Per-call overhead of creating Google Calendar events, against a local stub.
+
+``build`` is what the views used to do: ``googleapiclient.discovery.build()``
+and a fresh ``httplib2.Http`` for every event. ``cached`` goes through
+``calendar_client()``, which reuses the parsed discovery document, the
+resource and the connection. ``--setup-only`` leaves out the insert itself to
+show just the client construction.
+
+    python -m benchmarks.bench_calendar_service --requests 500
+"""
+import argparse
+import json
+
+from benchmarks.utils import setup_django, summarize, timer
+
+EVENT = {
+    "summary": "Benchmark",
+    "start": {"dateTime": "2022-10-01T09:00:00", "timeZone": "Africa/Lagos"},
+    "end": {"dateTime": "2022-10-01T17:00:00", "timeZone": "Africa/Lagos"},
+}
+
+
+def credentials():
+    from google.oauth2.credentials import Credentials
+
+    return Credentials(token="access", refresh_token="refresh", client_id="client")
+
+
+def build_per_call(api_url, setup_only):
+    from googleapiclient.discovery import build
+
+    service = build(
+        "calendar",
+        "v3",
+        credentials=credentials(),
+        client_options={"api_endpoint": api_url},
+    )
+    if not setup_only:
+        service.events().insert(calendarId="primary", body=EVENT).execute()
+
+
+def cached(api_url, setup_only):
+    from event.googleapi.calendar import calendar_client
+
+    client = calendar_client(credentials())
+    if not setup_only:
+        client.insert_event(EVENT)
+
+
+def run(requests, delay, setup_only):
+    from django.conf import settings
+
+    from event.googleapi.calendar import reset_calendar_clients
+    from event.googleapi.stub import GoogleCalendarStub
+
+    results = {"requests": requests, "stub_delay_ms": delay * 1000}
+    with GoogleCalendarStub(delay=delay) as stub:
+        settings.GOOGLE_CALENDAR_API_URL = stub.api_url
+        reset_calendar_clients()
+        for name, call in [("build", build_per_call), ("cached", cached)]:
+            start = len(stub.requests)
+            samples = []
+            for _ in range(requests):
+                with timer(samples):
+                    call(stub.api_url, setup_only)
+            served = stub.requests[start:]
+            results[name] = {
+                "latency": summarize(samples),
+                "connections": len({address for _, _, address in served}),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument(
+        "--delay", type=float, default=0, help="seconds the stub waits per call"
+    )
+    parser.add_argument("--setup-only", action="store_true")
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.requests, args.delay, args.setup_only), indent=2))
+
+
+if __name__ == "__main__":
+    main()
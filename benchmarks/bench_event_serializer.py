@@ -0,0 +1,78 @@
+"""Latency of serializing an event listing over many requests in one process.
+
+The listing used to append to ``EventReadSerializer.Meta.fields`` on every
+request, so latency and memory crept up for the life of a worker. This runs the
+same listing repeatedly and compares the first and last windows of requests;
+they should stay flat.
+
+    python -m benchmarks.bench_event_serializer --requests 10000 --events 20
+"""
+import argparse
+import json
+
+from benchmarks.utils import setup_django, summarize, timer
+
+
+def build_events(count):
+    from event.models import Event, EventLocationType
+
+    events = []
+    for index in range(count):
+        if index % 2:
+            events.append(
+                Event(
+                    id=index,
+                    event_name=f"Virtual {index}",
+                    event_location_type=EventLocationType.VIRTUAL,
+                    event_url_link="https://meet.google.com/abc",
+                )
+            )
+        else:
+            events.append(
+                Event(
+                    id=index,
+                    event_name=f"Onsite {index}",
+                    event_location_type=EventLocationType.ONSITE,
+                    event_address="1 Marina Road, Lagos",
+                    event_location_latitude=6.45,
+                    event_location_lognitude=3.4,
+                )
+            )
+    return events
+
+
+def run(requests, events, window):
+    from rest_framework.test import APIRequestFactory
+
+    from event.serializers import EventReadSerializer
+
+    request = APIRequestFactory().get("/api/v1/events/")
+    listing = build_events(events)
+
+    samples = []
+    for _ in range(requests):
+        with timer(samples):
+            EventReadSerializer(listing, many=True, context={"request": request}).data
+
+    return {
+        "requests": requests,
+        "events_per_request": events,
+        "meta_fields": len(EventReadSerializer.Meta.fields),
+        "first_window": summarize(samples[:window]),
+        "last_window": summarize(samples[-window:]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--window", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.requests, args.events, args.window), indent=2))
+
+
+if __name__ == "__main__":
+    main()
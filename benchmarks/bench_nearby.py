@@ -0,0 +1,106 @@
+"""Latency of the nearby events search over a large table.
+
+Seeds a throwaway test database with events scattered around a few cities
+and times ``nearby_events()`` for radius and k-nearest searches, alongside
+the full scan it replaces.
+
+    python -m benchmarks.bench_nearby --events 1000000 --queries 200
+"""
+import argparse
+import json
+import random
+
+from benchmarks.utils import setup_django, summarize, timer
+
+CITIES = [(6.45, 3.40), (51.51, -0.13), (40.71, -74.01), (-33.87, 151.21)]
+
+
+def seed(count, batch_size=5000):
+    from event import geohash
+    from event.models import Event, EventLocationType
+
+    rng = random.Random(42)
+    for start in range(0, count, batch_size):
+        events = []
+        for _ in range(min(batch_size, count - start)):
+            city_lat, city_lng = rng.choice(CITIES)
+            lat = round(city_lat + rng.gauss(0, 1.5), 6)
+            lng = round(city_lng + rng.gauss(0, 1.5), 6)
+            events.append(
+                Event(
+                    event_name="Onsite",
+                    event_location_type=EventLocationType.ONSITE,
+                    event_address="Somewhere",
+                    event_location_latitude=lat,
+                    event_location_lognitude=lng,
+                    event_geohash=geohash.encode(lat, lng),
+                )
+            )
+        Event.objects.bulk_create(events)
+
+
+def run(events, queries, radius):
+    from django.db import connection
+
+    from event.geohash import haversine_km
+    from event.models import Event
+    from event.nearby import nearby_events
+
+    seed(events)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE event_event")
+
+    rng = random.Random(7)
+    points = [
+        (lat + rng.uniform(-1, 1), lng + rng.uniform(-1, 1))
+        for lat, lng in (rng.choice(CITIES) for _ in range(queries))
+    ]
+    queryset = Event.objects.all()
+
+    within_radius, k_nearest = [], []
+    for lat, lng in points:
+        with timer(within_radius):
+            nearby_events(queryset, lat, lng, radius_km=radius, limit=20)
+        with timer(k_nearest):
+            nearby_events(queryset, lat, lng, limit=20)
+
+    full_scan = []
+    for lat, lng in points[:5]:
+        with timer(full_scan):
+            located = queryset.values_list(
+                "event_location_latitude", "event_location_lognitude"
+            )
+            sorted(
+                (haversine_km(lat, lng, *location) for location in located.iterator())
+            )[:20]
+
+    return {
+        "events": events,
+        "radius_km": radius,
+        "within_radius": summarize(within_radius),
+        "k_nearest": summarize(k_nearest),
+        "full_scan": summarize(full_scan),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        result = run(args.events, args.queries, args.radius)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Compare two ``bench_api`` reports, endpoint by endpoint.
+
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+from pathlib import Path
+
+METRICS = [
+    ("throughput_rps", lambda result: result["throughput_rps"]),
+    ("p50_ms", lambda result: result["latency"]["p50_ms"]),
+    ("p99_ms", lambda result: result["latency"]["p99_ms"]),
+    ("queries", lambda result: result["queries_per_request"]["mean"]),
+]
+
+
+def change(before, after):
+    if not before:
+        return ""
+    return f"{(after - before) / before:+.1%}"
+
+
+def compare(before, after):
+    lines = [f"{before['meta']['commit']} -> {after['meta']['commit']}"]
+    for name, result in after["endpoints"].items():
+        previous = before["endpoints"].get(name)
+        if not isinstance(result, dict) or not isinstance(previous, dict):
+            continue
+        lines.append(name)
+        for metric, value in METRICS:
+            old, new = value(previous), value(result)
+            lines.append(f"  {metric:<16}{old:>12}{new:>12}  {change(old, new)}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    before, after = (
+        json.loads(Path(path).read_text()) for path in (args.before, args.after)
+    )
+    print(compare(before, after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import os
+import sys
+from pathlib import Path
+
+from event.timing import percentile, summarize, timer  # noqa: F401
+
+
+def setup_django():
+    """Make the project importable and configure Django for a standalone run."""
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Event.settings")
+
+    import django
+
+    django.setup()
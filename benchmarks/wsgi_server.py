@@ -0,0 +1,52 @@
+"""Minimal WSGI server with a fixed pool of worker threads.
+
+Stands in for a threaded WSGI deployment (one thread per in-flight request)
+when comparing against the ASGI entry point.
+
+    python -m benchmarks.wsgi_server --port 8001 --threads 8
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    def __init__(self, server_address, handler_class, threads) -> None:
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    from benchmarks.utils import setup_django
+
+    setup_django()
+    from django.core.wsgi import get_wsgi_application
+
+    server = PooledWSGIServer(("127.0.0.1", args.port), QuietHandler, args.threads)
+    server.set_app(get_wsgi_application())
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 from django.contrib import admin
 
-from event.models import Event
+from event.models import Booking, Event, Job
 
 # Register your models here.
 
 admin.site.register(Event)
+admin.site.register(Booking)
+admin.site.register(Job)
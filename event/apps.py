@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EventConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "event"
+
+    def ready(self):
+        # Register the background job handlers.
+        from event import tasks  # noqa: F401
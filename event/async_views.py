@@ -0,0 +1,81 @@
+"""Async variants of the event views.
+
+Under ASGI these keep upstream calls on the event loop instead of holding a
+worker thread per request. DRF views are sync only, so these are plain Django
+async views that reuse the same serializers.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from event.models import Event, EventLocationType
+from event.serializers import AsyncOnSiteEventDirectionSerializer, EventCreateSerializer
+
+
+def get_request_data(request):
+    if request.content_type == "application/json":
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError:
+            raise ValidationError({"error": "Malformed JSON"})
+    data = request.POST.copy()
+    data.update(request.FILES)
+    return data
+
+
+def api_response(data, status=status.HTTP_200_OK):
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder, safe=False)
+
+
+async def event_direction(request, event_uuid):
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    try:
+        event = await Event.objects.aget(event_uuid=event_uuid)
+    except Event.DoesNotExist:
+        raise Http404
+
+    if event.event_location_type != EventLocationType.ONSITE:
+        return api_response(
+            {
+                "direction": f"Download Google Meet or Access it via Gmail and Join via {event.event_url_link}"
+            }
+        )
+
+    try:
+        serializer = AsyncOnSiteEventDirectionSerializer(
+            data=get_request_data(request), context={"event": event}
+        )
+        serializer.is_valid(raise_exception=True)
+        data = await serializer.aget_direction()
+    except APIException as exc:
+        return api_response(exc.detail, status=exc.status_code)
+    return api_response(data)
+
+
+async def event_create(request):
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    try:
+        serializer = EventCreateSerializer(
+            data=get_request_data(request), context={"request": request}
+        )
+        # Field validation can hit the database (e.g. the owner lookup).
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+    except APIException as exc:
+        return api_response(exc.detail, status=exc.status_code)
+
+    await sync_to_async(serializer.save)()
+    data = await sync_to_async(lambda: serializer.data)()
+    return api_response(data, status=status.HTTP_201_CREATED)
+
+
+# These are API endpoints, like the DRF views they sit next to.
+event_direction.csrf_exempt = True
+event_create.csrf_exempt = True
@@ -0,0 +1,61 @@
+"""Serialized event representations, cached per event version.
+
+Entries are keyed by the event id and its ``updated_at``, which every write
+bumps, so a changed event is never served from an old entry. ``Event.save()``
+and ``Event.reserve_space()`` also delete the entry of the version they
+replace so it does not sit in the cache until it expires, bulk updates do the
+same with ``invalidate_representations()``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+# Bump when the cached representation changes shape.
+REPRESENTATION_VERSION = 2
+
+
+def representation_key(event_id, updated_at) -> str:
+    version = int(updated_at.timestamp() * 1_000_000)
+    return f"event:repr:{REPRESENTATION_VERSION}:{event_id}:{version}"
+
+
+def is_cacheable(event) -> bool:
+    return event.pk is not None and event.updated_at is not None
+
+
+def get_representations(events) -> dict:
+    """Cached representations of ``events``, by event id."""
+    keys = {
+        representation_key(event.pk, event.updated_at): event.pk
+        for event in events
+        if is_cacheable(event)
+    }
+    if not keys:
+        return {}
+    return {keys[key]: data for key, data in cache.get_many(keys).items()}
+
+
+def set_representations(events, representations) -> None:
+    cache.set_many(
+        {
+            representation_key(event.pk, event.updated_at): representations[event.pk]
+            for event in events
+            if is_cacheable(event)
+        },
+        settings.EVENT_REPRESENTATION_CACHE_TTL,
+    )
+
+
+def invalidate_representation(event_id, updated_at) -> None:
+    if event_id is not None and updated_at is not None:
+        cache.delete(representation_key(event_id, updated_at))
+
+
+def invalidate_representations(versions) -> None:
+    """Drop the entries of ``(event_id, updated_at)`` pairs replaced in bulk."""
+    keys = [
+        representation_key(event_id, updated_at)
+        for event_id, updated_at in versions
+        if updated_at is not None
+    ]
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,331 @@
+"""Copy events to their attendees' Google Calendars.
+
+``request_sync(event)`` marks a pending ``CalendarEntry`` for every attendee
+who granted calendar access and queues up to ``GOOGLE_CALENDAR_SYNC_JOBS``
+``sync_event_calendar`` jobs, so several job workers share a big event.
+Events are synced when they are published or opened, singly, in bulk or by
+the scheduler, and when their calendar fields change.
+
+Each job claims ``GOOGLE_CALENDAR_BATCH_SIZE`` pending entries at a time with
+``SELECT ... FOR UPDATE SKIP LOCKED`` and marks them syncing, then creates or
+updates them with one batch request and saves the outcome, each step in its
+own short transaction. The entries are the progress: a job that dies leaves
+the rest of its work pending for its retry, and the entries it was syncing
+are handed back after ``GOOGLE_CALENDAR_SYNC_STALE_AFTER`` seconds. Calls are
+rate limited per process by ``GOOGLE_CALENDAR_RATE_LIMIT``.
+"""
+import logging
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from google.auth.exceptions import RefreshError
+
+from event.exceptions import GoogleAPIUnavailable
+from event.googleapi.calendar import CalendarBatch, event_create_schema, has_schedule
+from event.googleapi.tokens import GOOGLE, token_store
+from event.googleapi.transport import RETRY_STATUSES
+from event.jobs import enqueue_many
+from event.metrics import registry
+from event.models import (
+    Booking,
+    CalendarEntry,
+    CalendarEntryStatus,
+    Event,
+    EventTransition,
+    OuthTokenModel,
+)
+
+logger = logging.getLogger(__name__)
+
+SYNC_EVENT_CALENDAR = "sync_event_calendar"
+# Bulk transitions after which the events are synced.
+SYNC_TRANSITIONS = (EventTransition.PUBLISH, EventTransition.OPEN)
+
+
+def attendees_with_access(events):
+    """``(event_id, email)`` of the attendees of ``events`` with a Google token."""
+    granted = OuthTokenModel.objects.filter(token_provider=GOOGLE).values("token_owner")
+    return Booking.objects.filter(
+        event__in=events, attendee_email__in=granted
+    ).values_list("event_id", "attendee_email")
+
+
+def request_sync(event) -> int:
+    """Queue the (re)sync of every attendee's calendar entry for ``event``.
+
+    Returns the number of entries left to sync.
+    """
+    return request_sync_many(Event.objects.filter(pk=event.pk)).get(event.pk, 0)
+
+
+def request_sync_many(events) -> dict:
+    """``request_sync()`` for every event of the ``events`` queryset.
+
+    Returns the number of entries left to sync, by event id.
+    """
+    with transaction.atomic():
+        CalendarEntry.objects.bulk_create(
+            [
+                CalendarEntry(event_id=event_id, attendee_email=email)
+                for event_id, email in attendees_with_access(events)
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        CalendarEntry.objects.filter(event__in=events).exclude(
+            status=CalendarEntryStatus.PENDING
+        ).update(
+            status=CalendarEntryStatus.PENDING,
+            last_error="",
+            locked_at=None,
+            updated_at=timezone.now(),
+        )
+        pending = dict(
+            CalendarEntry.objects.filter(
+                event__in=events, status=CalendarEntryStatus.PENDING
+            )
+            .order_by()
+            .values_list("event_id")
+            .annotate(count=Count("id"))
+        )
+        payloads = []
+        for event_id, count in pending.items():
+            jobs = min(
+                settings.GOOGLE_CALENDAR_SYNC_JOBS,
+                math.ceil(count / settings.GOOGLE_CALENDAR_BATCH_SIZE),
+            )
+            payloads += [{"event_id": event_id}] * jobs
+        enqueue_many(SYNC_EVENT_CALENDAR, payloads)
+    return pending
+
+
+def sync_progress(event) -> dict:
+    counts = dict.fromkeys(CalendarEntryStatus.values, 0)
+    counts.update(
+        event.calendar_entries.order_by()
+        .values_list("status")
+        .annotate(count=Count("id"))
+    )
+    return counts
+
+
+def record_synced(event, email, calendar_event) -> None:
+    """Remember an entry created outside of a sync, so syncs update it."""
+    now = timezone.now()
+    CalendarEntry.objects.update_or_create(
+        event=event,
+        attendee_email=email,
+        defaults={
+            "calendar_event_id": calendar_event["id"],
+            "status": CalendarEntryStatus.SYNCED,
+            "last_error": "",
+            "synced_at": now,
+            "updated_at": now,
+        },
+    )
+
+
+def calendar_event_id(event, entry) -> str:
+    # Google event ids are base32hex. A fixed id makes an insert retried after
+    # an unrecorded success fail with 409 rather than add a duplicate.
+    return f"ev{event.event_uuid.hex}{entry.pk}"
+
+
+def sync_event(event_id, batch_size=None) -> dict:
+    """Sync the pending entries of the event until none are left.
+
+    Returns the number of entries synced and failed. Raises
+    ``GoogleAPIUnavailable`` if Google failed or asked to slow down for some
+    of them, which stay pending for the job's retry.
+    """
+    batch_size = batch_size or settings.GOOGLE_CALENDAR_BATCH_SIZE
+    requeue_stale_entries(event_id)
+    totals = {CalendarEntryStatus.SYNCED: 0, CalendarEntryStatus.FAILED: 0}
+    while True:
+        counts = sync_batch(event_id, batch_size)
+        if counts is None:
+            return totals
+        for status in totals:
+            totals[status] += counts[status]
+        if counts["retry"]:
+            raise GoogleAPIUnavailable()
+
+
+def requeue_stale_entries(event_id) -> int:
+    """Hand entries left syncing by a job that died back to the sync."""
+    stale_before = timezone.now() - timedelta(
+        seconds=settings.GOOGLE_CALENDAR_SYNC_STALE_AFTER
+    )
+    return CalendarEntry.objects.filter(
+        event_id=event_id,
+        status=CalendarEntryStatus.SYNCING,
+        locked_at__lt=stale_before,
+    ).update(
+        status=CalendarEntryStatus.PENDING, locked_at=None, updated_at=timezone.now()
+    )
+
+
+def claim_entries(event_id, batch_size) -> list:
+    """Mark up to ``batch_size`` pending entries of the event as syncing."""
+    now = timezone.now()
+    with transaction.atomic():
+        entries = list(
+            CalendarEntry.objects.filter(
+                event_id=event_id, status=CalendarEntryStatus.PENDING
+            )
+            .select_for_update(skip_locked=True)
+            .order_by("id")[:batch_size]
+        )
+        CalendarEntry.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+            status=CalendarEntryStatus.SYNCING, locked_at=now, updated_at=now
+        )
+    for entry in entries:
+        entry.status = CalendarEntryStatus.SYNCING
+        entry.locked_at = now
+    return entries
+
+
+def still_claimed(entries):
+    # Entries marked pending again by an edit, or requeued as stale, since
+    # they were claimed belong to a later sync.
+    return CalendarEntry.objects.filter(
+        pk__in=[entry.pk for entry in entries],
+        status=CalendarEntryStatus.SYNCING,
+        locked_at=entries[0].locked_at,
+    )
+
+
+def release(entries) -> None:
+    still_claimed(entries).update(
+        status=CalendarEntryStatus.PENDING, locked_at=None, updated_at=timezone.now()
+    )
+
+
+def sync_batch(event_id, batch_size):
+    """Claim up to ``batch_size`` pending entries and sync them in one batch.
+
+    No transaction is held while tokens are refreshed, the rate limiter
+    waits or the batch request is sent: the entries are claimed first, and
+    the outcome is saved in a second short transaction. Returns the number of
+    entries synced, failed and left for a retry, or ``None`` if there was
+    nothing to claim.
+    """
+    entries = claim_entries(event_id, batch_size)
+    if not entries:
+        return None
+    try:
+        retry = send(event_id, entries)
+    except BaseException:
+        release(entries)
+        raise
+
+    with transaction.atomic():
+        claimed = set(
+            still_claimed(entries).select_for_update().values_list("pk", flat=True)
+        )
+        entries = [entry for entry in entries if entry.pk in claimed]
+        for entry in entries:
+            entry.locked_at = None
+        CalendarEntry.objects.bulk_update(
+            entries,
+            [
+                "calendar_event_id",
+                "status",
+                "last_error",
+                "locked_at",
+                "synced_at",
+                "updated_at",
+            ],
+        )
+
+    counts = {CalendarEntryStatus.SYNCED: 0, CalendarEntryStatus.FAILED: 0}
+    for entry in entries:
+        if entry.status in counts:
+            counts[entry.status] += 1
+    counts["retry"] = retry
+    for outcome, count in counts.items():
+        registry.increment(
+            "event_calendar_entries_total",
+            "Calendar entries sent in sync batches, by outcome.",
+            count,
+            outcome=outcome,
+        )
+    return counts
+
+
+def send(event_id, entries) -> int:
+    """Create or update the claimed ``entries`` in one batch request.
+
+    Sets the outcome on the entries and returns how many are left for a
+    retry.
+    """
+    event = Event.objects.get(pk=event_id)
+    body = event_create_schema(event) if has_schedule(event) else None
+    tokens = {
+        token.token_owner: token
+        for token in OuthTokenModel.objects.filter(
+            token_provider=GOOGLE,
+            token_owner__in=[entry.attendee_email for entry in entries],
+        )
+    }
+
+    batch = CalendarBatch()
+    sent = {}
+    for entry in entries:
+        if body is None:
+            # Syncing again once the event is scheduled retries these.
+            fail(entry, "The event has no start date and time yet")
+            continue
+        token = tokens.get(entry.attendee_email)
+        if token is None:
+            fail(entry, "The attendee revoked calendar access")
+            continue
+        if token.is_expired():
+            try:
+                token_store.refresh(token)
+            except RefreshError as error:
+                fail(entry, str(error))
+                continue
+        credentials = token_store.credentials_for(token)
+        if entry.calendar_event_id:
+            batch.update(entry.pk, credentials, entry.calendar_event_id, body)
+        else:
+            sent[entry.pk] = calendar_event_id(event, entry)
+            batch.insert(entry.pk, credentials, {**body, "id": sent[entry.pk]})
+
+    results = batch.execute()
+    now = timezone.now()
+    retry = 0
+    for entry in entries:
+        if str(entry.pk) not in results:
+            continue
+        response, error = results[str(entry.pk)]
+        if error is None:
+            entry.calendar_event_id = response["id"]
+            entry.status = CalendarEntryStatus.SYNCED
+            entry.last_error = ""
+            entry.synced_at = now
+        elif error.resp.status in RETRY_STATUSES:
+            entry.status = CalendarEntryStatus.PENDING
+            entry.last_error = str(error)
+            retry += 1
+        elif error.resp.status == 409 and entry.pk in sent:
+            # Created by an attempt that never got to save the result:
+            # update it instead.
+            entry.calendar_event_id = sent[entry.pk]
+            entry.status = CalendarEntryStatus.PENDING
+        else:
+            fail(entry, str(error))
+    for entry in entries:
+        entry.updated_at = now
+    return retry
+
+
+def fail(entry, error) -> None:
+    logger.warning("Could not sync %s: %s", entry, error)
+    entry.status = CalendarEntryStatus.FAILED
+    entry.last_error = error
@@ -0,0 +1,20 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class EventFullyBooked(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = {"error": "This Event is fully booked"}
+    default_code = "event_fully_booked"
+
+
+class AlreadyBooked(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = {"error": "You have already reserved a sit in this event"}
+    default_code = "already_booked"
+
+
+class GoogleAPIUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = {"error": "Google Maps is unavailable, try again later"}
+    default_code = "google_api_unavailable"
@@ -0,0 +1,109 @@
+"""Geohash encoding and the cell arithmetic behind the nearby events search.
+
+A geohash interleaves longitude and latitude bits into a base32 string, so
+points that share a prefix share a cell and a B-tree index on the hash can
+answer "everything in this cell" as a prefix (range) scan.
+"""
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=MAX_PRECISION) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    geohash, bits, char, even = [], 0, 0, True
+    while len(geohash) < precision:
+        value, interval = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        char <<= 1
+        if value >= middle:
+            char |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash.append(BASE32[char])
+            bits, char = 0, 0
+    return "".join(geohash)
+
+
+def cell_size(precision) -> tuple:
+    """Height and width in degrees of a cell at ``precision``."""
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 - lng_bits
+    return 180 / 2**lat_bits, 360 / 2**lng_bits
+
+
+def precision_for_radius(latitude, radius_km) -> int:
+    """Longest precision whose cells are at least ``radius_km`` across.
+
+    A circle of that radius centered anywhere in a cell is then covered by
+    the cell and its eight neighbours.
+    """
+    # Cells are narrowest on the side of the circle nearest the pole.
+    poleward_latitude = min(abs(float(latitude)) + radius_km / KM_PER_DEGREE, 90)
+    lng_scale = max(math.cos(math.radians(poleward_latitude)), 1e-6)
+    for precision in range(MAX_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        if (
+            height * KM_PER_DEGREE >= radius_km
+            and width * KM_PER_DEGREE * lng_scale >= radius_km
+        ):
+            return precision
+    return 0
+
+
+def covering_cells(latitude, longitude, radius_km) -> set:
+    """Geohash prefixes whose cells cover the circle around the point.
+
+    An empty string (the whole world) is returned for radii too large for any
+    cell.
+    """
+    precision = precision_for_radius(latitude, radius_km)
+    if not precision:
+        return {""}
+
+    latitude, longitude = float(latitude), float(longitude)
+    height, width = cell_size(precision)
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        cell_lat = latitude + lat_step * height
+        if not -90 <= cell_lat <= 90:
+            continue
+        for lng_step in (-1, 0, 1):
+            cell_lng = (longitude + lng_step * width + 180) % 360 - 180
+            cells.add(encode(cell_lat, cell_lng, precision))
+    return cells
+
+
+def bounding_box(latitude, longitude, radius_km) -> tuple:
+    """``(min_lat, max_lat, min_lng, max_lng)`` around the circle.
+
+    Longitudes are ``None`` when the box wraps the antimeridian or a pole.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    lat_delta = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), min(max_lat, 90), None, None
+
+    lng_delta = lat_delta / math.cos(math.radians(latitude))
+    min_lng, max_lng = longitude - lng_delta, longitude + lng_delta
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def haversine_km(lat1, lng1, lat2, lng2) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, map(float, (lat1, lng1, lat2, lng2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,111 @@
+import hashlib
+import re
+import threading
+
+from cachetools import TLRUCache
+from django.core.cache import cache as shared_cache
+
+MISS = object()
+
+
+def normalize_address(address) -> str:
+    """Normalize an address so trivially different spellings share a cache key."""
+    cleaned_address = re.sub(r"[^\w\s]", " ", str(address).casefold())
+    return " ".join(cleaned_address.split())
+
+
+class GoogleAPICache:
+    """Two tier cache for Google Maps lookups.
+
+    An in-process LRU answers repeated lookups without a round trip, and the
+    Django cache shares results between workers. ``None`` is cached as a
+    negative result for failed lookups, with its own (shorter) TTL.
+    """
+
+    def __init__(self, namespace, maxsize, ttl, negative_ttl) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local = TLRUCache(maxsize=maxsize, ttu=self._local_expiry)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _local_expiry(self, key, value, now):
+        return now + self.timeout_for(value)
+
+    def timeout_for(self, value):
+        return self.negative_ttl if value is None else self.ttl
+
+    def shared_key(self, key) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return f"googleapi:{self.namespace}:{digest}"
+
+    def _get_local(self, key):
+        with self.lock:
+            value = self.local.get(key, MISS)
+            if value is not MISS:
+                self.hits += 1
+            return value
+
+    def _remember_shared(self, key, value) -> None:
+        with self.lock:
+            if value is MISS:
+                self.misses += 1
+            else:
+                self.shared_hits += 1
+                self.local[key] = value
+
+    def get(self, key):
+        value = self._get_local(key)
+        if value is MISS:
+            value = shared_cache.get(self.shared_key(key), MISS)
+            self._remember_shared(key, value)
+        return value
+
+    def set(self, key, value) -> None:
+        with self.lock:
+            self.local[key] = value
+        shared_cache.set(self.shared_key(key), value, self.timeout_for(value))
+
+    def get_or_fetch(self, key, fetch):
+        value = self.get(key)
+        if value is MISS:
+            value = fetch()
+            self.set(key, value)
+        return value
+
+    async def aget(self, key):
+        value = self._get_local(key)
+        if value is MISS:
+            value = await shared_cache.aget(self.shared_key(key), MISS)
+            self._remember_shared(key, value)
+        return value
+
+    async def aset(self, key, value) -> None:
+        with self.lock:
+            self.local[key] = value
+        await shared_cache.aset(self.shared_key(key), value, self.timeout_for(value))
+
+    async def aget_or_fetch(self, key, fetch):
+        """Like ``get_or_fetch`` with ``fetch`` returning an awaitable."""
+        value = await self.aget(key)
+        if value is MISS:
+            value = await fetch()
+            await self.aset(key, value)
+        return value
+
+    def clear(self) -> None:
+        """Drop the in-process tier and reset the counters."""
+        with self.lock:
+            self.local.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "size": len(self.local),
+        }
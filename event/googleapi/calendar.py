@@ -1,14 +1,53 @@
-from datetime import datetime, timedelta
+"""Google Calendar events and the clients that insert them.
 
-from google.oauth2.credentials import Credentials
+``build()`` parses the discovery document and builds a new resource tree on
+every call, and each service gets its own ``httplib2.Http``, so a new TLS
+connection per request. ``calendar_client()`` builds from a discovery document
+parsed once per process and keeps clients per credential in a small LRU per
+thread; httplib2 connections are not thread safe, so each thread also has a
+single ``Http`` shared by all of its clients. ``CalendarBatch`` sends calls
+for many users in one batch request (see ``event.calendar_sync``).
+"""
+import functools
+import itertools
+import json
+import threading
+import time
+from datetime import datetime
 
-from event.models import Event
+import google_auth_httplib2
+import httplib2
+from cachetools import LRUCache
+from django.conf import settings
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import BatchHttpRequest
 
+from event.metrics import timed
 
-def event_create_schema(event_uuid):
-    event = Event.objects.get(event_uuid=event_uuid)
+# Event fields that make up a calendar entry; see event_create_schema().
+CALENDAR_FIELDS = (
+    "event_name",
+    "event_address",
+    "event_description",
+    "event_start_date",
+    "event_start_time",
+    "event_end_time",
+)
 
-    event = {
+
+def has_schedule(event) -> bool:
+    """Whether ``event`` has the date and times a calendar event needs."""
+    return None not in (
+        event.event_start_date,
+        event.event_start_time,
+        event.event_end_time,
+    )
+
+
+def event_create_schema(event):
+    """Google Calendar event body for ``event``, an already loaded ``Event``."""
+    schema = {
         "summary": f"{event.event_name}",
         "location": f"{event.event_address}",
         "description": f"{event.event_description}",
@@ -42,7 +81,7 @@ def event_create_schema(event_uuid):
             ],
         },
     }
-    return event
+    return schema
 
 
 def build_date_time(date, time):
@@ -56,5 +95,166 @@ def build_date_time(date, time):
     return date_time.isoformat()
 
 
-def get_credetials():
-    pass
+@functools.lru_cache(maxsize=None)
+def discovery_document() -> dict:
+    """The Calendar v3 discovery document bundled with the client library."""
+    return json.loads(discovery_cache.get_static_doc("calendar", "v3"))
+
+
+class CalendarClient:
+    """A Calendar service bound to one set of credentials, or none."""
+
+    def __init__(self, http, credentials=None) -> None:
+        self.credentials = credentials
+        if credentials is not None:
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=http)
+        self.service = build_from_document(
+            discovery_document(),
+            http=http,
+            client_options={"api_endpoint": settings.GOOGLE_CALENDAR_API_URL},
+        )
+        # Every service.events() call builds the resource's methods again.
+        self.events = self.service.events()
+
+    def insert_event(self, body, calendar_id="primary") -> dict:
+        with timed("google_calendar"):
+            return self.events.insert(calendarId=calendar_id, body=body).execute()
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` calls a second, ``burst`` at once.
+
+    Shared by the threads of a process; each process has a budget of its own.
+    """
+
+    def __init__(self, rate, burst) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count=1) -> float:
+        """Wait until ``count`` calls may be made. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= count:
+                    self.tokens -= count
+                    return waited
+                wait = (count - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class CalendarBatch:
+    """Calendar calls made for different users, sent as one batch request.
+
+    Every call carries the ``Authorization`` header of its own user's
+    credentials. Google takes at most ``GOOGLE_CALENDAR_BATCH_SIZE`` calls
+    per batch, and the batch as a whole counts against the rate limit as that
+    many calls.
+    """
+
+    def __init__(self) -> None:
+        state = thread_state()
+        self.http = state.http
+        self.events = state.batch_client.events
+        self.batch = BatchHttpRequest(
+            callback=self.collect, batch_uri=settings.GOOGLE_CALENDAR_BATCH_URL
+        )
+        self.size = 0
+        self.results = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def insert(self, request_id, credentials, body, calendar_id="primary") -> None:
+        request = self.events.insert(calendarId=calendar_id, body=body)
+        self.add(request_id, credentials, request)
+
+    def update(
+        self, request_id, credentials, event_id, body, calendar_id="primary"
+    ) -> None:
+        request = self.events.update(
+            calendarId=calendar_id, eventId=event_id, body=body
+        )
+        self.add(request_id, credentials, request)
+
+    def add(self, request_id, credentials, request) -> None:
+        request.http = google_auth_httplib2.AuthorizedHttp(credentials, http=self.http)
+        self.batch.add(request, request_id=str(request_id))
+        self.size += 1
+
+    def collect(self, request_id, response, exception) -> None:
+        self.results[request_id] = (response, exception)
+
+    def execute(self) -> dict:
+        """Send the calls. Returns ``{request_id: (response, HttpError or None)}``.
+
+        Raises ``HttpError`` if the batch request itself fails.
+        """
+        if self.size:
+            get_rate_limiter().acquire(self.size)
+            with timed("google_calendar"):
+                self.batch.execute(http=self.http)
+        return self.results
+
+
+_local = threading.local()
+_generation = itertools.count()
+_current_generation = next(_generation)
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def thread_state():
+    """This thread's ``Http``, clients and batch client, for current settings."""
+    if getattr(_local, "generation", None) != _current_generation:
+        _local.generation = _current_generation
+        _local.http = httplib2.Http(timeout=settings.GOOGLE_CALENDAR_TIMEOUT)
+        _local.clients = LRUCache(maxsize=settings.GOOGLE_CALENDAR_CLIENT_CACHE_SIZE)
+        _local.batch_client = CalendarClient(_local.http)
+    return _local
+
+
+def credentials_key(credentials) -> tuple:
+    return (credentials.client_id, credentials.refresh_token, credentials.token)
+
+
+def calendar_client(credentials) -> CalendarClient:
+    """This thread's client for ``credentials``, built on first use."""
+    state = thread_state()
+    key = credentials_key(credentials)
+    client = state.clients.get(key)
+    if client is None:
+        client = state.clients[key] = CalendarClient(state.http, credentials)
+    return client
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(
+                    rate=settings.GOOGLE_CALENDAR_RATE_LIMIT,
+                    burst=max(
+                        settings.GOOGLE_CALENDAR_RATE_LIMIT,
+                        settings.GOOGLE_CALENDAR_BATCH_SIZE,
+                    ),
+                )
+    return _rate_limiter
+
+
+def reset_calendar_clients() -> None:
+    """Make every thread build new clients with the current settings."""
+    global _current_generation, _rate_limiter
+    with _rate_limiter_lock:
+        _current_generation = next(_generation)
+        _rate_limiter = None
@@ -1,11 +1,22 @@
+import contextvars
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlencode
 
-import requests
 from django.conf import settings
-from rest_framework.authentication import BasicAuthentication
 
-base_url = "https://maps.googleapis.com/maps/api/directions/json?"
+from event.exceptions import GoogleAPIUnavailable
+from event.googleapi.cache import MISS, GoogleAPICache, normalize_address
+from event.googleapi.transport import get_async_transport, get_transport
+
+base_path = "/directions/json?"
+
+direction_cache = GoogleAPICache(
+    "direction",
+    maxsize=settings.GOOGLE_DIRECTION_CACHE_SIZE,
+    ttl=settings.GOOGLE_DIRECTION_CACHE_TTL,
+    negative_ttl=settings.GOOGLE_DIRECTION_NEGATIVE_CACHE_TTL,
+)
 
 
 class DirectionClient:
@@ -15,7 +26,7 @@ class DirectionClient:
         self.mode = mode
         self.secret_key = settings.GOOGLE_DIRECTION_SECRET_KEY
 
-    def get_direction(self):
+    def get_direction_url(self) -> str:
         query_prams = urlencode(
             {
                 "origin": self.origin,
@@ -25,13 +36,14 @@ class DirectionClient:
             }
         )
 
-        full_url = f"{base_url}{query_prams}"
-        response = requests.post(full_url)
+        return f"{settings.GOOGLE_MAPS_API_URL}{base_path}{query_prams}"
+
+    def get_direction(self):
+        response = get_transport().get(self.get_direction_url())
 
         return json.loads(response.content)
 
     def get_direction_data(self, json_response):
-        print(json_response)
         if json_response.get("status") == "OK":
             route_meta = json_response["routes"][0]["legs"][0]
             distance = route_meta["distance"].get("text")
@@ -63,8 +75,103 @@ class DirectionClient:
             return None
 
 
-def get_direction_cleaned_date(origin, destination, mode="driving"):
+class AsyncDirectionClient(DirectionClient):
+    async def get_direction(self):
+        response = await get_async_transport().get(self.get_direction_url())
+
+        return json.loads(response.content)
+
+
+def quantize_location(location, grid=None) -> str:
+    """Snap a ``"lat,lng"`` origin to the configured grid, or normalize an address.
+
+    Nearby origins then share one cached route; the grid size
+    (``GOOGLE_DIRECTION_ORIGIN_GRID`` degrees) trades accuracy for hit rate.
+    """
+    grid = grid or settings.GOOGLE_DIRECTION_ORIGIN_GRID
+    try:
+        lat, lng = (float(value) for value in str(location).split(","))
+    except ValueError:
+        return normalize_address(location)
+    return f"{round(lat / grid) * grid:.6f},{round(lng / grid) * grid:.6f}"
+
+
+def direction_cache_key(origin, destination, mode) -> str:
+    return "|".join(
+        (quantize_location(origin), normalize_address(destination), str(mode))
+    )
+
+
+def fetch_direction(origin, destination, mode="driving"):
     client = DirectionClient(origin, destination, mode)
     response = client.get_direction()
-    cleaned_data = client.get_direction_data(response)
-    return cleaned_data
+    return client.get_direction_data(response)
+
+
+def get_direction_cleaned_date(origin, destination, mode="driving"):
+    return direction_cache.get_or_fetch(
+        direction_cache_key(origin, destination, mode),
+        lambda: fetch_direction(origin, destination, mode),
+    )
+
+
+def iter_directions(origins, destination, mode="driving", max_workers=None):
+    """Yield ``(indices, direction, error)`` for each distinct route as it resolves.
+
+    Origins that share a cache key are looked up once. Cached routes are
+    yielded straight away and the misses are fetched concurrently on a bounded
+    thread pool, in completion order. ``error`` is the exception raised when
+    Google Maps could not be reached.
+    """
+    routes = {}
+    for index, origin in enumerate(origins):
+        key = direction_cache_key(origin, destination, mode)
+        routes.setdefault(key, []).append(index)
+
+    misses = {}
+    for key, indices in routes.items():
+        direction = direction_cache.get(key)
+        if direction is MISS:
+            misses[key] = indices
+        else:
+            yield indices, direction, None
+    if not misses:
+        return
+
+    def fetch(key, origin):
+        direction = fetch_direction(origin, destination, mode)
+        direction_cache.set(key, direction)
+        return direction
+
+    max_workers = min(
+        max_workers or settings.GOOGLE_DIRECTION_BATCH_WORKERS, len(misses)
+    )
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            # Each lookup runs in a copy of the caller's context so its upstream
+            # call is recorded against the request.
+            executor.submit(
+                contextvars.copy_context().run, fetch, key, origins[indices[0]]
+            ): indices
+            for key, indices in misses.items()
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except GoogleAPIUnavailable as exc:
+                yield futures[future], None, exc
+    finally:
+        # Stop outstanding lookups if the consumer goes away early.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def aget_direction_cleaned_date(origin, destination, mode="driving"):
+    async def fetch_direction():
+        client = AsyncDirectionClient(origin, destination, mode)
+        response = await client.get_direction()
+        return client.get_direction_data(response)
+
+    return await direction_cache.aget_or_fetch(
+        direction_cache_key(origin, destination, mode), fetch_direction
+    )
@@ -1,11 +1,20 @@
 import json
-import re
 from urllib.parse import urlencode
 
-import requests
 from django.conf import settings
 
-base_url = "https://maps.googleapis.com/maps/api/geocode/json"
+from event.exceptions import GoogleAPIUnavailable
+from event.googleapi.cache import GoogleAPICache, normalize_address
+from event.googleapi.transport import get_async_transport, get_transport
+
+base_path = "/geocode/json"
+
+geocode_cache = GoogleAPICache(
+    "geocode",
+    maxsize=settings.GOOGLE_GEOCODE_CACHE_SIZE,
+    ttl=settings.GOOGLE_GEOCODE_CACHE_TTL,
+    negative_ttl=settings.GOOGLE_GEOCODE_NEGATIVE_CACHE_TTL,
+)
 
 
 class GeoEncodingClient:
@@ -13,31 +22,40 @@ class GeoEncodingClient:
         self.key = settings.GOOGLE_DIRECTION_SECRET_KEY
 
     def clean_address(self, address) -> str:
-        cleaned_address = re.sub(r"[^a-zA-Z0-9 ]", "")
-        return cleaned_address
+        return normalize_address(address)
 
-    def geoencode(self, address) -> tuple:
+    def get_geoencode_url(self, address) -> str:
         # cleaned_address = self.clean_address(address)
         query_params = urlencode({"address": address, "key": self.key})
-        full_path = f"{base_url}?{query_params}"
-        response = requests.post(full_path)
+        return f"{settings.GOOGLE_MAPS_API_URL}{base_path}?{query_params}"
+
+    def get_reverse_geoencode_url(self, latlng: dict) -> str:
+        query_params = urlencode(
+            {"key": self.key, "latlng": f"{latlng['lat']},{latlng['lng']}"}
+        )
+        return f"{settings.GOOGLE_MAPS_API_URL}{base_path}?{query_params}"
+
+    def geoencode(self, address) -> tuple:
+        response = get_transport().get(self.get_geoencode_url(address))
         return json.loads(response.content), response.status_code
 
     def get_lat_and_long(self, address) -> dict:
-        geoencode_data, geoencode_res_code = self.geoencode(address)
-        if geoencode_res_code == 200:
+        return geocode_cache.get_or_fetch(
+            self.clean_address(address), lambda: self.fetch_lat_and_long(address)
+        )
+
+    def fetch_lat_and_long(self, address) -> dict:
+        return self.get_lat_and_long_data(*self.geoencode(address))
+
+    def get_lat_and_long_data(self, geoencode_data, geoencode_res_code) -> dict:
+        if geoencode_res_code == 200 and geoencode_data.get("results"):
             lat_n_long = geoencode_data["results"][0].get("geometry").get("location")
             return lat_n_long
         else:
-            return geoencode_res_code.get("error_message")
+            return None
 
     def reverse_geoencode(self, latlng: dict):
-        query_params = urlencode(
-            {"key": self.key, "latlng": f"{latlng['lat']},{latlng['lng']}"}
-        )
-        full_path = f"{base_url}?{query_params}"
-
-        response = requests.post(full_path)
+        response = get_transport().get(self.get_reverse_geoencode_url(latlng))
         return json.loads(response.content), response.status_code
 
     def get_full_address(self, latlng: dict):
@@ -51,7 +69,40 @@ class GeoEncodingClient:
             return None
 
 
+class AsyncGeoEncodingClient(GeoEncodingClient):
+    async def geoencode(self, address) -> tuple:
+        response = await get_async_transport().get(self.get_geoencode_url(address))
+        return json.loads(response.content), response.status_code
+
+    async def get_lat_and_long(self, address) -> dict:
+        return await geocode_cache.aget_or_fetch(
+            self.clean_address(address), lambda: self.fetch_lat_and_long(address)
+        )
+
+    async def fetch_lat_and_long(self, address) -> dict:
+        return self.get_lat_and_long_data(*await self.geoencode(address))
+
+    async def reverse_geoencode(self, latlng: dict):
+        response = await get_async_transport().get(
+            self.get_reverse_geoencode_url(latlng)
+        )
+        return json.loads(response.content), response.status_code
+
+
 def geoencodeaddress(address):
     client = GeoEncodingClient()
-    lat_and_long = client.get_lat_and_long(address)
+    try:
+        lat_and_long = client.get_lat_and_long(address)
+    except GoogleAPIUnavailable:
+        # The event is still created, just without coordinates.
+        return None
+    return lat_and_long
+
+
+async def ageoencodeaddress(address):
+    client = AsyncGeoEncodingClient()
+    try:
+        lat_and_long = await client.get_lat_and_long(address)
+    except GoogleAPIUnavailable:
+        return None
     return lat_and_long
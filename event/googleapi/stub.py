@@ -0,0 +1,252 @@
+"""Local stand-ins for the Google APIs, used by tests and benchmarks."""
+import itertools
+import json
+import re
+import threading
+import time
+from collections import deque
+from email.parser import BytesParser, Parser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+DIRECTION_RESPONSE = {
+    "status": "OK",
+    "routes": [
+        {
+            "legs": [
+                {
+                    "distance": {"text": "9.8 km"},
+                    "duration": {"text": "21 mins"},
+                    "start_address": "Yaba, Lagos",
+                    "end_address": "1 Marina Road, Lagos",
+                    "steps": [
+                        {
+                            "html_instructions": "Head south",
+                            "duration": {"text": "21 mins"},
+                            "distance": {"text": "9.8 km"},
+                        }
+                    ],
+                }
+            ]
+        }
+    ],
+}
+
+GEOCODE_RESPONSE = {
+    "status": "OK",
+    "results": [{"geometry": {"location": {"lat": 6.45, "lng": 3.4}}}],
+}
+
+TOKEN_RESPONSE = {
+    "access_token": "renewed-access-token",
+    "expires_in": 3599,
+    "scope": "https://www.googleapis.com/auth/calendar.events",
+    "token_type": "Bearer",
+}
+
+
+class GoogleMapsStub:
+    """Serve canned Google Maps responses from a local HTTP/1.1 server.
+
+    ``responses`` maps a path to the JSON body returned for it. Responses
+    pushed with ``queue()`` are served first, whatever the path, which lets a
+    test script failures. Every request is recorded with the client address so
+    connection reuse can be checked.
+    """
+
+    def __init__(self, responses=None, delay=0) -> None:
+        self.responses = {
+            "/directions/json": DIRECTION_RESPONSE,
+            "/geocode/json": GEOCODE_RESPONSE,
+        }
+        self.responses.update(responses or {})
+        self.delay = delay
+        self.queued = deque()
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def queue(self, status, body=None, delay=0) -> None:
+        self.queued.append((status, body or {}, delay))
+
+    def respond(self, handler) -> None:
+        path = urlsplit(handler.path).path
+        with self.lock:
+            self.requests.append((handler.command, path, handler.client_address))
+            if self.queued:
+                status, body, delay = self.queued.popleft()
+            else:
+                body = self.responses.get(path)
+                status, delay = (200 if body is not None else 404), self.delay
+
+        if delay:
+            time.sleep(delay)
+        self.send_json(handler, status, body)
+
+    def send_json(self, handler, status, body) -> None:
+        payload = json.dumps(body or {}).encode("utf-8")
+        try:
+            handler.send_response(status)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out and hung up.
+            pass
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; with Nagle on, the
+            # body waits for a delayed ACK on kept-alive connections.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub.respond(self)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.body = self.rfile.read(length)
+                stub.respond(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class GoogleCalendarStub(GoogleMapsStub):
+    """Calendar API stand-in.
+
+    Inserted and updated events are echoed back, inserts with an id of their
+    own unless the body has one, and kept in ``events`` as
+    ``(calendar_id, event)``. Batch requests are split into their calls, which
+    are answered the same way, with the ``Authorization`` header of each kept
+    in ``authorizations``. ``calls`` lists the method and path of every call. Queued responses are served first, to calls
+    within a batch too.
+
+    Point ``GOOGLE_CALENDAR_API_URL``, ``GOOGLE_CALENDAR_BATCH_URL`` and
+    ``TOKEN_ENDPOINT`` at ``api_url``, ``batch_url`` and ``token_url``.
+    """
+
+    EVENTS_PATH = re.compile(
+        r"^/calendar/v3/calendars/(?P<calendar_id>[^/]+)/events"
+        r"(?:/(?P<event_id>[^/]+))?$"
+    )
+    BATCH_PATH = "/batch/calendar/v3"
+    BOUNDARY = "batch_stub"
+
+    def __init__(self, responses=None, delay=0) -> None:
+        super().__init__({"/token": TOKEN_RESPONSE, **(responses or {})}, delay)
+        self.events = []
+        self.batches = []
+        self.authorizations = []
+        self.calls = []
+        self.ids = itertools.count(1)
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/calendar/v3/"
+
+    @property
+    def batch_url(self) -> str:
+        return f"{self.url}{self.BATCH_PATH}"
+
+    @property
+    def token_url(self) -> str:
+        return f"{self.url}/token"
+
+    def respond(self, handler) -> None:
+        path = urlsplit(handler.path).path
+        if handler.command == "POST" and path == self.BATCH_PATH:
+            return self.respond_batch(handler)
+        if not self.EVENTS_PATH.match(path) or self.queued:
+            return super().respond(handler)
+        with self.lock:
+            self.requests.append((handler.command, path, handler.client_address))
+        status, body = self.calendar_call(handler.command, path, handler.body)
+        if self.delay:
+            time.sleep(self.delay)
+        self.send_json(handler, status, body)
+
+    def calendar_call(self, method, path, body) -> tuple:
+        path = urlsplit(path).path
+        match = self.EVENTS_PATH.match(path)
+        with self.lock:
+            self.calls.append((method, path))
+            if self.queued:
+                status, response, _ = self.queued.popleft()
+                return status, response
+            if match is None or (method == "POST") == bool(match["event_id"]):
+                return 404, {"error": {"code": 404, "message": "Not Found"}}
+            event = json.loads(body)
+            if match["event_id"]:
+                event["id"] = unquote(match["event_id"])
+            else:
+                event.setdefault("id", f"stub{next(self.ids)}")
+            event["status"] = "confirmed"
+            self.events.append((unquote(match["calendar_id"]), event))
+        return 200, event
+
+    def respond_batch(self, handler) -> None:
+        message = BytesParser().parsebytes(
+            f"Content-Type: {handler.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+            + handler.body
+        )
+        calls = message.get_payload()
+        with self.lock:
+            self.requests.append(
+                (handler.command, self.BATCH_PATH, handler.client_address)
+            )
+            self.batches.append(len(calls))
+
+        parts = []
+        for call in calls:
+            request_line, _, request = call.get_payload().partition("\n")
+            method, uri, _ = request_line.split(" ")
+            request = Parser().parsestr(request)
+            with self.lock:
+                self.authorizations.append(request["Authorization"])
+            status, body = self.calendar_call(method, uri, request.get_payload())
+            parts.append(
+                f"--{self.BOUNDARY}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{call['Content-ID'][1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                "Content-Type: application/json\r\n\r\n"
+                f"{json.dumps(body)}\r\n"
+            )
+        payload = "".join(parts) + f"--{self.BOUNDARY}--\r\n"
+
+        if self.delay:
+            time.sleep(self.delay)
+        payload = payload.encode("utf-8")
+        handler.send_response(200)
+        handler.send_header(
+            "Content-Type", f"multipart/mixed; boundary={self.BOUNDARY}"
+        )
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
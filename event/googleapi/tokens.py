@@ -0,0 +1,177 @@
+"""OAuth tokens by user, renewed before they expire.
+
+There is one token per ``(token_owner, token_provider)``. ``token_store``
+keeps recently used tokens in an in-process cache for up to
+``GOOGLE_TOKEN_CACHE_TTL`` seconds, but never into the last
+``GOOGLE_TOKEN_REFRESH_MARGIN`` seconds of a token's life. Saving a token
+queues a ``refresh_oauth_token`` job for the start of that margin, which
+renews it and queues the next one, so calendar inserts find a fresh access
+token instead of refreshing it inline.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+import google.auth.transport.requests
+import requests
+from cachetools import TLRUCache
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from google.auth.exceptions import RefreshError
+from google.oauth2.credentials import Credentials
+
+from event.jobs import enqueue
+from event.metrics import timed
+from event.models import OuthTokenModel
+
+logger = logging.getLogger(__name__)
+
+GOOGLE = "Google"
+REFRESH_OAUTH_TOKEN = "refresh_oauth_token"
+# Fields of a token endpoint response that are stored.
+TOKEN_FIELDS = ("access_token", "refresh_token", "expires_in", "scope", "token_type")
+
+
+class TokenStore:
+    def __init__(self, maxsize, ttl, refresh_margin) -> None:
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.local = TLRUCache(maxsize=maxsize, ttu=self._local_expiry)
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+
+    def _local_expiry(self, key, token, now):
+        return now + min(self.ttl, token.seconds_left() - self.refresh_margin)
+
+    def remember(self, token) -> None:
+        key = (token.token_owner, token.token_provider)
+        with self.lock:
+            # A token too close to expiry is not cached, and must not leave
+            # the one it replaces behind.
+            self.local.pop(key, None)
+            self.local[key] = token
+
+    def forget(self, owner, provider=GOOGLE) -> None:
+        with self.lock:
+            self.local.pop((owner, provider), None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.local.clear()
+
+    def get(self, owner, provider=GOOGLE):
+        """``owner``'s token, or ``None`` if they never authorized access."""
+        with self.lock:
+            token = self.local.get((owner, provider))
+        if token is None:
+            token = OuthTokenModel.objects.filter(
+                token_owner=owner, token_provider=provider
+            ).first()
+            if token is not None:
+                self.remember(token)
+        return token
+
+    def save(self, owner, token_data, provider=GOOGLE) -> OuthTokenModel:
+        """Store a token endpoint response as ``owner``'s token.
+
+        Google leaves the refresh token out when access was granted before;
+        the stored one is kept then.
+        """
+        fields = {
+            name: token_data[name]
+            for name in TOKEN_FIELDS
+            if token_data.get(name) is not None
+        }
+        fields["token_expire_time"] = timezone.now() + timedelta(
+            seconds=fields["expires_in"]
+        )
+        with transaction.atomic():
+            token, _ = OuthTokenModel.objects.update_or_create(
+                token_owner=owner, token_provider=provider, defaults=fields
+            )
+            self.schedule_refresh(token)
+        self.remember(token)
+        return token
+
+    def schedule_refresh(self, token) -> None:
+        if token.refresh_token:
+            enqueue(
+                REFRESH_OAUTH_TOKEN,
+                {"token_id": token.pk},
+                delay=max(token.seconds_left() - self.refresh_margin, 0),
+            )
+
+    def credentials_for(self, token) -> Credentials:
+        return Credentials(
+            token=token.access_token,
+            refresh_token=token.refresh_token,
+            client_id=settings.CLIENT_ID,
+            client_secret=settings.CLIENT_SECRET,
+            token_uri=settings.TOKEN_ENDPOINT,
+            scopes=token.scope.split(" ") if token.scope else None,
+            # google-auth compares expiry with naive UTC times.
+            expiry=timezone.make_naive(token.token_expire_time, timezone.utc),
+        )
+
+    def credentials(self, owner, provider=GOOGLE):
+        """Credentials for ``owner``, or ``None`` if they have no token.
+
+        Expired tokens are only refreshed here if the refresh job fell behind.
+        """
+        token = self.get(owner, provider)
+        if token is not None and token.is_expired():
+            logger.warning("Refreshing %s's expired %s token inline", owner, provider)
+            self.refresh(token)
+        return None if token is None else self.credentials_for(token)
+
+    def refresh(self, token) -> OuthTokenModel:
+        """Renew ``token`` at the token endpoint and queue its next refresh."""
+        credentials = self.credentials_for(token)
+        with timed("google_oauth"):
+            credentials.refresh(google.auth.transport.requests.Request(self.session))
+
+        now = timezone.now()
+        token.access_token = credentials.token
+        token.refresh_token = credentials.refresh_token
+        token.token_expire_time = timezone.make_aware(credentials.expiry, timezone.utc)
+        token.expires_in = round((token.token_expire_time - now).total_seconds())
+        with transaction.atomic():
+            token.save(
+                update_fields=[
+                    "access_token",
+                    "refresh_token",
+                    "token_expire_time",
+                    "expires_in",
+                ]
+            )
+            self.schedule_refresh(token)
+        self.remember(token)
+        return token
+
+    def refresh_if_due(self, token_id) -> bool:
+        """Refresh the token if it is within the refresh margin.
+
+        Returns whether it was refreshed. A token renewed in the meantime has
+        a later job queued for it already, and one whose refresh token was
+        revoked can only be replaced by its owner granting access again.
+        """
+        token = OuthTokenModel.objects.filter(pk=token_id).first()
+        if token is None or not token.refresh_token:
+            return False
+        if token.seconds_left() > self.refresh_margin:
+            return False
+        try:
+            self.refresh(token)
+        except RefreshError as error:
+            logger.warning("Could not refresh token %s: %s", token_id, error)
+            self.forget(token.token_owner, token.token_provider)
+            return False
+        return True
+
+
+token_store = TokenStore(
+    maxsize=settings.GOOGLE_TOKEN_CACHE_SIZE,
+    ttl=settings.GOOGLE_TOKEN_CACHE_TTL,
+    refresh_margin=settings.GOOGLE_TOKEN_REFRESH_MARGIN,
+)
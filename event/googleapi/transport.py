@@ -0,0 +1,253 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from event.exceptions import GoogleAPIUnavailable
+from event.metrics import timed
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """Stop calling an upstream that keeps failing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and calls
+    fail fast for ``reset_timeout`` seconds. The first call after that is let
+    through as a trial: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow_request(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_in_flight:
+                return False
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class BaseGoogleMapsTransport:
+    """Timeout, retry and circuit breaker policy shared by both transports."""
+
+    def __init__(
+        self,
+        timeout=None,
+        retries=None,
+        backoff=None,
+        failure_threshold=None,
+        reset_timeout=None,
+        pool_size=None,
+    ) -> None:
+        self.timeout = timeout or (
+            settings.GOOGLE_MAPS_CONNECT_TIMEOUT,
+            settings.GOOGLE_MAPS_READ_TIMEOUT,
+        )
+        self.retries = settings.GOOGLE_MAPS_RETRIES if retries is None else retries
+        self.backoff = settings.GOOGLE_MAPS_BACKOFF if backoff is None else backoff
+        if reset_timeout is None:
+            reset_timeout = settings.GOOGLE_MAPS_BREAKER_RESET
+        self.breaker = CircuitBreaker(
+            failure_threshold or settings.GOOGLE_MAPS_BREAKER_THRESHOLD, reset_timeout
+        )
+        self.pool_size = pool_size or settings.GOOGLE_MAPS_POOL_SIZE
+
+    def backoff_delay(self, attempt) -> float:
+        # "Full jitter": spread retries of concurrent callers over the window.
+        return random.uniform(0, self.backoff * 2**attempt)
+
+
+class GoogleMapsTransport(BaseGoogleMapsTransport):
+    """Pooled keep-alive HTTP session shared by the Google Maps clients.
+
+    Every call gets a timeout, connection errors and retryable statuses are
+    retried with jittered exponential backoff, and a circuit breaker fails
+    fast while the upstream is down. Final failures raise
+    ``GoogleAPIUnavailable``.
+    """
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size, pool_maxsize=self.pool_size
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        with timed("google_maps"):
+            return self._request(method, url, **kwargs)
+
+    def _request(self, method, url, **kwargs) -> requests.Response:
+        if not self.breaker.allow_request():
+            raise GoogleAPIUnavailable()
+
+        kwargs.setdefault("timeout", self.timeout)
+        error = None
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(self.backoff_delay(attempt - 1))
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as exc:
+                    error = exc
+                    continue
+
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                error = requests.HTTPError(response=response)
+        except requests.RequestException as exc:
+            self.breaker.record_failure()
+            raise GoogleAPIUnavailable() from exc
+        except BaseException:
+            # Whatever ends the call has to end a trial too, or the breaker
+            # would wait for it forever.
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_failure()
+        raise GoogleAPIUnavailable() from error
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+
+class AsyncGoogleMapsTransport(BaseGoogleMapsTransport):
+    """``httpx.AsyncClient`` counterpart of ``GoogleMapsTransport`` for async views.
+
+    An ASGI worker can keep many upstream calls in flight on one event loop
+    instead of holding a thread per request.
+    """
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        if isinstance(self.timeout, tuple):
+            connect_timeout, read_timeout = self.timeout
+            timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        else:
+            timeout = httpx.Timeout(self.timeout)
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+            ),
+        )
+
+    async def request(self, method, url, **kwargs) -> httpx.Response:
+        with timed("google_maps"):
+            return await self._request(method, url, **kwargs)
+
+    async def _request(self, method, url, **kwargs) -> httpx.Response:
+        if not self.breaker.allow_request():
+            raise GoogleAPIUnavailable()
+
+        error = None
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    await asyncio.sleep(self.backoff_delay(attempt - 1))
+                try:
+                    response = await self.client.request(method, url, **kwargs)
+                except httpx.TransportError as exc:
+                    error = exc
+                    continue
+
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                error = httpx.HTTPStatusError(
+                    "Retryable status", request=response.request, response=response
+                )
+        except httpx.HTTPError as exc:
+            self.breaker.record_failure()
+            raise GoogleAPIUnavailable() from exc
+        except BaseException:
+            # Cancelled calls included, see GoogleMapsTransport._request().
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_failure()
+        raise GoogleAPIUnavailable() from error
+
+    async def get(self, url, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> GoogleMapsTransport:
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = GoogleMapsTransport()
+    return _transport
+
+
+def reset_transport() -> None:
+    """Drop the shared transport so the next call picks up current settings."""
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.session.close()
+        _transport = None
+
+
+# httpx clients are bound to the event loop they were first used on.
+_async_transports = weakref.WeakKeyDictionary()
+
+
+def get_async_transport() -> AsyncGoogleMapsTransport:
+    loop = asyncio.get_running_loop()
+    transport = _async_transports.get(loop)
+    if transport is None:
+        transport = _async_transports[loop] = AsyncGoogleMapsTransport()
+    return transport
+
+
+async def reset_async_transport() -> None:
+    transport = _async_transports.pop(asyncio.get_running_loop(), None)
+    if transport is not None:
+        await transport.aclose()
@@ -0,0 +1,206 @@
+"""A small database backed job queue.
+
+Handlers are registered by ``kind`` with ``register()`` and jobs are added
+with ``enqueue()``, inside the caller's transaction so a job never refers to
+rows that were rolled back. ``manage.py run_jobs`` claims due jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED``, so any number of worker threads and
+processes can share the table without handing the same job out twice.
+"""
+import logging
+import random
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from event.models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+handlers = {}
+
+
+class JobHandler:
+    def __init__(self, kind, func, on_failure=None) -> None:
+        self.kind = kind
+        self.func = func
+        self.on_failure = on_failure
+
+    def __call__(self, payload):
+        return self.func(**payload)
+
+
+def register(kind, on_failure=None):
+    """Register the decorated function as the handler for jobs of ``kind``.
+
+    It is called with the job payload as keyword arguments. Raising retries
+    the job later; ``on_failure`` is called with the same arguments once the
+    job runs out of attempts.
+    """
+
+    def decorator(func):
+        handlers[kind] = JobHandler(kind, func, on_failure)
+        return func
+
+    return decorator
+
+
+def enqueue(kind, payload=None, delay=0) -> Job:
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(kind, payloads, batch_size=500) -> list:
+    now = timezone.now()
+    jobs = [
+        Job(
+            kind=kind,
+            payload=payload,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+            run_after=now,
+        )
+        for payload in payloads
+    ]
+    return Job.objects.bulk_create(jobs, batch_size=batch_size)
+
+
+def retry_delay(attempts) -> float:
+    # Exponential backoff with "equal jitter": at least half of the window.
+    window = min(
+        settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.JOB_RETRY_BACKOFF_MAX,
+    )
+    return window / 2 + random.uniform(0, window / 2)
+
+
+def claim_jobs(limit=1, kinds=None) -> list:
+    """Mark up to ``limit`` due jobs as running and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = Job.objects.filter(status=JobStatus.PENDING, run_after__lte=now)
+        if kinds:
+            queryset = queryset.filter(kind__in=kinds)
+        jobs = list(
+            queryset.select_for_update(skip_locked=True).order_by("run_after", "id")[
+                :limit
+            ]
+        )
+        for job in jobs:
+            job.status = JobStatus.RUNNING
+            job.locked_at = now
+            job.attempts += 1
+            job.updated_at = now
+        Job.objects.bulk_update(jobs, ["status", "locked_at", "attempts", "updated_at"])
+    return jobs
+
+
+def run_job(job) -> None:
+    handler = handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for {job.kind!r} jobs")
+        handler(job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if handler is not None and job.attempts < job.max_attempts:
+            job.status = JobStatus.PENDING
+            job.run_after = timezone.now() + timedelta(
+                seconds=retry_delay(job.attempts)
+            )
+            logger.warning("%s failed, retrying at %s", job, job.run_after)
+        else:
+            job.status = JobStatus.FAILED
+            logger.error("%s failed after %s attempt(s)", job, job.attempts)
+            call_on_failure(job)
+    else:
+        job.status = JobStatus.DONE
+        job.last_error = ""
+
+    job.locked_at = None
+    job.save(
+        update_fields=[
+            "status",
+            "run_after",
+            "locked_at",
+            "last_error",
+            "updated_at",
+        ]
+    )
+
+
+def call_on_failure(job) -> None:
+    handler = handlers.get(job.kind)
+    if handler is None or handler.on_failure is None:
+        return
+    try:
+        handler.on_failure(**job.payload)
+    except Exception:
+        # The job is failed all the same, it must not be left running.
+        logger.exception("on_failure of %s failed", job)
+
+
+def requeue_stale_jobs() -> int:
+    """Hand jobs left running by a crashed worker back to the queue.
+
+    Jobs that were on their last attempt are failed instead, or a job that
+    takes its worker down with it would be run forever. Returns the number of
+    jobs requeued.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=JobStatus.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.JOB_STALE_AFTER),
+    )
+    with transaction.atomic():
+        exhausted = list(
+            stale.filter(attempts__gte=F("max_attempts")).select_for_update(
+                skip_locked=True
+            )
+        )
+        Job.objects.filter(pk__in=[job.pk for job in exhausted]).update(
+            status=JobStatus.FAILED,
+            locked_at=None,
+            last_error="The worker stopped while running the job",
+            updated_at=now,
+        )
+    for job in exhausted:
+        logger.error("%s failed after %s attempt(s)", job, job.attempts)
+        call_on_failure(job)
+    return stale.update(status=JobStatus.PENDING, locked_at=None, updated_at=now)
+
+
+def work(stop=None, once=False, poll_interval=1.0, batch_size=1, kinds=None) -> int:
+    """Run jobs until ``stop`` is set, or until the queue is empty if ``once``.
+
+    Returns the number of jobs run. Meant to be run in its own thread; the
+    thread's database connection is recycled between polls and closed on exit
+    (unless the caller holds it in a transaction).
+    """
+    stop = stop or threading.Event()
+    processed = 0
+    try:
+        while not stop.is_set():
+            if not connection.in_atomic_block:
+                close_old_connections()
+            jobs = claim_jobs(batch_size, kinds)
+            if not jobs:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+
+            for job in jobs:
+                run_job(job)
+                processed += 1
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+    return processed
@@ -0,0 +1,129 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from rest_framework.test import APIRequestFactory
+
+from event.models import Event
+from event.seed import seed_events
+from event.timing import summarize, timer
+from event.views import EventAPIViewSet
+
+# The indexes the listing filters and detail lookups rely on.
+BENCHMARKED_INDEXES = [
+    "event_status_start_date_idx",
+    "event_payment_start_date_idx",
+    "event_open_start_date_idx",
+]
+
+SCENARIOS = {
+    "list": {},
+    "filter_status": {"event_status": "open"},
+    "filter_payment": {"event_payment_type": "paid"},
+    "filter_status_payment": {"event_status": "open", "event_payment_type": "free"},
+    "filter_rare": {"event_status": "cancled", "event_payment_type": "paid"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with events and compare list, filter and "
+        "retrieve latency and query plans without and with the listing indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=100000)
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--output", help="Also write the full report, with plans, to this file"
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            self.stdout.write(f"Seeding {options['events']} events...")
+            uuids = seed_events(options["events"])
+            report = {"events": options["events"]}
+            with connection.schema_editor() as schema_editor:
+                self.drop_indexes(schema_editor)
+            report["before"] = self.measure(uuids, options["requests"])
+            with connection.schema_editor() as schema_editor:
+                self.create_indexes(schema_editor)
+            report["after"] = self.measure(uuids, options["requests"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for name in [*SCENARIOS, "retrieve"]:
+            before, after = report["before"][name], report["after"][name]
+            self.stdout.write(
+                f"{name:<22} p50 {before['p50_ms']:>9.2f} -> {after['p50_ms']:>7.2f} ms"
+                f"   p99 {before['p99_ms']:>9.2f} -> {after['p99_ms']:>7.2f} ms"
+            )
+            self.stdout.write(f"    before: {self.scan(before['plan'])}")
+            self.stdout.write(f"    after:  {self.scan(after['plan'])}")
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+
+    def uuid_fields(self):
+        indexed = Event._meta.get_field("event_uuid")
+        unindexed = indexed.clone()
+        unindexed.db_index = False
+        unindexed.set_attributes_from_name("event_uuid")
+        unindexed.model = Event
+        return indexed, unindexed
+
+    def drop_indexes(self, schema_editor):
+        for index in Event._meta.indexes:
+            if index.name in BENCHMARKED_INDEXES:
+                schema_editor.remove_index(Event, index)
+        schema_editor.alter_field(Event, *self.uuid_fields())
+        schema_editor.execute("ANALYZE event_event")
+
+    def create_indexes(self, schema_editor):
+        for index in Event._meta.indexes:
+            if index.name in BENCHMARKED_INDEXES:
+                schema_editor.add_index(Event, index)
+        schema_editor.alter_field(Event, *reversed(self.uuid_fields()))
+        schema_editor.execute("ANALYZE event_event")
+
+    def measure(self, uuids, requests):
+        factory = APIRequestFactory()
+        list_view = EventAPIViewSet.as_view({"get": "list"})
+        detail_view = EventAPIViewSet.as_view({"get": "retrieve"})
+        rng = random.Random(7)
+
+        calls = {
+            name: (lambda params=params: list_view(factory.get("/", params)))
+            for name, params in SCENARIOS.items()
+        }
+        calls["retrieve"] = lambda: detail_view(
+            factory.get("/"), event_uuid=rng.choice(uuids)
+        )
+
+        results = {}
+        for name, call in calls.items():
+            with CaptureQueriesContext(connection) as queries:
+                call().render()
+            samples = []
+            for _ in range(requests):
+                with timer(samples):
+                    call().render()
+            results[name] = {**summarize(samples), "plan": self.explain(queries)}
+        return results
+
+    def scan(self, plan):
+        return next((line.strip() for line in plan if "Scan" in line), plan[0])
+
+    def explain(self, queries):
+        sql = next(
+            query["sql"] for query in queries if 'FROM "event_event"' in query["sql"]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN ANALYZE {sql}")
+            return [line for line, in cursor.fetchall()]
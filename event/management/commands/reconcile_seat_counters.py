@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from event.models import Booking, Event
+
+
+class Command(BaseCommand):
+    help = "Reset Event.event_seats_taken to the real number of bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event",
+            dest="event_uuids",
+            action="append",
+            default=[],
+            help="Only reconcile the event with this uuid (repeatable)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted counters without fixing them",
+        )
+
+    def handle(self, *args, **options):
+        booked = (
+            Booking.objects.filter(event=OuterRef("pk"))
+            .order_by()
+            .values("event")
+            .annotate(seats=Count("id"))
+            .values("seats")
+        )
+        events = Event.objects.all()
+        if options["event_uuids"]:
+            events = events.filter(event_uuid__in=options["event_uuids"])
+
+        drifted = events.annotate(booked=Coalesce(Subquery(booked), 0)).exclude(
+            event_seats_taken=F("booked")
+        )
+        for event_uuid, seats_taken, actual in drifted.values_list(
+            "event_uuid", "event_seats_taken", "booked"
+        ):
+            self.stdout.write(
+                f"Event-{event_uuid}: counter {seats_taken}, booked {actual}"
+            )
+
+        if options["dry_run"]:
+            return
+
+        fixed = Event.objects.filter(pk__in=drifted.values("pk")).update(
+            event_seats_taken=Coalesce(Subquery(booked), 0), updated_at=timezone.now()
+        )
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} event(s)"))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from event.models import Event, EventLocationType, GeocodeStatus
+from event.tasks import enqueue_bulk_geocoding
+
+
+class Command(BaseCommand):
+    help = "Queue geocoding jobs for onsite events, by default the failed ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event",
+            dest="event_uuids",
+            action="append",
+            default=[],
+            help="Only re-geocode the event with this uuid (repeatable)",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-geocode every onsite event, not only the failed ones",
+        )
+        parser.add_argument(
+            "--use-cache",
+            action="store_true",
+            help="Accept cached geocoding results instead of asking Google again",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of jobs inserted per query",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the events that would be re-geocoded",
+        )
+
+    def handle(self, *args, **options):
+        events = Event.objects.filter(
+            event_location_type=EventLocationType.ONSITE
+        ).exclude(event_address="")
+        if options["event_uuids"]:
+            events = events.filter(event_uuid__in=options["event_uuids"])
+        elif not options["all"]:
+            events = events.filter(
+                Q(geocode_status=GeocodeStatus.FAILED) | Q(geocode_status__isnull=True)
+            )
+
+        if options["dry_run"]:
+            self.stdout.write(f"{events.count()} event(s) would be re-geocoded")
+            return
+
+        with transaction.atomic():
+            events = list(events.select_for_update().only("pk", "event_address"))
+            Event.objects.filter(pk__in=[event.pk for event in events]).update(
+                geocode_status=GeocodeStatus.PENDING, updated_at=timezone.now()
+            )
+            jobs = enqueue_bulk_geocoding(
+                events,
+                refresh=not options["use_cache"],
+                batch_size=options["batch_size"],
+            )
+        self.stdout.write(self.style.SUCCESS(f"Queued {len(jobs)} geocoding job(s)"))
@@ -0,0 +1,64 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from event.jobs import requeue_stale_jobs, work
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (geocoding, ...) in a pool of worker threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.JOB_WORKERS,
+            help="Number of worker threads",
+        )
+        parser.add_argument(
+            "--kind",
+            dest="kinds",
+            action="append",
+            default=[],
+            help="Only run jobs of this kind (repeatable)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling an empty queue again",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is due instead of waiting for more",
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        processed = []
+        kwargs = {
+            "stop": stop,
+            "once": options["once"],
+            "poll_interval": options["poll_interval"],
+            "kinds": options["kinds"],
+        }
+        threads = [
+            threading.Thread(target=lambda: processed.append(work(**kwargs)))
+            for _ in range(options["workers"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(self.style.SUCCESS(f"Ran {sum(processed)} job(s)"))
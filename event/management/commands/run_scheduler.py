@@ -0,0 +1,43 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from event.metrics import serve_metrics
+from event.scheduler import Scheduler
+
+
+class Command(BaseCommand):
+    help = "Open and close events as their publish dates pass"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.EVENT_SCHEDULER_BATCH_SIZE,
+            help="Events changed per UPDATE",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Apply the transitions due now and exit",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Serve the scheduler metrics for Prometheus on this port",
+        )
+
+    def handle(self, *args, **options):
+        if options["metrics_port"]:
+            serve_metrics(options["metrics_port"])
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        scheduler = Scheduler(batch_size=options["batch_size"])
+        totals = scheduler.run(stop=stop, once=options["once"])
+        summary = ", ".join(f"{count} {name}" for name, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(f"Transitions: {summary}"))
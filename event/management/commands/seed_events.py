@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from event.seed import seed_events
+
+
+class Command(BaseCommand):
+    help = "Insert synthetic events and bookings, for benchmarks and load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=10000)
+        parser.add_argument(
+            "--attendees",
+            type=int,
+            default=200,
+            help="Maximum number of bookings per event",
+        )
+        parser.add_argument(
+            "--onsite-ratio",
+            type=float,
+            default=0.5,
+            help="Share of onsite events, the rest are virtual",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            uuids = seed_events(
+                options["events"],
+                batch_size=options["batch_size"],
+                seed=options["seed"],
+                onsite_ratio=options["onsite_ratio"],
+                max_attendees=options["attendees"],
+            )
+        self.stdout.write(self.style.SUCCESS(f"Seeded {len(uuids)} event(s)"))
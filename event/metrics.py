@@ -0,0 +1,297 @@
+"""Per-request query, upstream call and serialization timings.
+
+``RequestMetricsMiddleware`` (opt in with ``EVENT_METRICS_ENABLED``) starts a
+``RequestMetrics`` for every request, sync or async, counts the database
+queries run for it on any connection, and collects whatever the Google clients
+and serializers record with ``timed()``. The totals go out as a
+``Server-Timing`` header and are added to in-process aggregates, which
+``metrics_view`` serves in the Prometheus text format. The aggregates are
+per process, so every worker has to be scraped. Streaming responses are
+measured up to the point the view returns, not until the body is sent.
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+try:
+    from asgiref.sync import markcoroutinefunction
+except ImportError:  # asgiref < 3.6
+
+    def markcoroutinefunction(func):
+        func._is_coroutine = asyncio.coroutines._is_coroutine
+        return func
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds, in seconds, of the request duration histogram buckets.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar("event_request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Counts and durations recorded while one request is handled.
+
+    ``calls`` maps a name (``"db"``, ``"serialize"``, an upstream service) to
+    ``[count, seconds]``. Batch lookups record from worker threads, hence the
+    lock.
+    """
+
+    def __init__(self) -> None:
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, duration) -> None:
+        with self.lock:
+            count, total = self.calls.get(name, (0, 0.0))
+            self.calls[name] = [count + 1, total + duration]
+
+    def server_timing(self, total) -> str:
+        entries = [
+            f'{name};dur={seconds * 1000:.1f};desc="{count}"'
+            for name, (count, seconds) in sorted(self.calls.items())
+        ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def record(name, duration) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.record(name, duration)
+
+
+@contextmanager
+def timed(name):
+    """Record the time spent in the block under ``name``, if instrumented."""
+    if _current.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+class TimedDataMixin:
+    """Record the time a serializer spends building ``.data`` as ``serialize``."""
+
+    @property
+    def data(self):
+        with timed("serialize"):
+            return super().data
+
+
+class MetricsRegistry:
+    """In-process totals per ``(view, method)``, and counters and gauges set
+    by other parts of the app, like the scheduler."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.requests = {}
+            self.durations = {}
+            self.calls = {}
+            self.metrics = {}
+
+    def increment(self, name, help_text, amount=1, **labels) -> None:
+        self._update(name, "counter", help_text, labels, lambda value: value + amount)
+
+    def set_gauge(self, name, help_text, value, **labels) -> None:
+        self._update(name, "gauge", help_text, labels, lambda _: value)
+
+    def _update(self, name, kind, help_text, labels, update) -> None:
+        with self.lock:
+            _, _, values = self.metrics.setdefault(name, (kind, help_text, {}))
+            key = tuple(sorted(labels.items()))
+            values[key] = update(values.get(key, 0))
+
+    def observe(self, view, method, status, duration, metrics) -> None:
+        with self.lock:
+            key = (view, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            buckets, total, count = self.durations.get(
+                (view, method), ([0] * len(DURATION_BUCKETS), 0.0, 0)
+            )
+            buckets = [
+                hits + (duration <= bound)
+                for hits, bound in zip(buckets, DURATION_BUCKETS)
+            ]
+            self.durations[(view, method)] = (buckets, total + duration, count + 1)
+
+            for name, (calls, seconds) in metrics.calls.items():
+                key = (view, method, name)
+                old_calls, old_seconds = self.calls.get(key, (0, 0.0))
+                self.calls[key] = (old_calls + calls, old_seconds + seconds)
+
+    def render(self) -> str:
+        with self.lock:
+            lines = describe(
+                "event_http_requests_total", "counter", "Requests handled."
+            )
+            for (view, method, status), count in sorted(self.requests.items()):
+                labels = format_labels(view=view, method=method, status=status)
+                lines.append(f"event_http_requests_total{labels} {count}")
+
+            name = "event_http_request_duration_seconds"
+            lines += describe(name, "histogram", "Request duration.")
+            for (view, method), (buckets, total, count) in sorted(
+                self.durations.items()
+            ):
+                for bound, hits in zip(DURATION_BUCKETS + ("+Inf",), buckets + [count]):
+                    labels = format_labels(view=view, method=method, le=bound)
+                    lines.append(f"{name}_bucket{labels} {hits}")
+                labels = format_labels(view=view, method=method)
+                lines.append(f"{name}_sum{labels} {total}")
+                lines.append(f"{name}_count{labels} {count}")
+
+            calls = sorted(self.calls.items())
+            lines += describe(
+                "event_calls_total",
+                "counter",
+                "Database queries, upstream calls and serializations by request.",
+            )
+            for (view, method, call), (count, _) in calls:
+                labels = format_labels(view=view, method=method, call=call)
+                lines.append(f"event_calls_total{labels} {count}")
+            lines += describe(
+                "event_call_duration_seconds_total",
+                "counter",
+                "Time spent in those calls.",
+            )
+            for (view, method, call), (_, seconds) in calls:
+                labels = format_labels(view=view, method=method, call=call)
+                lines.append(f"event_call_duration_seconds_total{labels} {seconds}")
+
+            for name, (kind, help_text, values) in sorted(self.metrics.items()):
+                lines += describe(name, kind, help_text)
+                for key, value in sorted(values.items()):
+                    labels = format_labels(**dict(key)) if key else ""
+                    lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def describe(name, kind, help_text) -> list:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def format_labels(**labels) -> str:
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+registry = MetricsRegistry()
+
+
+def view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match._func_path
+
+
+def time_query(execute, sql, params, many, context):
+    with timed("db"):
+        return execute(sql, params, many, context)
+
+
+def install_query_timer(connection, **kwargs) -> None:
+    # Async views run their queries on another thread's connection, so every
+    # connection times its queries, for whichever request is current.
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        if not settings.EVENT_METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_timer, dispatch_uid=__name__)
+        for alias in connections:
+            install_query_timer(connections[alias])
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        duration = time.perf_counter() - start
+        response["Server-Timing"] = metrics.server_timing(duration)
+        registry.observe(
+            view_name(request), request.method, response.status_code, duration, metrics
+        )
+        return response
+
+
+def metrics_view(request):
+    if not settings.EVENT_METRICS_ENABLED:
+        raise Http404()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
+
+
+def serve_metrics(port, host="") -> ThreadingHTTPServer:
+    """Serve the registry on ``port`` from a daemon thread.
+
+    For processes without a web server of their own, like the scheduler.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 08:39
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0011_rename_event_date_event_event_end_date_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='event_uuid',
+            field=models.UUIDField(default=uuid.UUID('0066040e-f78b-4449-b2a7-0b63699a0ef4')),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['event_start_date', 'id'], name='event_start_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.1 on 2026-10-18 08:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def copy_attendees_to_bookings(apps, schema_editor):
+    Event = apps.get_model('event', 'Event')
+    Booking = apps.get_model('event', 'Booking')
+
+    for event in Event.objects.only('id', 'event_attendees').iterator(chunk_size=500):
+        emails = dict.fromkeys(email for email in event.event_attendees or [] if email)
+        Booking.objects.bulk_create(
+            [Booking(event_id=event.id, attendee_email=email) for email in emails],
+            ignore_conflicts=True,
+        )
+
+
+def copy_bookings_to_attendees(apps, schema_editor):
+    Event = apps.get_model('event', 'Event')
+    Booking = apps.get_model('event', 'Booking')
+
+    attendees = {}
+    for event_id, email in Booking.objects.order_by('id').values_list('event_id', 'attendee_email').iterator():
+        attendees.setdefault(event_id, []).append(email)
+    for event_id, emails in attendees.items():
+        Event.objects.filter(pk=event_id).update(event_attendees=emails)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0012_event_start_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='event_uuid',
+            field=models.UUIDField(default=uuid.UUID('209ecebe-c99e-4338-b8e0-50251c12b3a8')),
+        ),
+        migrations.CreateModel(
+            name='Booking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attendee_email', models.EmailField(max_length=254, verbose_name='Attendee Email')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='event.event')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(fields=('event', 'attendee_email'), name='unique_event_attendee'),
+        ),
+        migrations.RunPython(copy_attendees_to_bookings, copy_bookings_to_attendees),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1 on 2026-10-18 08:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # Kept apart from 0013 so the backfilled booking rows are committed before
+    # the event table is altered.
+    dependencies = [
+        ('event', '0013_booking'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='event',
+            name='event_attendees',
+        ),
+    ]
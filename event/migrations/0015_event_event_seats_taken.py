@@ -0,0 +1,41 @@
+# Generated by Django 4.1 on 2026-10-18 08:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import uuid
+
+
+def count_booked_seats(apps, schema_editor):
+    Event = apps.get_model('event', 'Event')
+    Booking = apps.get_model('event', 'Booking')
+
+    booked = (
+        Booking.objects.filter(event=OuterRef('pk'))
+        .order_by()
+        .values('event')
+        .annotate(seats=Count('id'))
+        .values('seats')
+    )
+    Event.objects.update(event_seats_taken=Coalesce(Subquery(booked), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0014_remove_event_event_attendees'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='event_seats_taken',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Seats Taken'),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='event_uuid',
+            field=models.UUIDField(default=uuid.UUID('480ec3e9-41b1-415e-bdf7-c5289be4f4a7')),
+        ),
+        migrations.RunPython(count_booked_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 4.1 on 2026-10-18 08:53
+
+import uuid
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def set_geocode_status(apps, schema_editor):
+    Event = apps.get_model("event", "Event")
+
+    onsite = Event.objects.filter(event_location_type="onsite").exclude(
+        event_address=""
+    )
+    onsite.filter(
+        event_location_latitude__isnull=False, event_location_lognitude__isnull=False
+    ).update(geocode_status="done")
+    # Left for `manage.py regeocode_events` to pick up.
+    onsite.filter(geocode_status__isnull=True).update(geocode_status="failed")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("event", "0015_event_event_seats_taken"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=50)),
+                ("payload", models.JSONField(blank=True, default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("max_attempts", models.PositiveIntegerField(default=5)),
+                ("run_after", models.DateTimeField(default=django.utils.timezone.now)),
+                ("locked_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="geocode_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("pending", "Pending"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                max_length=20,
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="event",
+            name="event_uuid",
+            field=models.UUIDField(
+                default=uuid.UUID("a5941207-ad16-4f5f-aa5d-365d0420f642")
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["run_after", "id"],
+                name="job_pending_run_after_idx",
+            ),
+        ),
+        migrations.RunPython(set_geocode_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.1 on 2026-10-18 08:56
+
+import uuid
+
+from django.db import migrations, models
+
+from event import geohash
+
+
+def set_geohashes(apps, schema_editor):
+    Event = apps.get_model("event", "Event")
+
+    located = Event.objects.filter(
+        event_location_latitude__isnull=False, event_location_lognitude__isnull=False
+    ).only("event_location_latitude", "event_location_lognitude")
+    batch = []
+    for event in located.iterator(chunk_size=2000):
+        event.event_geohash = geohash.encode(
+            event.event_location_latitude, event.event_location_lognitude
+        )
+        batch.append(event)
+        if len(batch) == 2000:
+            Event.objects.bulk_update(batch, ["event_geohash"])
+            batch = []
+    Event.objects.bulk_update(batch, ["event_geohash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("event", "0016_job_event_geocode_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="event_geohash",
+            field=models.CharField(blank=True, db_index=True, max_length=12),
+        ),
+        migrations.AlterField(
+            model_name="event",
+            name="event_uuid",
+            field=models.UUIDField(
+                default=uuid.UUID("befe3785-bdd5-4cfb-8e91-70333b1d1b92")
+            ),
+        ),
+        migrations.RunPython(set_geohashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.1 on 2026-10-18 09:09
+
+import uuid
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the event table against writes.
+    atomic = False
+
+    dependencies = [
+        ("event", "0017_event_geohash"),
+    ]
+
+    operations = [
+        # An AlterField to db_index=True would run a plain CREATE INDEX. Build
+        # the same index, under the name Django gives it, concurrently and
+        # only record db_index in the state.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="event",
+                    name="event_uuid",
+                    field=models.UUIDField(
+                        db_index=True,
+                        default=uuid.UUID("da7ca5b3-56a1-47df-8635-f4eb0b777781"),
+                    ),
+                ),
+            ],
+            database_operations=[
+                AddIndexConcurrently(
+                    model_name="event",
+                    index=models.Index(
+                        fields=["event_uuid"], name="event_event_event_uuid_6650706a"
+                    ),
+                ),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name="event",
+            index=models.Index(
+                fields=["event_status", "event_start_date", "id"],
+                name="event_status_start_date_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="event",
+            index=models.Index(
+                fields=["event_payment_type", "event_start_date", "id"],
+                name="event_payment_start_date_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("event_status", "open")),
+                fields=["event_payment_type", "event_start_date", "id"],
+                name="event_open_start_date_idx",
+            ),
+        ),
+    ]
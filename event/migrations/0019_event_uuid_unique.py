@@ -0,0 +1,47 @@
+# Generated by Django 4.1 on 2026-10-18 09:13
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+import event.uuid7
+
+
+def rekey_duplicate_uuids(apps, schema_editor):
+    """Give every event but the oldest of each shared uuid a fresh one.
+
+    The oldest keeps the uuid, so links handed out for it keep resolving to
+    the event they resolved to before.
+    """
+    Event = apps.get_model("event", "Event")
+
+    duplicated = (
+        Event.objects.order_by()
+        .values("event_uuid")
+        .annotate(copies=Count("id"), first_id=Min("id"))
+        .filter(copies__gt=1)
+    )
+    for duplicate in duplicated:
+        rekeyed = list(
+            Event.objects.filter(event_uuid=duplicate["event_uuid"])
+            .exclude(id=duplicate["first_id"])
+            .only("id")
+        )
+        for row in rekeyed:
+            row.event_uuid = event.uuid7.uuid7()
+        Event.objects.bulk_update(rekeyed, ["event_uuid"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("event", "0018_event_listing_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_duplicate_uuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="event",
+            name="event_uuid",
+            field=models.UUIDField(default=event.uuid7.uuid7, unique=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.1 on 2026-10-18 09:39
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the event table against writes.
+    atomic = False
+
+    dependencies = [
+        ("event", "0020_event_updated_at"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("event_status", "draft")),
+                fields=["event_published_date", "id"],
+                name="event_draft_publish_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("event_status", "open")),
+                fields=["event_publish_end_date", "id"],
+                name="event_open_publish_end_idx",
+            ),
+        ),
+    ]
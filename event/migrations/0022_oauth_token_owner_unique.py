@@ -0,0 +1,59 @@
+# Generated by Django 4.1 on 2026-10-18 09:47
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_tokens(apps, schema_editor):
+    """Keep only the newest token of each user and provider.
+
+    Views used to pick ``objects.last()``, so the newest row is the one that
+    was in use.
+    """
+    OuthTokenModel = apps.get_model("event", "OuthTokenModel")
+
+    duplicated = (
+        OuthTokenModel.objects.order_by()
+        .filter(token_owner__isnull=False, token_provider__isnull=False)
+        .values("token_owner", "token_provider")
+        .annotate(copies=Count("id"), last_id=Max("id"))
+        .filter(copies__gt=1)
+    )
+    for duplicate in duplicated:
+        OuthTokenModel.objects.filter(
+            token_owner=duplicate["token_owner"],
+            token_provider=duplicate["token_provider"],
+        ).exclude(id=duplicate["last_id"]).delete()
+
+
+def fix_token_expiry(apps, schema_editor):
+    """Expiry times were saved ``expires_in`` days, not seconds, after issue."""
+    OuthTokenModel = apps.get_model("event", "OuthTokenModel")
+
+    tokens = list(OuthTokenModel.objects.only("id", "token_expire_time", "expires_in"))
+    for token in tokens:
+        token.token_expire_time += timedelta(seconds=token.expires_in) - timedelta(
+            days=token.expires_in
+        )
+    OuthTokenModel.objects.bulk_update(tokens, ["token_expire_time"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("event", "0021_event_schedule_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_tokens, migrations.RunPython.noop),
+        migrations.RunPython(fix_token_expiry, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="outhtokenmodel",
+            constraint=models.UniqueConstraint(
+                fields=("token_owner", "token_provider"),
+                name="oauth_token_owner_provider_uniq",
+            ),
+        ),
+    ]
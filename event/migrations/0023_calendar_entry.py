@@ -0,0 +1,70 @@
+# Generated by Django 4.1 on 2026-10-18 09:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("event", "0022_oauth_token_owner_unique"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CalendarEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "attendee_email",
+                    models.EmailField(max_length=254, verbose_name="Attendee Email"),
+                ),
+                ("calendar_event_id", models.CharField(blank=True, max_length=1024)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("synced", "Synced"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("synced_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="calendar_entries",
+                        to="event.event",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="calendarentry",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["event", "id"],
+                name="calendar_entry_pending_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="calendarentry",
+            constraint=models.UniqueConstraint(
+                fields=("event", "attendee_email"), name="unique_calendar_entry"
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.1 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("event", "0023_calendar_entry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendarentry",
+            name="locked_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="calendarentry",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("syncing", "Syncing"),
+                    ("synced", "Synced"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+    ]
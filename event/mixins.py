@@ -0,0 +1,55 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified validators and 304 responses for a viewset.
+
+    Validators are built from ``(pk, updated_at)`` pairs, which a view can get
+    from a query that touches no other column. A client that already has the
+    current representation gets a 304 without the objects being loaded or
+    serialized.
+    """
+
+    def is_conditional_request(self):
+        return (
+            "HTTP_IF_NONE_MATCH" in self.request.META
+            or "HTTP_IF_MODIFIED_SINCE" in self.request.META
+        )
+
+    def get_validators(self, versions, *extra):
+        """``(etag, last_modified)`` for a list of ``(pk, updated_at)`` pairs.
+
+        ``extra`` is anything else the representation depends on. The user
+        is part of it, since owners see more of their events.
+        """
+        state = repr(
+            (
+                self.request.accepted_renderer.format,
+                self.request.user.pk,
+                [(pk, updated_at.isoformat()) for pk, updated_at in versions],
+                extra,
+            )
+        )
+        etag = quote_etag(hashlib.sha1(state.encode("utf-8")).hexdigest())
+        last_modified = max((updated_at for _, updated_at in versions), default=None)
+        return etag, last_modified and int(last_modified.timestamp())
+
+    def get_not_modified_response(self, etag, last_modified):
+        """A 304 if the request's conditional headers match, else ``None``."""
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            self.set_validator_headers(response, etag, last_modified)
+        return response
+
+    def set_validator_headers(self, response, etag, last_modified):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        # Cacheable, but only after checking back with us.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
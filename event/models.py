@@ -1,15 +1,19 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Tuple
-from uuid import uuid4
 
 from django.contrib.auth import get_user_model
-from django.contrib.postgres.fields import ArrayField
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import APIException
 
+from event import geohash
+from event.cache import invalidate_representation, invalidate_representations
+from event.exceptions import AlreadyBooked, EventFullyBooked
+from event.uuid7 import uuid7
+
 # Create your models here.
 
 User = get_user_model()
@@ -38,10 +42,44 @@ class EventStatus(models.TextChoices):
     CLOSED = "closed", _("Closed")
 
 
+class EventTransition(models.TextChoices):
+    """Lifecycle changes that can be applied to many events at once"""
+
+    PUBLISH = "publish", _("Publish")
+    OPEN = "open", _("Open")
+    CLOSE = "close", _("Close")
+    CANCEL = "cancel", _("Cancel")
+
+
+class GeocodeStatus(models.TextChoices):
+    """Progress of the background geocoding of an onsite event's address"""
+
+    PENDING = "pending", _("Pending")
+    DONE = "done", _("Done")
+    FAILED = "failed", _("Failed")
+
+
+class JobStatus(models.TextChoices):
+
+    PENDING = "pending", _("Pending")
+    RUNNING = "running", _("Running")
+    DONE = "done", _("Done")
+    FAILED = "failed", _("Failed")
+
+
+class CalendarEntryStatus(models.TextChoices):
+    """Progress of copying an event to an attendee's Google Calendar"""
+
+    PENDING = "pending", _("Pending")
+    SYNCING = "syncing", _("Syncing")
+    SYNCED = "synced", _("Synced")
+    FAILED = "failed", _("Failed")
+
+
 class Event(models.Model):
 
     # General Data
-    event_uuid = models.UUIDField(default=uuid4())
+    event_uuid = models.UUIDField(default=uuid7, unique=True)
     event_owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     event_name = models.CharField(
         _("Event Name"), max_length=40, blank=False, null=False
@@ -57,13 +95,6 @@ class Event(models.Model):
     event_payment_type = models.CharField(
         choices=EventPaymentType.choices, default=EventPaymentType.FREE, max_length=20
     )
-    event_attendees = ArrayField(
-        base_field=models.EmailField(
-            _("Event Attendees"), max_length=50, blank=True, null=True
-        ),
-        default=list,
-    )
-
     event_location_type = models.CharField(
         choices=EventLocationType.choices,
         default=EventLocationType.ONSITE,
@@ -80,6 +111,12 @@ class Event(models.Model):
     event_location_lognitude = models.DecimalField(
         max_digits=9, decimal_places=6, null=True, blank=True
     )
+    # Indexed for the nearby events search (see event.nearby).
+    event_geohash = models.CharField(max_length=12, blank=True, db_index=True)
+    # Coordinates are filled in by a background job (see event.tasks).
+    geocode_status = models.CharField(
+        max_length=20, choices=GeocodeStatus.choices, blank=True, null=True
+    )
 
     # VIRTUAL DATA
     event_url_link = models.URLField(blank=True)
@@ -87,33 +124,160 @@ class Event(models.Model):
     event_max_participant_num = models.PositiveBigIntegerField(
         _("Maximum Participant"), blank=True, null=True
     )
+    # Denormalized count of bookings, only ever changed through F() updates.
+    event_seats_taken = models.PositiveBigIntegerField(_("Seats Taken"), default=0)
     event_status = models.CharField(
         max_length=20, choices=EventStatus.choices, default=EventStatus.DRAFT
     )
+    # Bumped on every change, including bookings. Drives the ETag and
+    # Last-Modified headers of the event API.
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         # constriant = [
         #    models.CheckConstraint(check=models.F("event_publish_date") <= models.F("event_publish_end_date"), name="Publish_date_less_than_end_date"),
         #    models.CheckConstraint(check=models.F("event_date") >= models.F("evnent_publish_date__date"))
         # ]
-        pass
+        indexes = [
+            # Keyset pagination of the event listing (see event.pagination)
+            models.Index(
+                fields=["event_start_date", "id"], name="event_start_date_id_idx"
+            ),
+            # The same listing filtered by ?event_status= / ?event_payment_type=
+            models.Index(
+                fields=["event_status", "event_start_date", "id"],
+                name="event_status_start_date_idx",
+            ),
+            models.Index(
+                fields=["event_payment_type", "event_start_date", "id"],
+                name="event_payment_start_date_idx",
+            ),
+            # Open events by payment type, the most common public query. Only
+            # covers open events, a small slice once old events pile up.
+            models.Index(
+                fields=["event_payment_type", "event_start_date", "id"],
+                name="event_open_start_date_idx",
+                condition=Q(event_status="open"),
+            ),
+            # Due and upcoming transitions of the scheduler (see event.scheduler)
+            models.Index(
+                fields=["event_published_date", "id"],
+                name="event_draft_publish_idx",
+                condition=Q(event_status="draft"),
+            ),
+            models.Index(
+                fields=["event_publish_end_date", "id"],
+                name="event_open_publish_end_idx",
+                condition=Q(event_status="open"),
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Event-{self.event_uuid}"
 
-    def save(self, *args, **kwargs) -> None:
+    def set_derived_fields(self) -> None:
+        """Fields worked out from the others, also used before ``bulk_create``."""
         if not self.event_published_date or not self.event_publish_end_date:
             self.event_status = EventStatus.DRAFT
 
-        return super().save(*args, **kwargs)
+        if (
+            self.event_location_latitude is not None
+            and self.event_location_lognitude is not None
+        ):
+            self.event_geohash = geohash.encode(
+                self.event_location_latitude, self.event_location_lognitude
+            )
+        else:
+            self.event_geohash = ""
+
+    def save(self, *args, **kwargs) -> None:
+        self.set_derived_fields()
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # Never write back a stale seat counter over concurrent bookings.
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "event_seats_taken"
+            ]
+        replaced_version = None if self._state.adding else self.updated_at
+        super().save(*args, **kwargs)
+        invalidate_representation(self.pk, replaced_version)
 
     def reserve_space(self, email):
-        if self.event_max_participant_num:
-            if len(self.event_attendees) < self.event_max_participant_num:
-                self.event_attendees.append(email)
-        self.save()
+        """Book a seat for ``email``.
+
+        The seat is claimed with a single conditional
+        ``UPDATE ... SET event_seats_taken = event_seats_taken + 1
+        WHERE event_seats_taken < event_max_participant_num``, so capacity is
+        checked without reading the bookings. A duplicate booking fails the
+        insert, which rolls the claimed seat back with the whole transaction,
+        so a booking is one update and one insert.
+        """
+        has_free_seat = Q(event_max_participant_num__isnull=True) | Q(
+            event_seats_taken__lt=F("event_max_participant_num")
+        )
+        try:
+            with transaction.atomic():
+                claimed = Event.objects.filter(has_free_seat, pk=self.pk).update(
+                    event_seats_taken=F("event_seats_taken") + 1,
+                    updated_at=timezone.now(),
+                )
+                if not claimed:
+                    raise EventFullyBooked()
+                booking = Booking.objects.create(event=self, attendee_email=email)
+        except IntegrityError:
+            raise AlreadyBooked()
+        invalidate_representation(self.pk, self.updated_at)
+        return booking
+
+    @staticmethod
+    def bulk_transition(queryset, transition):
+        """Apply ``transition`` to the events of ``queryset`` in one UPDATE.
+
+        Follows the single event methods: publishing needs a publish end date
+        and stamps the publish date, and an event without both publish dates
+        stays a draft. Those events, and the ones already in the target
+        status, are left alone. Returns the uuids of the updated and the
+        skipped events.
+        """
+        target = {
+            EventTransition.PUBLISH: EventStatus.OPEN,
+            EventTransition.OPEN: EventStatus.OPEN,
+            EventTransition.CLOSE: EventStatus.CLOSED,
+            EventTransition.CANCEL: EventStatus.CANCELD,
+        }[transition]
+        now = timezone.now()
+        changes = {"event_status": target, "updated_at": now}
+        if transition == EventTransition.PUBLISH:
+            changes["event_published_date"] = now
+
+        with transaction.atomic():
+            rows = queryset.select_for_update().values_list(
+                "pk",
+                "event_uuid",
+                "updated_at",
+                "event_status",
+                "event_published_date",
+                "event_publish_end_date",
+            )
+            updated, skipped, replaced = [], [], []
+            for pk, uuid, updated_at, status, published, publish_end in rows:
+                if transition == EventTransition.PUBLISH:
+                    published = published or now
+                if status == target or not (published and publish_end):
+                    skipped.append(uuid)
+                else:
+                    updated.append(uuid)
+                    replaced.append((pk, updated_at))
+            if replaced:
+                Event.objects.filter(pk__in=[pk for pk, _ in replaced]).update(
+                    **changes
+                )
+        invalidate_representations(replaced)
+        return updated, skipped
 
-    def publish_event(self):
+    def publish_event(self) -> bool:
+        """Open the event. Returns whether it was not open already."""
 
         if self.event_status != EventStatus.OPEN:
 
@@ -124,22 +288,26 @@ class Event(models.Model):
                 )
             self.event_status = EventStatus.OPEN
             self.event_published_date = timezone.now()
-
-        else:
-            self.event_status = EventStatus.OPEN
-        self.save()
+            self.save(
+                update_fields=["event_status", "event_published_date", "updated_at"]
+            )
+            return True
+        return False
 
     def cancel_event(self):
         self.event_status = EventStatus.CANCELD
-        self.save()
+        self.save(update_fields=["event_status", "updated_at"])
 
     def close_event(self):
         self.event_status = EventStatus.CLOSED
-        self.save()
+        self.save(update_fields=["event_status", "updated_at"])
 
-    def open_event(self):
+    def open_event(self) -> bool:
+        """Open the event. Returns whether it was not open already."""
+        opened = self.event_status != EventStatus.OPEN
         self.event_status = EventStatus.OPEN
-        self.save()
+        self.save(update_fields=["event_status", "updated_at"])
+        return opened
 
     def get_absolute_url(self):
         return reverse("event-detail", args=[str(self.event_uuid)])
@@ -158,6 +326,57 @@ class Event(models.Model):
             return self.event_url_link
 
 
+class Booking(models.Model):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="bookings")
+    attendee_email = models.EmailField(_("Attendee Email"))
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["event", "attendee_email"], name="unique_event_attendee"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"Booking-{self.attendee_email}-{self.event_id}"
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by ``manage.py run_jobs``.
+
+    ``kind`` names the handler registered in ``event.jobs`` and ``payload`` is
+    passed to it. Failed jobs are retried with backoff until ``max_attempts``.
+    """
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=20, choices=JobStatus.choices, default=JobStatus.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll for due pending jobs.
+            models.Index(
+                fields=["run_after", "id"],
+                name="job_pending_run_after_idx",
+                condition=Q(status="pending"),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"Job-{self.kind}-{self.pk}"
+
+
 class OuthTokenModel(models.Model):
     token_provider = models.CharField(max_length=250, blank=True, null=True)
     access_token = models.CharField(max_length=250, blank=True)
@@ -168,13 +387,68 @@ class OuthTokenModel(models.Model):
     scope = models.CharField(max_length=250, blank=True, null=True)
     token_type = models.CharField(max_length=250, blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            # One token per user and provider, see event.googleapi.tokens.
+            models.UniqueConstraint(
+                fields=["token_owner", "token_provider"],
+                name="oauth_token_owner_provider_uniq",
+            ),
+        ]
+
     def is_expired(self):
-        return self.token_expire_time < datetime.now()
+        return self.token_expire_time <= timezone.now()
+
+    def seconds_left(self) -> float:
+        return (self.token_expire_time - timezone.now()).total_seconds()
 
     def save(self, *args, **kwargs):
-        if self._state.adding:
-            self.token_expire_time = datetime.now() + timedelta(self.expires_in)
+        if self._state.adding and self.token_expire_time is None:
+            self.token_expire_time = timezone.now() + timedelta(seconds=self.expires_in)
         return super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return f"Token {self.access_token}"
+
+
+class CalendarEntry(models.Model):
+    """An event in an attendee's Google Calendar, kept up to date by
+    ``event.calendar_sync``.
+
+    Pending entries are the sync's remaining work, and syncing ones have been
+    claimed by a job at ``locked_at``; ``calendar_event_id`` is the Google
+    event to update once it has been created.
+    """
+
+    event = models.ForeignKey(
+        Event, on_delete=models.CASCADE, related_name="calendar_entries"
+    )
+    attendee_email = models.EmailField(_("Attendee Email"))
+    calendar_event_id = models.CharField(max_length=1024, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=CalendarEntryStatus.choices,
+        default=CalendarEntryStatus.PENDING,
+    )
+    last_error = models.TextField(blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    synced_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["event", "attendee_email"], name="unique_calendar_entry"
+            )
+        ]
+        indexes = [
+            # Sync jobs claim an event's pending entries in id order.
+            models.Index(
+                fields=["event", "id"],
+                name="calendar_entry_pending_idx",
+                condition=Q(status="pending"),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"CalendarEntry-{self.attendee_email}-{self.event_id}"
@@ -0,0 +1,74 @@
+"""Nearby events search on the ``event_geohash`` index.
+
+The circle around the point is covered by at most nine geohash cells, each
+one a prefix scan of the index. Only the events in those cells (and in the
+circle's bounding box) get their exact great circle distance computed.
+"""
+import math
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+from event.geohash import EARTH_RADIUS_KM, bounding_box, covering_cells
+
+
+def distance_km(latitude, longitude):
+    """Haversine distance from the point to each event, as an expression."""
+    lat = Radians(Cast("event_location_latitude", FloatField()))
+    lng = Radians(Cast("event_location_lognitude", FloatField()))
+    origin_lat = Value(math.radians(latitude))
+    origin_lng = Value(math.radians(longitude))
+    a = Power(Sin((lat - origin_lat) / 2), 2) + Cos(origin_lat) * Cos(lat) * Power(
+        Sin((lng - origin_lng) / 2), 2
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """Events of ``queryset`` within ``radius_km``, nearest first.
+
+    Each event is annotated with its ``distance_km``.
+    """
+    cells = covering_cells(latitude, longitude, radius_km)
+    queryset = queryset.exclude(event_geohash="").filter(
+        reduce(or_, (Q(event_geohash__startswith=cell) for cell in cells))
+    )
+
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    queryset = queryset.filter(
+        event_location_latitude__gte=min_lat, event_location_latitude__lte=max_lat
+    )
+    if min_lng is not None:
+        queryset = queryset.filter(
+            event_location_lognitude__gte=min_lng,
+            event_location_lognitude__lte=max_lng,
+        )
+
+    return (
+        queryset.annotate(distance_km=distance_km(latitude, longitude))
+        .filter(distance_km__lte=radius_km)
+        .order_by("distance_km", "id")
+    )
+
+
+def nearby_events(queryset, latitude, longitude, radius_km=None, limit=None) -> list:
+    """The ``limit`` events nearest to the point.
+
+    With a ``radius_km`` only events inside it are returned. Without one the
+    search starts small and widens until ``limit`` events are found or
+    ``EVENT_NEARBY_MAX_RADIUS_KM`` is reached, so dense areas stay a handful
+    of index lookups.
+    """
+    limit = limit or settings.EVENT_NEARBY_DEFAULT_LIMIT
+    if radius_km is not None:
+        return list(within_radius(queryset, latitude, longitude, radius_km)[:limit])
+
+    radius_km = settings.EVENT_NEARBY_INITIAL_RADIUS_KM
+    while True:
+        events = list(within_radius(queryset, latitude, longitude, radius_km)[:limit])
+        if len(events) >= limit or radius_km >= settings.EVENT_NEARBY_MAX_RADIUS_KM:
+            return events
+        radius_km = min(radius_km * 4, settings.EVENT_NEARBY_MAX_RADIUS_KM)
@@ -0,0 +1,130 @@
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class EventKeysetPagination(CursorPagination):
+    """Keyset pagination over ``(event_start_date, id)``.
+
+    DRF's stock cursor pagination only keeps the first ordering field in the
+    cursor and falls back to OFFSET for rows that share it. Events share start
+    dates all the time, so the cursor here carries both columns and a page of
+    dated events is an index range on ``(event_start_date, id)`` that starts at
+    the cursor, however deep the client pages. Events without a start date are
+    listed last, read as a second range of the same index.
+    """
+
+    page_size = settings.EVENT_LIST_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.EVENT_LIST_MAX_PAGE_SIZE
+    ordering = ("event_start_date", "id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            position, self.reverse = None, False
+        else:
+            position, self.reverse = (
+                self.decode_position(cursor.position),
+                cursor.reverse,
+            )
+
+        # Fetch one extra row to know whether there is another page.
+        limit = self.page_size + 1
+        parts = [
+            part[:limit]
+            for part in self.get_keyset_parts(queryset, position, self.reverse)
+        ]
+        results = list(parts[0].union(*parts[1:], all=True) if parts[1:] else parts[0])
+        results.sort(key=self.get_sort_key, reverse=self.reverse)
+        results = results[:limit]
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self.encode_position(self.page[-1])
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self.encode_position(self.page[0])
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def get_keyset_parts(self, queryset, position, reverse):
+        """The ranges the page is read from, in the order they are listed.
+
+        Each one is a range on the ``(event_start_date, id)`` index bounded by
+        the cursor: ``event_start_date >= d`` (or ``<=`` going back) is the
+        seek, and only the rows sharing ``d`` are checked against the id.
+        Dated and undated events are separate ranges, sent as one
+        ``UNION ALL`` with a ``LIMIT`` on each.
+        """
+        dated = queryset.filter(event_start_date__isnull=False)
+        undated = queryset.filter(event_start_date__isnull=True)
+        if reverse:
+            dated = dated.order_by("-event_start_date", "-id")
+            undated = undated.order_by("-id")
+        else:
+            dated = dated.order_by("event_start_date", "id")
+            undated = undated.order_by("id")
+        if position is None:
+            return [undated, dated] if reverse else [dated, undated]
+
+        start_date, pk = position
+        if start_date is None:
+            if reverse:
+                return [undated.filter(id__lt=pk), dated]
+            return [undated.filter(id__gt=pk)]
+
+        if reverse:
+            return [
+                dated.filter(event_start_date__lte=start_date).filter(
+                    Q(event_start_date__lt=start_date) | Q(id__lt=pk)
+                )
+            ]
+        return [
+            dated.filter(event_start_date__gte=start_date).filter(
+                Q(event_start_date__gt=start_date) | Q(id__gt=pk)
+            ),
+            undated,
+        ]
+
+    def get_sort_key(self, event):
+        start_date = event.event_start_date
+        return (start_date is None, start_date or date.min, event.pk)
+
+    def encode_position(self, event):
+        start_date = (
+            event.event_start_date.isoformat() if event.event_start_date else ""
+        )
+        return f"{start_date}|{event.pk}"
+
+    def decode_position(self, position):
+        if position is None:
+            return None
+        try:
+            start_date, pk = position.split("|")
+            return (date.fromisoformat(start_date) if start_date else None, int(pk))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
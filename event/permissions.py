@@ -8,3 +8,10 @@ class IsOwnerorReadonly(permissions.BasePermission):
         if request.user == event.event_owner:
             return True
         return False
+
+
+class IsEventOwner(permissions.BasePermission):
+    """Only the event's owner, whatever the method."""
+
+    def has_object_permission(self, request, view, event):
+        return request.user.is_authenticated and request.user == event.event_owner
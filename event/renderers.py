@@ -0,0 +1,65 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class Echo:
+    """File-like object whose ``write`` hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+class NDJSONRenderer(BaseRenderer):
+    """One JSON object per line.
+
+    ``stream()`` is for ``StreamingHttpResponse`` exports; ``render()`` only
+    covers the regular responses of those views, like errors.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        return "".join(self.stream(rows)).encode(self.charset)
+
+    def stream(self, rows, columns=None):
+        for row in rows:
+            yield json.dumps(row, cls=JSONEncoder) + "\n"
+
+
+class CSVRenderer(BaseRenderer):
+    """Comma separated rows under a header of ``columns``.
+
+    Missing values are left empty and lists are joined with ``;``.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        return "".join(self.stream(rows, columns)).encode(self.charset)
+
+    def stream(self, rows, columns=None):
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([self.format_value(row.get(c)) for c in columns])
+
+    def format_value(self, value):
+        if value is None:
+            return ""
+        if isinstance(value, (list, tuple)):
+            return ";".join(str(item) for item in value)
+        if isinstance(value, dict):
+            return json.dumps(value, cls=JSONEncoder)
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return value
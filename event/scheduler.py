@@ -0,0 +1,169 @@
+"""Publish and close events when their publish dates come.
+
+A draft with both publish dates is scheduled: it opens once
+``event_published_date`` has passed, and an open event closes once
+``event_publish_end_date`` has. ``manage.py run_scheduler`` applies due
+transitions in batched UPDATEs through ``Event.bulk_transition``, queues the
+calendar sync of the events it opened, and then sleeps until the earliest
+upcoming one. Upcoming transitions are read from partial indexes on the date
+columns into a min-heap, ``lookahead`` at a time, and reloaded every
+``refresh_interval`` seconds to pick up new and edited events.
+"""
+import heapq
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from event.calendar_sync import SYNC_TRANSITIONS, request_sync_many
+from event.metrics import registry
+from event.models import Event, EventStatus, EventTransition
+
+logger = logging.getLogger(__name__)
+
+
+class Schedule:
+    """Events in ``status`` take ``transition`` once ``date_field`` passes."""
+
+    def __init__(self, transition, status, date_field) -> None:
+        self.transition = transition
+        self.status = status
+        self.date_field = date_field
+
+    def scheduled(self):
+        # Without both publish dates save() keeps an event a draft.
+        return Event.objects.filter(
+            event_status=self.status,
+            event_published_date__isnull=False,
+            event_publish_end_date__isnull=False,
+        ).order_by(self.date_field, "id")
+
+    def due(self, now):
+        queryset = self.scheduled().filter(**{f"{self.date_field}__lte": now})
+        if self.transition == EventTransition.OPEN:
+            # Never open a draft whose publishing window is already over.
+            queryset = queryset.filter(event_publish_end_date__gt=now)
+        return queryset
+
+    def upcoming(self, now, limit):
+        return (
+            self.scheduled()
+            .filter(**{f"{self.date_field}__gt": now})
+            .values_list(self.date_field, flat=True)[:limit]
+        )
+
+
+SCHEDULES = [
+    Schedule(EventTransition.OPEN, EventStatus.DRAFT, "event_published_date"),
+    Schedule(EventTransition.CLOSE, EventStatus.OPEN, "event_publish_end_date"),
+]
+
+
+class Scheduler:
+    def __init__(self, batch_size=None, lookahead=None, refresh_interval=None):
+        self.batch_size = batch_size or settings.EVENT_SCHEDULER_BATCH_SIZE
+        self.lookahead = lookahead or settings.EVENT_SCHEDULER_LOOKAHEAD
+        self.refresh_interval = (
+            refresh_interval or settings.EVENT_SCHEDULER_REFRESH_INTERVAL
+        )
+        self.heap = []
+        self.refreshed_at = None
+
+    def apply_due(self, now) -> dict:
+        """Apply every due transition, ``batch_size`` events per UPDATE."""
+        counts = {}
+        for schedule in SCHEDULES:
+            counts[schedule.transition] = 0
+            while True:
+                updated, skipped = Event.bulk_transition(
+                    schedule.due(now)[: self.batch_size], schedule.transition
+                )
+                counts[schedule.transition] += len(updated)
+                if updated and schedule.transition in SYNC_TRANSITIONS:
+                    request_sync_many(Event.objects.filter(event_uuid__in=updated))
+                if not updated or len(updated) + len(skipped) < self.batch_size:
+                    break
+        return counts
+
+    def refresh(self, now) -> None:
+        self.heap = [
+            (due_at, schedule.transition)
+            for schedule in SCHEDULES
+            for due_at in schedule.upcoming(now, self.lookahead)
+        ]
+        heapq.heapify(self.heap)
+        self.refreshed_at = time.monotonic()
+
+    def cycle(self) -> dict:
+        now = timezone.now()
+        started = time.perf_counter()
+        counts = self.apply_due(now)
+        while self.heap and self.heap[0][0] <= now:
+            heapq.heappop(self.heap)
+        # Opened events now have a close date to wait for, and an empty heap
+        # may only mean the lookahead ran out.
+        if (
+            any(counts.values())
+            or not self.heap
+            or time.monotonic() - self.refreshed_at >= self.refresh_interval
+        ):
+            self.refresh(now)
+        self.record(counts, time.perf_counter() - started)
+        return counts
+
+    def record(self, counts, duration) -> None:
+        registry.increment("event_scheduler_cycles_total", "Scheduler cycles run.")
+        registry.set_gauge(
+            "event_scheduler_cycle_seconds",
+            "Duration of the last scheduler cycle.",
+            duration,
+        )
+        for transition, count in counts.items():
+            registry.increment(
+                "event_scheduler_transitions_total",
+                "Events moved by the scheduler.",
+                count,
+                transition=transition,
+            )
+            registry.set_gauge(
+                "event_scheduler_cycle_transitions",
+                "Events moved in the last scheduler cycle.",
+                count,
+                transition=transition,
+            )
+        if any(counts.values()):
+            logger.info(
+                "Scheduler cycle: %s",
+                ", ".join(f"{count} {name}" for name, count in counts.items()),
+            )
+
+    def seconds_until_next(self) -> float:
+        until_refresh = self.refresh_interval - (time.monotonic() - self.refreshed_at)
+        if not self.heap:
+            return max(until_refresh, 0)
+        until_due = (self.heap[0][0] - timezone.now()).total_seconds()
+        return max(min(until_due, until_refresh), 0)
+
+    def run(self, stop=None, once=False) -> dict:
+        """Run cycles until ``stop`` is set, or a single one if ``once``.
+
+        Returns the number of events moved, by transition.
+        """
+        stop = stop or threading.Event()
+        totals = {schedule.transition: 0 for schedule in SCHEDULES}
+        try:
+            while not stop.is_set():
+                if not connection.in_atomic_block:
+                    close_old_connections()
+                for transition, count in self.cycle().items():
+                    totals[transition] += count
+                if once:
+                    break
+                stop.wait(self.seconds_until_next())
+        finally:
+            if not connection.in_atomic_block:
+                connection.close()
+        return totals
@@ -0,0 +1,72 @@
+"""Synthetic event data for the benchmarks."""
+import random
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+STATUS_WEIGHTS = {"open": 6, "draft": 2, "closed": 1, "cancled": 1}
+PAYMENT_WEIGHTS = {"free": 7, "paid": 3}
+CITIES = [(6.45, 3.40), (51.51, -0.13), (40.71, -74.01), (-33.87, 151.21)]
+
+
+def seed_events(count, batch_size=5000, seed=42, onsite_ratio=0.0, max_attendees=0):
+    """Bulk insert ``count`` events with a realistic spread of filter values.
+
+    ``onsite_ratio`` of them are onsite events with geocoded addresses, the
+    rest virtual. Each event gets up to ``max_attendees`` bookings (never more
+    than its capacity). Returns the uuids of the created events.
+    """
+    from event import geohash
+    from event.models import Booking, Event, EventLocationType, GeocodeStatus
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    first_day = date.today() - timedelta(days=365 * 3)
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    payments, payment_weights = zip(*PAYMENT_WEIGHTS.items())
+
+    uuids = []
+    for start in range(0, count, batch_size):
+        events = []
+        for index in range(start, min(start + batch_size, count)):
+            start_date = first_day + timedelta(days=rng.randrange(365 * 4))
+            capacity = rng.choice([None, 50, 500])
+            event = Event(
+                event_name=f"Event {index}",
+                event_start_date=start_date,
+                event_end_date=start_date + timedelta(days=1),
+                event_published_date=now,
+                event_publish_end_date=now + timedelta(days=30),
+                event_status=rng.choices(statuses, status_weights)[0],
+                event_payment_type=rng.choices(payments, payment_weights)[0],
+                event_max_participant_num=capacity,
+                event_seats_taken=rng.randint(
+                    0, min(max_attendees, capacity or 10**9)
+                ),
+            )
+            if rng.random() < onsite_ratio:
+                city_lat, city_lng = rng.choice(CITIES)
+                lat = round(city_lat + rng.gauss(0, 0.2), 6)
+                lng = round(city_lng + rng.gauss(0, 0.2), 6)
+                event.event_location_type = EventLocationType.ONSITE
+                event.event_address = f"{index} Benchmark Street"
+                event.event_location_latitude = lat
+                event.event_location_lognitude = lng
+                event.event_geohash = geohash.encode(lat, lng)
+                event.geocode_status = GeocodeStatus.DONE
+            else:
+                event.event_location_type = EventLocationType.VIRTUAL
+                event.event_url_link = "https://meet.google.com/abc"
+            events.append(event)
+            uuids.append(event.event_uuid)
+
+        Event.objects.bulk_create(events)
+        Booking.objects.bulk_create(
+            (
+                Booking(event=event, attendee_email=f"attendee{seat}@example.com")
+                for event in events
+                for seat in range(event.event_seats_taken)
+            ),
+            batch_size=batch_size,
+        )
+    return uuids
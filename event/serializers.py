@@ -1,53 +1,76 @@
-from urllib.parse import urlencode
+from collections import OrderedDict
+from itertools import islice
 
-from django.db.models import QuerySet
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
+from django.utils.functional import cached_property
 from rest_framework import serializers, status
 from rest_framework.exceptions import APIException
-from rest_framework.fields import empty
+from rest_framework.fields import SkipField
 
-from event.googleapi.direction import get_direction_cleaned_date
-from event.googleapi.geocoding import geoencodeaddress
+from event.cache import get_representations, set_representations
+from event.googleapi.cache import normalize_address
+from event.googleapi.direction import (
+    aget_direction_cleaned_date,
+    get_direction_cleaned_date,
+)
+from event.metrics import TimedDataMixin
+from event.tasks import (
+    enqueue_address_geocoding,
+    enqueue_geocoding,
+    initial_location_fields,
+)
 
-from .models import Event, EventLocationType, EventStatus
+from .models import Event, EventLocationType, EventStatus, GeocodeStatus
 
 
-class EventReadSerializer(serializers.ModelSerializer):
+class RelativeImageField(serializers.ImageField):
+    """Renders the image URL as stored, without the request's host.
 
-    event_url = (
-        serializers.SerializerMethodField()
-    )  # URLField(source="get_absolute_url", read_only = True)
+    Cached event representations are shared between requests, the host is
+    added back in ``EventReadSerializer.absolutize``.
+    """
 
-    def __init__(self, instance=None, data=empty, **kwargs):
-        super().__init__(instance, data, **kwargs)
-        self.virtual_field = ["event_url_link"]
-        self.on_site_fields = [
-            "event_location_lognitude",
-            "event_location_latitude",
-            "event_address",
-        ]
+    def to_representation(self, value):
+        if not value:
+            return None
+        try:
+            return value.url
+        except AttributeError:
+            return None
 
-        if instance and (isinstance(instance, QuerySet) or [instance]):
-            if not isinstance(instance, QuerySet):
-                instance_list = [instance]
-            for instance_obj in (
-                instance if isinstance(instance, QuerySet) else instance_list
-            ):
-                if instance_obj.event_location_type == EventLocationType.ONSITE:
 
-                    self.Meta.fields += self.on_site_fields
+class EventListSerializer(TimedDataMixin, serializers.ListSerializer):
+    def to_representation(self, data):
+        events = data.all() if isinstance(data, models.Manager) else data
+        return self.child.to_cached_representations(list(events))
 
-                    self.fields["user_location"] = serializers.CharField(read_only=True)
-                    self.fields["event_address"] = serializers.CharField()
-                    self.fields["event_location_latitude"] = serializers.FloatField()
-                    self.fields["event_location_lognitude"] = serializers.FloatField()
 
-                elif instance_obj.event_location_type == EventLocationType.VIRTUAL:
-                    self.Meta.fields += self.virtual_field
-                    self.fields["event_url_link"] = serializers.CharField()
+class EventReadSerializer(TimedDataMixin, serializers.ModelSerializer):
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: RelativeImageField,
+    }
+
+    event_url = (
+        serializers.SerializerMethodField()
+    )  # URLField(source="get_absolute_url", read_only = True)
+
+    # Location specific fields, only one group is rendered per event.
+    event_address = serializers.CharField(required=False)
+    event_location_latitude = serializers.FloatField(required=False)
+    event_location_lognitude = serializers.FloatField(required=False)
+    event_url_link = serializers.CharField(required=False)
+
+    # Only shown to the event's owner, see to_cached_representations().
+    event_attendees = serializers.SlugRelatedField(
+        source="bookings", slug_field="attendee_email", many=True, read_only=True
+    )
 
     class Meta:
         model = Event
-        fields = [
+        common_fields = [
             "event_url",
             "event_uuid",
             "event_name",
@@ -62,40 +85,194 @@ class EventReadSerializer(serializers.ModelSerializer):
             "event_payment_type",
             "event_attendees",
             "event_max_participant_num",
+            "event_seats_taken",
             "event_status",
             "event_location_type",
         ]
-
-        read_only_fields = ["event_uuid", "event_attendees"]
+        on_site_fields = [
+            "event_location_lognitude",
+            "event_location_latitude",
+            "event_address",
+            "geocode_status",
+        ]
+        virtual_fields = ["event_url_link"]
+        fields = common_fields + on_site_fields + virtual_fields
+
+        # Computed once at import time, never mutated per request.
+        location_fields = {
+            EventLocationType.ONSITE: frozenset(common_fields + on_site_fields),
+            EventLocationType.VIRTUAL: frozenset(common_fields + virtual_fields),
+        }
+
+        # ?view=compact, everything but the description and attendee emails.
+        compact_fields = [
+            field
+            for field in fields
+            if field not in ("event_description", "event_attendees")
+        ]
+        # Columns behind the fields that are not named after one.
+        field_columns = {
+            "event_url": ["event_uuid"],
+            "event_attendees": ["event_owner"],
+        }
+
+        read_only_fields = ["event_uuid", "event_seats_taken", "geocode_status"]
+        list_serializer_class = EventListSerializer
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # ``fields`` limits the representation to a sparse fieldset.
+        super().__init__(*args, **kwargs)
+        self.selected_fields = None if fields is None else frozenset(fields)
+
+    @classmethod
+    def get_columns(cls, fields):
+        """Model columns needed to render ``fields``, for ``QuerySet.only()``.
+
+        The pagination ordering columns are always read, since the cursor of
+        the next page is built from the last row.
+        """
+        columns = {"id", "event_start_date", "event_location_type", "updated_at"}
+        for field in fields:
+            columns.update(cls.Meta.field_columns.get(field, [field]))
+        return sorted(columns)
+
+    @cached_property
+    def _readable_fields_by_location(self):
+        readable_fields = [
+            field
+            for field in self._readable_fields
+            if self.selected_fields is None or field.field_name in self.selected_fields
+        ]
+        return {
+            location_type: [
+                field for field in readable_fields if field.field_name in field_names
+            ]
+            for location_type, field_names in self.Meta.location_fields.items()
+        }
 
     def get_event_url(self, event):
-        request = self.context.get("request")
-        return request.build_absolute_uri(event.get_absolute_url())
+        # Made absolute per request, see absolutize().
+        return event.get_absolute_url()
 
     def to_representation(self, instance):
+        return self.to_cached_representations([instance])[0]
+
+    def iter_representations(self, queryset, chunk_size):
+        """Yield the representations of ``queryset`` one by one.
+
+        Rows come from a server-side cursor ``chunk_size`` at a time and go
+        through the cache in batches, so memory stays flat however many events
+        there are. Batches start small and double up to ``chunk_size``, to get
+        the first rows out quickly. Misses are not written back, an export
+        would only churn the cache.
+        """
+        events = queryset.iterator(chunk_size=chunk_size)
+        batch_size = min(chunk_size, 50)
+        while True:
+            batch = list(islice(events, batch_size))
+            if not batch:
+                return
+            yield from self.to_cached_representations(batch, store=False)
+            batch_size = min(batch_size * 2, chunk_size)
+
+    def to_cached_representations(self, events, store=True):
+        """Representations of ``events``, from the cache where possible.
+
+        Misses are built in one go, with their bookings prefetched, and
+        written back with a single ``set_many``. Only full representations
+        are cached, a sparse fieldset is cut out of them on a hit and built
+        from the loaded columns on a miss. Attendee emails are cached too, and
+        removed from the events the requesting user does not own.
+        """
+        representations = get_representations(events)
+        if self.selected_fields is not None:
+            representations = {
+                pk: self.select_fields(data) for pk, data in representations.items()
+            }
+
+        missed = [event for event in events if event.pk not in representations]
+        if missed:
+            if (
+                self.selected_fields is None
+                or "event_attendees" in self.selected_fields
+            ):
+                prefetch_related_objects(missed, "bookings")
+            built = {event.pk: self.build_representation(event) for event in missed}
+            if store and self.selected_fields is None:
+                set_representations(missed, built)
+            representations.update(built)
+
+        base_url = self.get_base_url()
+        user_id = self.get_user_id()
+        return [
+            self.hide_attendees(
+                self.absolutize(representations[event.pk], base_url), event, user_id
+            )
+            for event in events
+        ]
+
+    def select_fields(self, data):
+        return OrderedDict(
+            (name, value)
+            for name, value in data.items()
+            if name in self.selected_fields
+        )
+
+    def get_base_url(self):
+        request = self.context.get("request")
+        if request is None:
+            return ""
+        return request.build_absolute_uri("/")[:-1]
+
+    def get_user_id(self):
+        request = self.context.get("request")
+        user = getattr(request, "user", None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+    def absolutize(self, data, base_url):
+        data = OrderedDict(data)
+        for field_name in ("event_url", "event_image"):
+            value = data.get(field_name)
+            if value and value.startswith("/"):
+                data[field_name] = base_url + value
+        return data
+
+    def hide_attendees(self, data, event, user_id):
+        # event_owner is only loaded when the attendees are asked for.
+        if "event_attendees" in data and (
+            user_id is None or event.event_owner_id != user_id
+        ):
+            del data["event_attendees"]
+        return data
 
-        data = super().to_representation(instance)
-        if instance.event_location_type == EventLocationType.ONSITE:
-            if self.virtual_field[0] in data.keys():
-                data.pop(self.virtual_field[0])
+    def build_representation(self, instance):
+        fields = self._readable_fields_by_location.get(instance.event_location_type, ())
 
-        elif instance.event_location_type == EventLocationType.VIRTUAL:
-            for field in self.on_site_fields:
-                if field in data.keys():
-                    data.pop(field)
+        data = OrderedDict()
+        for field in fields:
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
 
+            if attribute is None:
+                data[field.field_name] = None
+            else:
+                data[field.field_name] = field.to_representation(attribute)
         return data
 
 
-class EventCreateSerializer(serializers.ModelSerializer):
+class EventCreateSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = "__all__"
         read_only_fields = [
             "event_uuid",
-            "event_attendees",
+            "event_seats_taken",
             "event_location_lognitude",
             "event_location_latitude",
+            "event_geohash",
+            "geocode_status",
         ]
 
         on_site_fields = ["event_address"]
@@ -122,7 +299,10 @@ class EventCreateSerializer(serializers.ModelSerializer):
 
         publish_start_date = attrs.get("event_published_date")
         publish_end_date = attrs.get("event_publish_end_date")
-        if publish_start_date > publish_end_date:
+        if (
+            all((publish_start_date, publish_end_date))
+            and publish_start_date > publish_end_date
+        ):
             raise serializers.ValidationError(
                 {"error": "Publish end date cannot be less than publish start date"},
                 code=status.HTTP_400_BAD_REQUEST,
@@ -149,23 +329,126 @@ class EventCreateSerializer(serializers.ModelSerializer):
                 code=status.HTTP_400_BAD_REQUEST,
             )
 
-        event_address = attrs.get("event_address")
+        return super().validate(attrs)
+
+    def create(self, validated_data):
+        # Geocoding is left to a background job so a slow Google does not
+        # hold up event creation.
+        event_address = validated_data.get("event_address")
         if event_address:
-            lat_n_lng = geoencodeaddress(event_address)
-            if isinstance(lat_n_lng, dict):
-                print(lat_n_lng)
-                attrs["event_location_lognitude"] = lat_n_lng["lng"]
-                attrs["event_location_latitude"] = lat_n_lng["lat"]
+            validated_data.update(initial_location_fields(event_address))
 
-        return super().validate(attrs)
+        with transaction.atomic():
+            event = super().create(validated_data)
+            if event.geocode_status == GeocodeStatus.PENDING:
+                enqueue_geocoding(event)
+        return event
 
 
-class EventBookingSerializer(serializers.Serializer):
+class EventBulkCreateListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        if len(attrs) > settings.EVENT_BULK_MAX_EVENTS:
+            raise serializers.ValidationError(
+                {
+                    "error": f"At most {settings.EVENT_BULK_MAX_EVENTS} events can "
+                    "be created at once"
+                }
+            )
+        return attrs
+
+    def create(self, validated_data):
+        """Insert the events with one ``bulk_create``.
+
+        Each distinct address is looked up in the geocode cache once, and the
+        ones it does not know get one geocoding job each, however many events
+        share them.
+        """
+        locations = {}
+        events = []
+        for attrs in validated_data:
+            address = attrs.get("event_address")
+            if address:
+                key = normalize_address(address)
+                if key not in locations:
+                    locations[key] = initial_location_fields(address)
+                attrs = {**attrs, **locations[key]}
+            event = Event(**attrs)
+            event.set_derived_fields()
+            events.append(event)
+
+        with transaction.atomic():
+            Event.objects.bulk_create(events)
+            enqueue_address_geocoding(
+                [e for e in events if e.geocode_status == GeocodeStatus.PENDING]
+            )
+        return events
+
+
+class EventBulkCreateSerializer(EventCreateSerializer):
+    """``EventCreateSerializer`` for JSON batches, the image can come later."""
+
+    class Meta(EventCreateSerializer.Meta):
+        extra_kwargs = {"event_image": {"required": False}}
+        list_serializer_class = EventBulkCreateListSerializer
+
+
+class EventTransitionSerializer(serializers.Serializer):
+    """Events picked by uuid for a bulk lifecycle change.
+
+    Without ``event_uuids`` the listing filters in the query string pick them.
+    """
+
+    event_uuids = serializers.ListField(
+        child=serializers.UUIDField(),
+        required=False,
+        allow_empty=False,
+        max_length=settings.EVENT_BULK_MAX_EVENTS,
+    )
+
+
+class NearbyEventsSerializer(TimedDataMixin, serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(
+        required=False, min_value=0, max_value=settings.EVENT_NEARBY_MAX_RADIUS_KM
+    )
+    limit = serializers.IntegerField(
+        default=settings.EVENT_NEARBY_DEFAULT_LIMIT,
+        min_value=1,
+        max_value=settings.EVENT_NEARBY_MAX_LIMIT,
+    )
+
+
+class EventFieldsetSerializer(serializers.Serializer):
+    """``?fields=`` / ``?view=`` of the event listing."""
+
+    fields = serializers.CharField(required=False)
+    view = serializers.ChoiceField(choices=["full", "compact"], default="full")
+
+    def validate_fields(self, value):
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [
+            name for name in names if name not in EventReadSerializer.Meta.fields
+        ]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(unknown)}")
+        return names
+
+    def get_fields_selection(self):
+        """The selected field names, ``None`` for the full representation."""
+        if self.validated_data.get("fields"):
+            return self.validated_data["fields"]
+        if self.validated_data["view"] == "compact":
+            return EventReadSerializer.Meta.compact_fields
+        return None
+
+
+class EventBookingSerializer(TimedDataMixin, serializers.Serializer):
     attendee_email = serializers.EmailField()
 
     def save(self, **kwargs):
-        event_uuid = self.context.get("event_uuid")
-        event_obj = Event.objects.get(event_uuid=event_uuid)
+        # The view has already loaded the event.
+        event_obj = self.context["event"]
         if event_obj.event_status not in [EventStatus.CLOSED, EventStatus.CANCELD]:
             email = self.validated_data.get("attendee_email")
             event_obj.reserve_space(email=email)
@@ -179,7 +462,26 @@ class EventBookingSerializer(serializers.Serializer):
             )
 
 
-class OnSiteEventDirectionSerializer(serializers.Serializer):
+def get_direction_origin(attrs):
+    start_lng = attrs.get("start_location_lognitude")
+    start_lat = attrs.get("start_location_latitude")
+    start_address = attrs.get("start_address")
+
+    if start_lat and start_lng:
+        return f"{start_lat},{start_lng}"
+    elif start_address:
+        return f"{start_address}"
+    raise serializers.ValidationError(
+        {"error": "Either Origin Lat and long or Address has to be provided"}
+    )
+
+
+def get_direction_destination(event):
+    destination = event.get_event_location()
+    return f"{destination[0]},{destination[1]}"
+
+
+class OnSiteEventDirectionSerializer(TimedDataMixin, serializers.Serializer):
     """
     def __init__(self, instance=None, data=..., **kwargs):
         super().__init__(instance, data, **kwargs)
@@ -206,40 +508,69 @@ class OnSiteEventDirectionSerializer(serializers.Serializer):
             "start_address" "direction",
         ]
 
-    def validate(self, attrs):
-
+    def get_origin_and_destination(self, attrs):
         event = self.context.get("event")
+        return get_direction_origin(attrs), get_direction_destination(event)
 
-        start_lng = attrs.get("start_location_lognitude")
-        start_lat = attrs.get("start_location_latitude")
-        start_address = attrs.get("start_address")
+    def set_direction(self, attrs, direction):
+        if not direction:
+            raise serializers.ValidationError(
+                {"error": "The address specified is not a valid address"}
+            )
+        attrs["direction"] = direction
+        return attrs
 
+    def validate(self, attrs):
         # Get Direction
-        if start_lat and start_lng:
-            destination = event.get_event_location()
-            direction = get_direction_cleaned_date(
-                origin=f"{start_lat},{start_lng}",
-                destination=f"{destination[0]},{destination[1]}",
-            )
-            if direction:
-                attrs["direction"] = direction
+        origin, destination = self.get_origin_and_destination(attrs)
+        direction = get_direction_cleaned_date(origin=origin, destination=destination)
+        attrs = self.set_direction(attrs, direction)
 
-        elif start_address:
-            destination = event.get_event_location()
+        return super().validate(attrs)
 
-            direction = get_direction_cleaned_date(
-                origin=f"{start_address}",
-                destination=f"{destination[0]},{destination[1]}",
-            )
-            if direction:
-                attrs["direction"] = direction
-        else:
-            raise serializers.ValidationError(
-                {"error": "Either Origin Lat and long or Address has to be provided"}
-            )
-        if not direction:
+
+class AsyncOnSiteEventDirectionSerializer(OnSiteEventDirectionSerializer):
+    """Only checks the origin in ``is_valid()``.
+
+    The route is fetched with the async client by awaiting ``aget_direction()``.
+    """
+
+    def validate(self, attrs):
+        self.get_origin_and_destination(attrs)
+        return attrs
+
+    async def aget_direction(self):
+        origin, destination = self.get_origin_and_destination(self.validated_data)
+        direction = await aget_direction_cleaned_date(
+            origin=origin, destination=destination
+        )
+        self.set_direction(self.validated_data, direction)
+        return self.data
+
+
+class DirectionOriginSerializer(serializers.Serializer):
+    start_address = serializers.CharField(required=False)
+    start_location_lognitude = serializers.FloatField(required=False)
+    start_location_latitude = serializers.FloatField(required=False)
+
+    def validate(self, attrs):
+        get_direction_origin(attrs)
+        return attrs
+
+
+class BatchDirectionSerializer(TimedDataMixin, serializers.Serializer):
+    origins = DirectionOriginSerializer(many=True, allow_empty=False)
+    mode = serializers.ChoiceField(
+        choices=["driving", "walking", "bicycling", "transit"], default="driving"
+    )
+
+    def validate_origins(self, origins):
+        max_origins = settings.GOOGLE_DIRECTION_BATCH_MAX
+        if len(origins) > max_origins:
             raise serializers.ValidationError(
-                {"error": "The address specified is not a valid address"}
+                f"A batch can have at most {max_origins} origins"
             )
+        return origins
 
-        return super().validate(attrs)
+    def get_origins(self):
+        return [get_direction_origin(attrs) for attrs in self.validated_data["origins"]]
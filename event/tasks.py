@@ -0,0 +1,147 @@
+"""Background job handlers, registered with ``event.jobs`` when the app loads."""
+from django.utils import timezone
+
+from event import geohash
+from event.calendar_sync import SYNC_EVENT_CALENDAR, sync_event
+from event.googleapi.cache import MISS, normalize_address
+from event.googleapi.geocoding import GeoEncodingClient, geocode_cache
+from event.googleapi.tokens import REFRESH_OAUTH_TOKEN, token_store
+from event.jobs import enqueue, enqueue_many, register
+from event.models import Event, GeocodeStatus
+
+GEOCODE_EVENT = "geocode_event"
+GEOCODE_ADDRESS = "geocode_address"
+
+
+def location_fields(location) -> dict:
+    if location is None:
+        return {
+            "event_location_latitude": None,
+            "event_location_lognitude": None,
+            "event_geohash": "",
+            "geocode_status": GeocodeStatus.FAILED,
+        }
+    return {
+        "event_location_latitude": location["lat"],
+        "event_location_lognitude": location["lng"],
+        "event_geohash": geohash.encode(location["lat"], location["lng"]),
+        "geocode_status": GeocodeStatus.DONE,
+    }
+
+
+def initial_location_fields(address) -> dict:
+    """Location fields for a new onsite event, without calling Google.
+
+    Addresses geocoded before are answered from the geocode cache, anything
+    else is marked pending for ``geocode_event`` to fill in.
+    """
+    location = geocode_cache.get(normalize_address(address))
+    if location is MISS:
+        return {
+            "event_location_latitude": None,
+            "event_location_lognitude": None,
+            "event_geohash": "",
+            "geocode_status": GeocodeStatus.PENDING,
+        }
+    return location_fields(location)
+
+
+def geocode_payload(event, refresh=False) -> dict:
+    return {"event_id": event.pk, "address": event.event_address, "refresh": refresh}
+
+
+def enqueue_geocoding(event, refresh=False):
+    return enqueue(GEOCODE_EVENT, geocode_payload(event, refresh))
+
+
+def enqueue_bulk_geocoding(events, refresh=False, batch_size=500) -> list:
+    return enqueue_many(
+        GEOCODE_EVENT,
+        (geocode_payload(event, refresh) for event in events),
+        batch_size=batch_size,
+    )
+
+
+def enqueue_address_geocoding(events, refresh=False, batch_size=500) -> list:
+    """Queue one job per distinct address among ``events``.
+
+    Events whose addresses only differ in case, spacing or punctuation share
+    a job, so a batch of events at the same venue costs one Google call.
+    """
+    groups = {}
+    for event in events:
+        group = groups.setdefault(
+            normalize_address(event.event_address),
+            {"event_ids": [], "addresses": [], "refresh": refresh},
+        )
+        group["event_ids"].append(event.pk)
+        if event.event_address not in group["addresses"]:
+            group["addresses"].append(event.event_address)
+    return enqueue_many(GEOCODE_ADDRESS, groups.values(), batch_size=batch_size)
+
+
+def save_location(event_id, address, location) -> int:
+    # Matching on the address too keeps a job for an address that has been
+    # edited since from overwriting the new one's coordinates.
+    return Event.objects.filter(pk=event_id, event_address=address).update(
+        **location_fields(location), updated_at=timezone.now()
+    )
+
+
+def mark_geocode_failed(event_id, address, refresh=False) -> None:
+    Event.objects.filter(pk=event_id, event_address=address).update(
+        geocode_status=GeocodeStatus.FAILED, updated_at=timezone.now()
+    )
+
+
+def locate(address, refresh=False):
+    client = GeoEncodingClient()
+    if refresh:
+        location = client.fetch_lat_and_long(address)
+        geocode_cache.set(client.clean_address(address), location)
+        return location
+    return client.get_lat_and_long(address)
+
+
+@register(GEOCODE_EVENT, on_failure=mark_geocode_failed)
+def geocode_event(event_id, address, refresh=False) -> None:
+    """Fill in an onsite event's coordinates from its address.
+
+    ``GoogleAPIUnavailable`` is left to propagate so the job is retried; an
+    address Google cannot place marks the event as failed straight away.
+    ``refresh`` skips the cache, e.g. to retry addresses that failed before.
+    """
+    save_location(event_id, address, locate(address, refresh))
+
+
+def events_at(event_ids, addresses):
+    return Event.objects.filter(pk__in=event_ids, event_address__in=addresses)
+
+
+def mark_address_failed(event_ids, addresses, refresh=False) -> None:
+    events_at(event_ids, addresses).update(
+        geocode_status=GeocodeStatus.FAILED, updated_at=timezone.now()
+    )
+
+
+@register(GEOCODE_ADDRESS, on_failure=mark_address_failed)
+def geocode_address(event_ids, addresses, refresh=False) -> None:
+    """``geocode_event`` for every event in ``event_ids`` at one address.
+
+    ``addresses`` are the spellings of it the events were saved with.
+    """
+    events_at(event_ids, addresses).update(
+        **location_fields(locate(addresses[0], refresh)), updated_at=timezone.now()
+    )
+
+
+@register(REFRESH_OAUTH_TOKEN)
+def refresh_oauth_token(token_id) -> None:
+    """Renew a token shortly before it expires; see ``event.googleapi.tokens``."""
+    token_store.refresh_if_due(token_id)
+
+
+@register(SYNC_EVENT_CALENDAR)
+def sync_event_calendar(event_id) -> None:
+    """Copy an event to its attendees' calendars; see ``event.calendar_sync``."""
+    sync_event(event_id)
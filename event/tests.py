@@ -1,3 +1,2166 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import math
+import random
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from google.oauth2.credentials import Credentials
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
+
+from event import async_views, geohash
+from event.cache import representation_key
+from event.calendar_sync import (
+    SYNC_EVENT_CALENDAR,
+    claim_entries,
+    request_sync,
+    sync_batch,
+    sync_event,
+    sync_progress,
+)
+from event.exceptions import GoogleAPIUnavailable
+from event.googleapi.cache import MISS, normalize_address
+from event.googleapi.calendar import (
+    CalendarBatch,
+    RateLimiter,
+    calendar_client,
+    event_create_schema,
+    reset_calendar_clients,
+)
+from event.googleapi.direction import (
+    DirectionClient,
+    direction_cache,
+    get_direction_cleaned_date,
+    quantize_location,
+)
+from event.googleapi.geocoding import GeoEncodingClient, geocode_cache, geoencodeaddress
+from event.googleapi.stub import (
+    DIRECTION_RESPONSE,
+    GEOCODE_RESPONSE,
+    GoogleCalendarStub,
+    GoogleMapsStub,
+)
+from event.googleapi.tokens import REFRESH_OAUTH_TOKEN, token_store
+from event.googleapi.transport import (
+    AsyncGoogleMapsTransport,
+    GoogleMapsTransport,
+    reset_async_transport,
+    reset_transport,
+)
+from event.jobs import enqueue, handlers, register, requeue_stale_jobs, work
+from event.metrics import RequestMetricsMiddleware, install_query_timer, registry
+from event.models import (
+    Booking,
+    CalendarEntry,
+    CalendarEntryStatus,
+    Event,
+    EventLocationType,
+    EventStatus,
+    GeocodeStatus,
+    Job,
+    JobStatus,
+    OuthTokenModel,
+)
+from event.pagination import EventKeysetPagination
+from event.scheduler import Scheduler
+from event.serializers import EventCreateSerializer, EventReadSerializer
+from event.tasks import GEOCODE_EVENT
+from event.uuid7 import uuid7
+
+User = get_user_model()
+
+
+def make_event(**kwargs):
+    kwargs.setdefault("event_name", "Test Event")
+    kwargs.setdefault("event_location_type", EventLocationType.VIRTUAL)
+    kwargs.setdefault("event_url_link", "https://meet.google.com/abc")
+    return Event.objects.create(**kwargs)
+
+
+class EventListPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("event-list")
+        start = date(2022, 10, 1)
+        # Several events share a start date and a few have none at all, so the
+        # cursor has to break ties on id and handle NULLs.
+        self.events = [
+            make_event(event_start_date=start + timedelta(days=i // 3))
+            for i in range(20)
+        ] + [make_event(event_start_date=None) for _ in range(5)]
+
+    def collect(self, url, key="next"):
+        uuids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            uuids.extend(event["event_uuid"] for event in response.data["results"])
+            url = response.data[key]
+            pages += 1
+        return uuids, pages
+
+    def test_pages_cover_every_event_once_in_order(self):
+        uuids, pages = self.collect(f"{self.url}?page_size=7")
+
+        expected = [str(event.event_uuid) for event in self.events]
+        self.assertEqual(uuids, expected)
+        self.assertEqual(pages, 4)
+
+    def test_previous_link_walks_back(self):
+        response = self.client.get(f"{self.url}?page_size=10")
+        response = self.client.get(response.data["next"])
+        response = self.client.get(response.data["next"])
+        last_page = [event["event_uuid"] for event in response.data["results"]]
+
+        response = self.client.get(response.data["previous"])
+        expected = [str(event.event_uuid) for event in self.events[10:20]]
+        self.assertEqual([e["event_uuid"] for e in response.data["results"]], expected)
+        self.assertEqual(last_page, [str(e.event_uuid) for e in self.events[20:]])
+
+    def test_pages_seek_from_the_cursor(self):
+        response = self.client.get(f"{self.url}?page_size=7")
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(response.data["next"])
+
+        sql = captured[0]["sql"]
+        # A range from the cursor's start date, and the undated events as a
+        # range of their own rather than an OR that defeats the index.
+        self.assertIn(""""event_start_date" >= '2022-10-03'""", sql)
+        self.assertIn("UNION ALL", sql)
+        self.assertNotIn('OR "event_event"."event_start_date" IS NULL', sql)
+
+    def test_filters_apply_before_paging(self):
+        Event.objects.filter(pk=self.events[0].pk).update(event_status="closed")
+
+        response = self.client.get(f"{self.url}?event_status=closed")
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(EventKeysetPagination, "max_page_size", 5):
+            response = self.client.get(f"{self.url}?page_size=100000")
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(f"{self.url}?cursor=garbage")
+        self.assertEqual(response.status_code, 404)
+
+
+class EventReadSerializerTests(TestCase):
+    def setUp(self):
+        self.request = APIRequestFactory().get("/")
+        self.onsite = make_event(
+            event_location_type=EventLocationType.ONSITE,
+            event_url_link="",
+            event_address="1 Marina Road, Lagos",
+            event_location_latitude="6.450000",
+            event_location_lognitude="3.400000",
+        )
+        self.virtual = make_event()
+
+    def serialize(self, instance, **kwargs):
+        return EventReadSerializer(
+            instance, context={"request": self.request}, **kwargs
+        ).data
+
+    def test_fields_follow_location_type_per_row(self):
+        onsite, virtual = self.serialize([self.onsite, self.virtual], many=True)
+
+        self.assertEqual(onsite["event_address"], "1 Marina Road, Lagos")
+        self.assertEqual(onsite["event_location_latitude"], 6.45)
+        self.assertNotIn("event_url_link", onsite)
+        self.assertEqual(virtual["event_url_link"], "https://meet.google.com/abc")
+        self.assertNotIn("event_address", virtual)
+        self.assertNotIn("event_location_latitude", virtual)
+
+    def test_meta_fields_do_not_grow(self):
+        fields = list(EventReadSerializer.Meta.fields)
+        for _ in range(5):
+            self.serialize(Event.objects.all(), many=True)
+            self.serialize(self.onsite)
+
+        self.assertEqual(EventReadSerializer.Meta.fields, fields)
+
+
+def make_open_event(**kwargs):
+    now = timezone.now()
+    kwargs.setdefault("event_published_date", now)
+    kwargs.setdefault("event_publish_end_date", now + timedelta(days=7))
+    kwargs.setdefault("event_status", EventStatus.OPEN)
+    return make_event(**kwargs)
+
+
+class EventReservationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.event = make_open_event(event_max_participant_num=2)
+        self.url = reverse("event-reserve", args=[self.event.event_uuid])
+
+    def reserve(self, email):
+        return self.client.post(self.url, {"attendee_email": email})
+
+    def test_reserve_creates_booking(self):
+        response = self.reserve("ada@example.com")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(self.event.bookings.values_list("attendee_email", flat=True)),
+            ["ada@example.com"],
+        )
+
+    def test_duplicate_booking_is_rejected(self):
+        self.reserve("ada@example.com")
+        response = self.reserve("ada@example.com")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.event.bookings.count(), 1)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.event_seats_taken, 1)
+
+    def statements(self, captured):
+        return [
+            query["sql"].split()[0]
+            for query in captured
+            if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+        ]
+
+    def test_booking_reads_the_event_once_and_writes_once(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.reserve("ada@example.com")
+
+        self.assertEqual(response.status_code, 200)
+        # Load the event, claim the seat, insert the booking.
+        self.assertEqual(self.statements(captured), ["SELECT", "UPDATE", "INSERT"])
+
+    def test_add_to_calendar_checks_the_booking_in_one_query(self):
+        self.reserve("ada@example.com")
+        url = reverse("event-add-to-calendar", args=[self.event.event_uuid])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"email": "ada@example.com"})
+        self.assertEqual(response.status_code, 302)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"email": "bola@example.com"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_lifecycle_changes_only_write_the_status(self):
+        url = reverse("event-close-event", args=[self.event.event_uuid])
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(url)
+
+        # Load the event and update it, then the response loads the bookings.
+        self.assertEqual(self.statements(captured), ["SELECT", "UPDATE", "SELECT"])
+        update = captured[1]["sql"]
+        self.assertIn('"event_status"', update)
+        self.assertNotIn('"event_name"', update)
+
+    def test_saving_a_stale_instance_keeps_the_seat_counter(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        self.reserve("ada@example.com")
+        stale.close_event()
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.event_status, EventStatus.CLOSED)
+        self.assertEqual(self.event.event_seats_taken, 1)
+
+    def test_reconcile_seat_counters(self):
+        self.reserve("ada@example.com")
+        Event.objects.filter(pk=self.event.pk).update(event_seats_taken=2)
+        out = StringIO()
+
+        call_command("reconcile_seat_counters", "--dry-run", stdout=out)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.event_seats_taken, 2)
+        self.assertIn("counter 2, booked 1", out.getvalue())
+
+        call_command("reconcile_seat_counters", stdout=out)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.event_seats_taken, 1)
+
+    def test_full_event_is_rejected(self):
+        self.reserve("ada@example.com")
+        self.reserve("bola@example.com")
+        response = self.reserve("chidi@example.com")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.event.bookings.count(), 2)
+
+    def test_attendees_are_listed_to_the_owner_only(self):
+        owner = User.objects.create_user("owner", "owner@example.com", "pass")
+        Event.objects.filter(pk=self.event.pk).update(event_owner=owner)
+        self.reserve("ada@example.com")
+
+        response = self.client.get(reverse("event-list"))
+        self.assertNotIn("event_attendees", response.data["results"][0])
+        self.assertEqual(response.data["results"][0]["event_seats_taken"], 1)
+
+        self.client.force_authenticate(owner)
+        response = self.client.get(reverse("event-list"))
+        self.assertEqual(
+            response.data["results"][0]["event_attendees"], ["ada@example.com"]
+        )
+
+        other = User.objects.create_user("other", "other@example.com", "pass")
+        self.client.force_authenticate(other)
+        response = self.client.get(
+            reverse("event-detail", args=[self.event.event_uuid])
+        )
+        self.assertNotIn("event_attendees", response.data)
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    def test_concurrent_reservations_never_overshoot_capacity(self):
+        event = make_open_event(event_max_participant_num=50)
+        url = reverse("event-reserve", args=[event.event_uuid])
+
+        def reserve(index):
+            try:
+                email = f"attendee{index}@example.com"
+                return APIClient().post(url, {"attendee_email": email}).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            statuses = list(pool.map(reserve, range(300)))
+
+        self.assertEqual(statuses.count(200), 50)
+        self.assertEqual(statuses.count(400), 250)
+        self.assertEqual(event.bookings.count(), 50)
+        event.refresh_from_db()
+        self.assertEqual(event.event_seats_taken, 50)
+
+
+class GeocodeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.clear()
+        self.addCleanup(geocode_cache.clear)
+        self.client = GeoEncodingClient()
+        location = {"lat": 6.45, "lng": 3.4}
+        patcher = mock.patch.object(
+            GeoEncodingClient,
+            "geoencode",
+            return_value=({"results": [{"geometry": {"location": location}}]}, 200),
+        )
+        self.geoencode = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_equivalent_addresses_share_one_lookup(self):
+        first = self.client.get_lat_and_long("1 Marina Road, Lagos")
+        second = self.client.get_lat_and_long("  1 marina road   LAGOS. ")
+
+        self.assertEqual(first, {"lat": 6.45, "lng": 3.4})
+        self.assertEqual(second, first)
+        self.geoencode.assert_called_once_with("1 Marina Road, Lagos")
+        self.assertEqual(geocode_cache.stats()["hits"], 1)
+
+    def test_shared_tier_answers_after_local_tier_is_dropped(self):
+        self.client.get_lat_and_long("1 Marina Road, Lagos")
+        geocode_cache.local.clear()
+
+        self.client.get_lat_and_long("1 Marina Road, Lagos")
+        self.geoencode.assert_called_once()
+        self.assertEqual(geocode_cache.stats()["shared_hits"], 1)
+
+    def test_failed_lookups_are_negatively_cached(self):
+        self.geoencode.return_value = ({"results": [], "status": "ZERO_RESULTS"}, 200)
+
+        self.assertIsNone(self.client.get_lat_and_long("nowhere"))
+        self.assertIsNone(self.client.get_lat_and_long("nowhere"))
+        self.geoencode.assert_called_once()
+
+    def test_negative_entries_expire_sooner(self):
+        key = geocode_cache.shared_key("nowhere")
+        with mock.patch("event.googleapi.cache.shared_cache") as shared:
+            shared.get.return_value = MISS
+            self.geoencode.return_value = ({}, 500)
+            self.client.get_lat_and_long("nowhere")
+
+        shared.set.assert_called_once_with(key, None, geocode_cache.negative_ttl)
+
+
+class DirectionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        direction_cache.clear()
+        self.addCleanup(direction_cache.clear)
+        self.event = make_event(
+            event_location_type=EventLocationType.ONSITE,
+            event_url_link="",
+            event_address="1 Marina Road, Lagos",
+            event_location_latitude="6.450000",
+            event_location_lognitude="3.400000",
+        )
+        self.url = reverse("event-direction", args=[self.event.event_uuid])
+        patcher = mock.patch.object(
+            DirectionClient, "get_direction", return_value=DIRECTION_RESPONSE
+        )
+        self.get_direction = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request_direction(self, **data):
+        return APIClient().post(self.url, data)
+
+    def test_nearby_origins_share_a_route(self):
+        first = self.request_direction(
+            start_location_latitude=6.52441, start_location_lognitude=3.37921
+        )
+        second = self.request_direction(
+            start_location_latitude=6.52439, start_location_lognitude=3.37918
+        )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.data["direction"], first.data["direction"])
+        self.get_direction.assert_called_once()
+        self.assertEqual(direction_cache.stats()["hits"], 1)
+        self.assertEqual(direction_cache.stats()["misses"], 1)
+
+    def test_distant_origins_and_modes_are_cached_apart(self):
+        self.request_direction(
+            start_location_latitude=6.52441, start_location_lognitude=3.37921
+        )
+        self.request_direction(
+            start_location_latitude=6.60441, start_location_lognitude=3.37921
+        )
+        get_direction_cleaned_date("6.52441,3.37921", "6.45,3.4", mode="walking")
+
+        self.assertEqual(self.get_direction.call_count, 3)
+
+    def test_origin_addresses_are_normalized(self):
+        self.request_direction(start_address="Yaba, Lagos")
+        self.request_direction(start_address="yaba lagos")
+
+        self.get_direction.assert_called_once()
+
+    def test_cache_stats_are_admin_only(self):
+        self.request_direction(start_address="Yaba, Lagos")
+        url = reverse("cache-stats")
+        self.assertEqual(APIClient().get(url).status_code, 403)
+
+        client = APIClient()
+        client.force_authenticate(
+            User.objects.create_superuser("admin", "admin@example.com", "pass")
+        )
+        response = client.get(url)
+        self.assertEqual(response.data["direction"]["misses"], 1)
+
+    def test_quantize_location(self):
+        self.assertEqual(
+            quantize_location("6.52441,3.37921", grid=0.01), "6.520000,3.380000"
+        )
+        self.assertEqual(quantize_location("Yaba,  Lagos"), "yaba lagos")
+
+
+class GoogleMapsTransportTests(TestCase):
+    def setUp(self):
+        self.stub = GoogleMapsStub().start()
+        self.addCleanup(self.stub.stop)
+        self.transport = GoogleMapsTransport(
+            timeout=0.2, retries=2, backoff=0, failure_threshold=2, reset_timeout=60
+        )
+        self.addCleanup(self.transport.session.close)
+        self.url = f"{self.stub.url}/geocode/json"
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            self.assertEqual(self.transport.get(self.url).status_code, 200)
+
+        client_addresses = {address for _, _, address in self.stub.requests}
+        self.assertEqual(len(self.stub.requests), 5)
+        self.assertEqual(len(client_addresses), 1)
+
+    def test_retryable_failures_are_retried(self):
+        self.stub.queue(503)
+        self.stub.queue(500)
+
+        response = self.transport.get(self.url)
+        self.assertEqual(response.json(), GEOCODE_RESPONSE)
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_slow_upstream_times_out(self):
+        for _ in range(3):
+            self.stub.queue(200, delay=0.5)
+
+        with self.assertRaises(GoogleAPIUnavailable):
+            self.transport.get(self.url)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        for _ in range(6):
+            self.stub.queue(500)
+        for _ in range(2):
+            with self.assertRaises(GoogleAPIUnavailable):
+                self.transport.get(self.url)
+        self.assertEqual(len(self.stub.requests), 6)
+
+        with self.assertRaises(GoogleAPIUnavailable):
+            self.transport.get(self.url)
+        self.assertEqual(len(self.stub.requests), 6)
+
+    def test_circuit_closes_after_a_successful_trial(self):
+        self.transport.breaker.reset_timeout = 0
+        for _ in range(6):
+            self.stub.queue(500)
+        for _ in range(2):
+            with self.assertRaises(GoogleAPIUnavailable):
+                self.transport.get(self.url)
+
+        self.assertEqual(self.transport.get(self.url).status_code, 200)
+        self.assertFalse(self.transport.breaker.is_open)
+
+    def test_any_error_ends_a_trial(self):
+        self.transport.breaker.reset_timeout = 0
+        for _ in range(6):
+            self.stub.queue(500)
+        for _ in range(2):
+            with self.assertRaises(GoogleAPIUnavailable):
+                self.transport.get(self.url)
+
+        with mock.patch.object(
+            self.transport.session, "request", side_effect=requests.TooManyRedirects
+        ):
+            with self.assertRaises(GoogleAPIUnavailable):
+                self.transport.get(self.url)
+        with mock.patch.object(
+            self.transport.session, "request", side_effect=KeyboardInterrupt
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                self.transport.get(self.url)
+
+        self.assertEqual(self.transport.get(self.url).status_code, 200)
+        self.assertFalse(self.transport.breaker.is_open)
+
+    async def test_any_error_ends_an_async_trial(self):
+        transport = AsyncGoogleMapsTransport(
+            retries=0, backoff=0, failure_threshold=1, reset_timeout=0
+        )
+        self.stub.queue(500)
+        with self.assertRaises(GoogleAPIUnavailable):
+            await transport.get(self.url)
+
+        with mock.patch.object(
+            transport.client, "request", side_effect=httpx.DecodingError("bad gzip")
+        ):
+            with self.assertRaises(GoogleAPIUnavailable):
+                await transport.get(self.url)
+
+        response = await transport.get(self.url)
+        await transport.aclose()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(transport.breaker.is_open)
+
+    def test_clients_go_through_the_stub(self):
+        cache.clear()
+        geocode_cache.clear()
+        self.addCleanup(geocode_cache.clear)
+        reset_transport()
+        self.addCleanup(reset_transport)
+
+        with self.settings(GOOGLE_MAPS_API_URL=self.stub.url):
+            location = GeoEncodingClient().get_lat_and_long("1 Marina Road")
+            direction = DirectionClient("Yaba", "Marina", "driving").get_direction()
+
+        self.assertEqual(location, {"lat": 6.45, "lng": 3.4})
+        self.assertEqual(direction, DIRECTION_RESPONSE)
+        self.assertEqual(
+            [path for _, path, _ in self.stub.requests],
+            ["/geocode/json", "/directions/json"],
+        )
+
+    def test_unavailable_geocoding_does_not_block_event_creation(self):
+        cache.clear()
+        geocode_cache.clear()
+        with mock.patch.object(
+            GoogleMapsTransport, "request", side_effect=GoogleAPIUnavailable()
+        ):
+            self.assertIsNone(geoencodeaddress("1 Marina Road"))
+
+
+class GoogleCalendarClientTests(TestCase):
+    def setUp(self):
+        self.stub = GoogleCalendarStub().start()
+        self.addCleanup(self.stub.stop)
+        settings_override = self.settings(GOOGLE_CALENDAR_API_URL=self.stub.api_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_calendar_clients()
+        self.addCleanup(reset_calendar_clients)
+        self.event = make_event(
+            event_start_date=date(2022, 10, 1),
+            event_start_time=time(9),
+            event_end_time=time(17),
+        )
+
+    def credentials(self, token="access"):
+        return Credentials(token=token, refresh_token="refresh", client_id="client")
+
+    def test_clients_are_cached_per_credentials_and_thread(self):
+        client = calendar_client(self.credentials())
+        self.assertIs(calendar_client(self.credentials()), client)
+        self.assertIsNot(calendar_client(self.credentials("renewed")), client)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            other = executor.submit(calendar_client, self.credentials()).result()
+        self.assertIsNot(other, client)
+
+    def test_inserts_reuse_the_connection(self):
+        client = calendar_client(self.credentials())
+        for _ in range(3):
+            event = client.insert_event(event_create_schema(self.event))
+            self.assertEqual(event["summary"], "Test Event")
+
+        self.assertEqual(len(self.stub.events), 3)
+        client_addresses = {address for _, _, address in self.stub.requests}
+        self.assertEqual(len(client_addresses), 1)
+
+    def test_oauth_callback_adds_the_event_to_the_calendar(self):
+        token = {
+            "access_token": "access",
+            "refresh_token": "refresh",
+            "expires_in": 3599,
+            "scope": "https://www.googleapis.com/auth/calendar.events",
+            "token_type": "Bearer",
+        }
+        state = base64.b64encode(
+            f"guest@example.com,{self.event.event_uuid}".encode("utf-8")
+        ).decode("utf-8")
+        with mock.patch("event.views.requests.post") as post:
+            post.return_value.json.return_value = token
+            response = APIClient().get(
+                reverse("oauth-code"), {"code": "code", "state": state}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["event_data"]["id"], "stub1")
+        [(calendar_id, event)] = self.stub.events
+        self.assertEqual(calendar_id, "guest@example.com")
+        self.assertEqual(event["start"]["dateTime"], "2022-10-01T09:00:00")
+
+
+class OAuthTokenStoreTests(TestCase):
+    def setUp(self):
+        self.stub = GoogleCalendarStub().start()
+        self.addCleanup(self.stub.stop)
+        settings_override = self.settings(
+            GOOGLE_CALENDAR_API_URL=self.stub.api_url,
+            TOKEN_ENDPOINT=self.stub.token_url,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        token_store.clear()
+        self.addCleanup(token_store.clear)
+        self.token_data = {
+            "access_token": "access",
+            "refresh_token": "refresh",
+            "expires_in": 3599,
+            "scope": "https://www.googleapis.com/auth/calendar.events",
+            "token_type": "Bearer",
+            "id_token": "ignored",
+        }
+
+    def test_expiry_is_counted_in_seconds(self):
+        token = OuthTokenModel.objects.create(
+            token_owner="guest@example.com", access_token="access", expires_in=3599
+        )
+        self.assertAlmostEqual(token.seconds_left(), 3599, delta=5)
+        self.assertFalse(token.is_expired())
+
+    def test_one_token_per_owner_and_provider(self):
+        token_store.save("guest@example.com", self.token_data)
+        token = token_store.save(
+            "guest@example.com", {"access_token": "second", "expires_in": 3599}
+        )
+
+        self.assertEqual(OuthTokenModel.objects.count(), 1)
+        self.assertEqual(token.access_token, "second")
+        self.assertEqual(token.refresh_token, "refresh")
+        with self.assertRaises(IntegrityError):
+            OuthTokenModel.objects.create(
+                token_owner="guest@example.com",
+                token_provider="Google",
+                expires_in=3599,
+            )
+
+    def test_saving_queues_a_refresh_before_expiry(self):
+        token = token_store.save("guest@example.com", self.token_data)
+
+        job = Job.objects.get(kind=REFRESH_OAUTH_TOKEN)
+        self.assertEqual(job.payload, {"token_id": token.pk})
+        margin = settings.GOOGLE_TOKEN_REFRESH_MARGIN
+        self.assertAlmostEqual(
+            (token.token_expire_time - job.run_after).total_seconds(), margin, delta=5
+        )
+
+    def test_credentials_come_from_the_cache(self):
+        token_store.save("guest@example.com", self.token_data)
+        token_store.clear()
+
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                credentials = token_store.credentials("guest@example.com")
+        self.assertEqual(credentials.token, "access")
+        self.assertFalse(credentials.expired)
+        self.assertIsNone(token_store.credentials("other@example.com"))
+
+    def test_tokens_close_to_expiry_are_not_cached(self):
+        self.token_data["expires_in"] = settings.GOOGLE_TOKEN_REFRESH_MARGIN - 60
+        token_store.save("guest@example.com", self.token_data)
+
+        with self.assertNumQueries(2):
+            token_store.get("guest@example.com")
+            token_store.get("guest@example.com")
+
+    def test_refresh_job_renews_the_token(self):
+        self.token_data["expires_in"] = 60
+        token = token_store.save("guest@example.com", self.token_data)
+
+        self.assertEqual(work(once=True), 1)
+
+        token.refresh_from_db()
+        self.assertEqual(token.access_token, "renewed-access-token")
+        self.assertEqual(token.refresh_token, "refresh")
+        self.assertAlmostEqual(token.seconds_left(), 3599, delta=5)
+        self.assertEqual(
+            token_store.get("guest@example.com").access_token, "renewed-access-token"
+        )
+        next_job = Job.objects.get(kind=REFRESH_OAUTH_TOKEN, status=JobStatus.PENDING)
+        self.assertGreater(next_job.run_after, timezone.now())
+
+    def test_refresh_job_skips_tokens_renewed_since(self):
+        token = token_store.save("guest@example.com", self.token_data)
+
+        self.assertFalse(token_store.refresh_if_due(token.pk))
+        self.assertEqual(self.stub.requests, [])
+
+    def test_add_to_calendar_uses_the_owners_token(self):
+        event = make_event(
+            event_start_date=date(2022, 10, 1),
+            event_start_time=time(9),
+            event_end_time=time(17),
+        )
+        Booking.objects.create(event=event, attendee_email="guest@example.com")
+        Booking.objects.create(event=event, attendee_email="nobody@example.com")
+        token_store.save("guest@example.com", self.token_data)
+        token_store.save("other@example.com", dict(self.token_data, access_token="x"))
+        url = reverse("event-add-to-calendar", args=[event.event_uuid])
+        client = APIClient()
+
+        client.force_authenticate(User(username="guest", email="guest@example.com"))
+        response = client.post(f"{url}?email=other%40example.com")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.stub.events), 1)
+        self.assertEqual(
+            CalendarEntry.objects.get(event=event).attendee_email, "guest@example.com"
+        )
+
+        client.force_authenticate(User(username="nobody", email="nobody@example.com"))
+        response = client.post(url)
+        self.assertEqual(response.status_code, 400)
+
+    def test_add_to_calendar_needs_a_signed_in_attendee(self):
+        event = make_event()
+        Booking.objects.create(event=event, attendee_email="guest@example.com")
+        token_store.save("guest@example.com", self.token_data)
+        token_store.save("other@example.com", self.token_data)
+        url = reverse("event-add-to-calendar", args=[event.event_uuid])
+        client = APIClient()
+
+        response = client.post(f"{url}?email=guest%40example.com")
+        self.assertEqual(response.status_code, 403)
+
+        client.force_authenticate(User(username="other", email="other@example.com"))
+        response = client.post(f"{url}?email=guest%40example.com")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.stub.events, [])
+
+
+class CalendarSyncTests(TestCase):
+    def setUp(self):
+        self.stub = GoogleCalendarStub().start()
+        self.addCleanup(self.stub.stop)
+        settings_override = self.settings(
+            GOOGLE_CALENDAR_API_URL=self.stub.api_url,
+            GOOGLE_CALENDAR_BATCH_URL=self.stub.batch_url,
+            GOOGLE_CALENDAR_RATE_LIMIT=10000,
+            TOKEN_ENDPOINT=self.stub.token_url,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_calendar_clients()
+        self.addCleanup(reset_calendar_clients)
+        token_store.clear()
+        self.addCleanup(token_store.clear)
+
+        self.owner = User.objects.create_user("owner", "owner@example.com", "pass")
+        self.event = make_event(
+            event_owner=self.owner,
+            event_start_date=date(2022, 10, 1),
+            event_start_time=time(9),
+            event_end_time=time(17),
+        )
+        emails = [f"attendee{index}@example.com" for index in range(120)]
+        Booking.objects.bulk_create(
+            Booking(event=self.event, attendee_email=email) for email in emails
+        )
+        # The last ten never granted calendar access.
+        OuthTokenModel.objects.bulk_create(
+            OuthTokenModel(
+                token_provider="Google",
+                token_owner=email,
+                access_token=f"access-{email}",
+                refresh_token="refresh",
+                expires_in=3599,
+                token_expire_time=timezone.now() + timedelta(seconds=3599),
+            )
+            for email in emails[:110]
+        )
+
+    def test_attendees_are_synced_in_batches(self):
+        self.assertEqual(request_sync(self.event), 110)
+        self.assertEqual(
+            Job.objects.filter(kind=SYNC_EVENT_CALENDAR).count(),
+            math.ceil(110 / 50),
+        )
+
+        work(once=True)
+
+        self.assertEqual(self.stub.batches, [50, 50, 10])
+        self.assertEqual(len(set(self.stub.authorizations)), 110)
+        self.assertEqual(
+            sync_progress(self.event),
+            {"pending": 0, "syncing": 0, "synced": 110, "failed": 0},
+        )
+        entry = CalendarEntry.objects.get(attendee_email="attendee0@example.com")
+        self.assertEqual(
+            entry.calendar_event_id, f"ev{self.event.event_uuid.hex}{entry.pk}"
+        )
+
+    def test_resync_updates_the_existing_entries(self):
+        request_sync(self.event)
+        sync_event(self.event.pk)
+        self.stub.calls.clear()
+
+        self.event.event_name = "Rescheduled"
+        self.event.save()
+        request_sync(self.event)
+        sync_event(self.event.pk)
+
+        self.assertEqual({method for method, _ in self.stub.calls}, {"PUT"})
+        self.assertEqual(len(self.stub.calls), 110)
+        self.assertEqual(self.stub.events[-1][1]["summary"], "Rescheduled")
+
+    def test_retryable_failures_stay_pending(self):
+        request_sync(self.event)
+        self.stub.queue(503)
+
+        with self.assertRaises(GoogleAPIUnavailable):
+            sync_event(self.event.pk)
+        self.assertEqual(
+            sync_progress(self.event),
+            {"pending": 61, "syncing": 0, "synced": 49, "failed": 0},
+        )
+
+        sync_event(self.event.pk)
+        self.assertEqual(sync_progress(self.event)["synced"], 110)
+
+    def test_conflicting_insert_is_updated_instead(self):
+        request_sync(self.event)
+        self.stub.queue(409)
+        self.stub.queue(403)
+
+        with self.assertLogs("event.calendar_sync", "WARNING"):
+            self.assertEqual(sync_event(self.event.pk), {"synced": 109, "failed": 1})
+        first, second = CalendarEntry.objects.order_by("id")[:2]
+        self.assertEqual(second.status, CalendarEntryStatus.FAILED)
+        self.assertEqual(first.status, CalendarEntryStatus.SYNCED)
+        self.assertIn(
+            ("PUT", f"/calendar/v3/calendars/primary/events/{first.calendar_event_id}"),
+            self.stub.calls,
+        )
+
+    def test_events_without_a_schedule_fail_the_sync(self):
+        Event.objects.filter(pk=self.event.pk).update(event_start_time=None)
+        request_sync(self.event)
+
+        with self.assertLogs("event.calendar_sync", "WARNING"):
+            self.assertEqual(sync_event(self.event.pk), {"synced": 0, "failed": 110})
+        self.assertEqual(self.stub.calls, [])
+
+    def test_entries_edited_during_a_batch_are_synced_again(self):
+        request_sync(self.event)
+        execute = CalendarBatch.execute
+
+        def edit_while_sending(batch):
+            # Google is called outside of any transaction holding the entries.
+            self.assertEqual(sync_progress(self.event)["syncing"], 50)
+            request_sync(self.event)
+            return execute(batch)
+
+        with mock.patch.object(CalendarBatch, "execute", edit_while_sending):
+            self.assertEqual(sync_batch(self.event.pk, 50)["synced"], 0)
+        self.assertEqual(sync_progress(self.event)["pending"], 110)
+
+    def test_claimed_entries_are_handed_back(self):
+        request_sync(self.event)
+
+        with mock.patch.object(CalendarBatch, "execute", side_effect=OSError):
+            with self.assertRaises(OSError):
+                sync_event(self.event.pk)
+        self.assertEqual(sync_progress(self.event)["pending"], 110)
+
+        claim_entries(self.event.pk, 10)
+        self.assertEqual(sync_event(self.event.pk), {"synced": 100, "failed": 0})
+        CalendarEntry.objects.filter(status=CalendarEntryStatus.SYNCING).update(
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(sync_event(self.event.pk), {"synced": 10, "failed": 0})
+
+    def sync_jobs(self, event):
+        return Job.objects.filter(
+            kind=SYNC_EVENT_CALENDAR, payload__event_id=event.pk
+        ).count()
+
+    def test_publishing_syncs_once_the_event_opens(self):
+        Event.objects.filter(pk=self.event.pk).update(
+            event_publish_end_date=timezone.now() + timedelta(days=7)
+        )
+        url = reverse("event-publish-event", args=[self.event.event_uuid])
+        client = APIClient()
+        client.force_authenticate(self.owner)
+
+        self.assertEqual(client.get(url).status_code, 200)
+        self.assertEqual(self.sync_jobs(self.event), 3)
+        self.assertEqual(client.get(url).status_code, 200)
+        self.assertEqual(self.sync_jobs(self.event), 3)
+
+    def test_bulk_and_scheduled_openings_are_synced(self):
+        now = timezone.now()
+        Event.objects.filter(pk=self.event.pk).update(
+            event_published_date=now - timedelta(hours=1),
+            event_publish_end_date=now + timedelta(days=7),
+        )
+        other = make_event(
+            event_owner=self.owner,
+            event_published_date=now + timedelta(hours=1),
+            event_publish_end_date=now + timedelta(days=7),
+        )
+        Booking.objects.create(event=other, attendee_email="attendee0@example.com")
+
+        Scheduler().apply_due(now)
+        self.assertEqual(self.sync_jobs(self.event), 3)
+        self.assertEqual(self.sync_jobs(other), 0)
+
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        url = reverse("event-bulk-transition", args=["publish"])
+        response = client.post(
+            url, {"event_uuids": [str(other.event_uuid)]}, format="json"
+        )
+        self.assertEqual(response.data["updated"], [other.event_uuid])
+        self.assertEqual(self.sync_jobs(other), 1)
+        self.assertEqual(
+            sync_progress(other), {"pending": 1, "syncing": 0, "synced": 0, "failed": 0}
+        )
+
+    def test_only_the_owner_can_sync(self):
+        url = reverse("event-calendar-sync", args=[self.event.event_uuid])
+        client = APIClient()
+        self.assertEqual(client.post(url).status_code, 403)
+
+        client.force_authenticate(self.owner)
+        response = client.post(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["pending"], 110)
+
+    def test_rate_limiter_spreads_calls(self):
+        limiter = RateLimiter(rate=100, burst=10)
+        self.assertEqual(limiter.acquire(10), 0)
+        self.assertAlmostEqual(limiter.acquire(5), 0.05, delta=0.02)
+
+
+def make_image():
+    image = BytesIO()
+    Image.new("RGB", (1, 1)).save(image, "PNG")
+    return SimpleUploadedFile("event.png", image.getvalue(), content_type="image/png")
+
+
+class AsyncEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        direction_cache.clear()
+        geocode_cache.clear()
+        self.addCleanup(direction_cache.clear)
+        self.addCleanup(geocode_cache.clear)
+        self.stub = GoogleMapsStub().start()
+        self.addCleanup(self.stub.stop)
+        settings_override = self.settings(
+            GOOGLE_MAPS_API_URL=self.stub.url, MEDIA_ROOT=tempfile.mkdtemp()
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    async def test_direction(self):
+        event = await sync_to_async(make_event)(
+            event_location_type=EventLocationType.ONSITE,
+            event_url_link="",
+            event_address="1 Marina Road, Lagos",
+        )
+        url = reverse("async-event-direction", args=[event.event_uuid])
+
+        response = await self.async_client.post(
+            url, {"start_address": "Yaba, Lagos"}, content_type="application/json"
+        )
+        await reset_async_transport()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["direction"]["total_distance"], "9.8 km")
+        self.assertEqual(self.stub.requests[0][1], "/directions/json")
+
+    async def test_direction_requires_an_origin(self):
+        event = await sync_to_async(make_event)(
+            event_location_type=EventLocationType.ONSITE, event_url_link=""
+        )
+        url = reverse("async-event-direction", args=[event.event_uuid])
+
+        response = await self.async_client.post(
+            url, {}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stub.requests, [])
+
+    async def test_create_queues_geocoding(self):
+        now = timezone.now()
+        # Django 4.1's AsyncClient cannot stream multipart bodies, so call the
+        # view with a regular request instead.
+        request = RequestFactory().post(
+            reverse("async-event-create"),
+            {
+                "event_name": "Async Meetup",
+                "event_image": make_image(),
+                "event_location_type": EventLocationType.ONSITE,
+                "event_address": "1 Marina Road, Lagos",
+                "event_published_date": now.isoformat(),
+                "event_publish_end_date": (now + timedelta(days=1)).isoformat(),
+            },
+        )
+        response = await async_views.event_create(request)
+
+        self.assertEqual(response.status_code, 201, response.content)
+        data = json.loads(response.content)
+        self.assertEqual(data["geocode_status"], GeocodeStatus.PENDING)
+        event = await Event.objects.aget(event_uuid=data["event_uuid"])
+        self.assertIsNone(event.event_location_latitude)
+        self.assertTrue(
+            await Job.objects.filter(
+                kind=GEOCODE_EVENT, payload__event_id=event.pk
+            ).aexists()
+        )
+        self.assertEqual(self.stub.requests, [])
+
+
+class BatchDirectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        direction_cache.clear()
+        self.addCleanup(direction_cache.clear)
+        self.stub = GoogleMapsStub().start()
+        self.addCleanup(self.stub.stop)
+        reset_transport()
+        self.addCleanup(reset_transport)
+        settings_override = self.settings(GOOGLE_MAPS_API_URL=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create_user("owner", "owner@example.com", "pass")
+        self.event = make_event(
+            event_owner=self.owner,
+            event_location_type=EventLocationType.ONSITE,
+            event_url_link="",
+            event_address="1 Marina Road, Lagos",
+        )
+        self.url = reverse("event-batch-directions", args=[self.event.event_uuid])
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def post(self, origins, **data):
+        return self.client.post(self.url, {"origins": origins, **data}, format="json")
+
+    def read_lines(self, response):
+        return [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+
+    def test_streams_one_line_per_origin_and_deduplicates(self):
+        origins = [
+            {"start_address": "Yaba, Lagos"},
+            {"start_location_latitude": 6.52441, "start_location_lognitude": 3.37921},
+            {"start_address": "yaba lagos"},
+            {"start_address": "Ikeja, Lagos"},
+        ]
+        response = self.post(origins)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = self.read_lines(response)
+        self.assertEqual(sorted(line["index"] for line in lines), [0, 1, 2, 3])
+        self.assertTrue(all(line["direction"]["total_distance"] for line in lines))
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_cached_routes_are_streamed_first(self):
+        get_direction_cleaned_date("Ikeja, Lagos", "1 Marina Road, Lagos,")
+        self.stub.requests.clear()
+
+        lines = self.read_lines(
+            self.post([{"start_address": "Yaba"}, {"start_address": "Ikeja, Lagos"}])
+        )
+        self.assertEqual([line["index"] for line in lines], [1, 0])
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_failed_routes_are_reported_per_origin(self):
+        self.stub.responses["/directions/json"] = {"status": "NOT_FOUND"}
+
+        (line,) = self.read_lines(self.post([{"start_address": "Nowhere"}]))
+        self.assertEqual(line["index"], 0)
+        self.assertIn("error", line)
+
+    def test_batch_size_is_capped(self):
+        with self.settings(GOOGLE_DIRECTION_BATCH_MAX=2):
+            response = self.post([{"start_address": f"Street {i}"} for i in range(3)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stub.requests, [])
+
+    def test_only_the_owner_can_batch(self):
+        self.client.force_authenticate(None)
+
+        response = self.post([{"start_address": "Yaba"}])
+        self.assertEqual(response.status_code, 403)
+
+
+class GeocodeJobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.clear()
+        self.addCleanup(geocode_cache.clear)
+        self.stub = GoogleMapsStub().start()
+        self.addCleanup(self.stub.stop)
+        reset_transport()
+        self.addCleanup(reset_transport)
+        settings_override = self.settings(
+            GOOGLE_MAPS_API_URL=self.stub.url,
+            GOOGLE_MAPS_RETRIES=0,
+            MEDIA_ROOT=tempfile.mkdtemp(),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_event(self, address="1 Marina Road, Lagos"):
+        now = timezone.now()
+        serializer = EventCreateSerializer(
+            data={
+                "event_name": "Meetup",
+                "event_image": make_image(),
+                "event_location_type": EventLocationType.ONSITE,
+                "event_address": address,
+                "event_published_date": now,
+                "event_publish_end_date": now + timedelta(days=1),
+            }
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_create_does_not_call_google(self):
+        event = self.create_event()
+
+        self.assertEqual(event.geocode_status, GeocodeStatus.PENDING)
+        self.assertEqual(self.stub.requests, [])
+        job = Job.objects.get()
+        self.assertEqual(job.kind, GEOCODE_EVENT)
+        self.assertEqual(job.payload["event_id"], event.pk)
+
+    def test_worker_fills_in_the_location(self):
+        event = self.create_event()
+
+        self.assertEqual(work(once=True), 1)
+        event.refresh_from_db()
+        self.assertEqual(event.geocode_status, GeocodeStatus.DONE)
+        self.assertEqual(float(event.event_location_latitude), 6.45)
+        self.assertEqual(float(event.event_location_lognitude), 3.4)
+        self.assertEqual(Job.objects.get().status, JobStatus.DONE)
+
+    def test_cached_addresses_are_located_on_create(self):
+        geocode_cache.set(
+            normalize_address("1 Marina Road, Lagos"), {"lat": 1, "lng": 2}
+        )
+
+        event = self.create_event("1 marina road lagos")
+        self.assertEqual(event.geocode_status, GeocodeStatus.DONE)
+        self.assertEqual(float(event.event_location_latitude), 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_unknown_addresses_fail_without_retrying(self):
+        self.stub.responses["/geocode/json"] = {"status": "ZERO_RESULTS", "results": []}
+        event = self.create_event()
+
+        work(once=True)
+        event.refresh_from_db()
+        self.assertEqual(event.geocode_status, GeocodeStatus.FAILED)
+        self.assertEqual(Job.objects.get().status, JobStatus.DONE)
+
+    def test_unavailable_google_is_retried_with_backoff(self):
+        event = self.create_event()
+        self.stub.queue(503)
+
+        work(once=True)
+        job = Job.objects.get()
+        self.assertEqual(job.status, JobStatus.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn("GoogleAPIUnavailable", job.last_error)
+
+        Job.objects.update(run_after=timezone.now())
+        work(once=True)
+        event.refresh_from_db()
+        self.assertEqual(event.geocode_status, GeocodeStatus.DONE)
+
+    def test_event_is_marked_failed_after_the_last_attempt(self):
+        event = self.create_event()
+        self.stub.queue(503)
+
+        Job.objects.update(max_attempts=1)
+        work(once=True)
+
+        event.refresh_from_db()
+        self.assertEqual(event.geocode_status, GeocodeStatus.FAILED)
+        self.assertEqual(Job.objects.get().status, JobStatus.FAILED)
+
+    def test_stale_jobs_do_not_overwrite_a_new_address(self):
+        event = self.create_event()
+        Event.objects.filter(pk=event.pk).update(event_address="2 Broad Street")
+
+        work(once=True)
+        event.refresh_from_db()
+        self.assertIsNone(event.event_location_latitude)
+
+    def test_regeocode_events_queues_failed_events(self):
+        failed = make_event(
+            event_location_type=EventLocationType.ONSITE,
+            event_url_link="",
+            event_address="1 Marina Road, Lagos",
+            geocode_status=GeocodeStatus.FAILED,
+        )
+        make_event(
+            event_location_type=EventLocationType.ONSITE,
+            event_url_link="",
+            event_address="2 Broad Street",
+            geocode_status=GeocodeStatus.DONE,
+        )
+        geocode_cache.set(normalize_address(failed.event_address), None)
+
+        out = StringIO()
+        call_command("regeocode_events", stdout=out)
+        self.assertIn("Queued 1 geocoding job(s)", out.getvalue())
+
+        work(once=True)
+        failed.refresh_from_db()
+        self.assertEqual(failed.geocode_status, GeocodeStatus.DONE)
+        self.assertEqual(len(self.stub.requests), 1)
+
+
+class JobWorkerTests(TransactionTestCase):
+    def test_workers_share_the_queue_without_running_a_job_twice(self):
+        runs = []
+        register("test_record")(lambda n: runs.append(n))
+        self.addCleanup(handlers.pop, "test_record")
+        for n in range(20):
+            enqueue("test_record", {"n": n})
+
+        out = StringIO()
+        call_command("run_jobs", "--once", "--workers", "4", stdout=out)
+
+        self.assertEqual(sorted(runs), list(range(20)))
+        self.assertIn("Ran 20 job(s)", out.getvalue())
+        self.assertFalse(Job.objects.exclude(status=JobStatus.DONE).exists())
+
+    def test_orphaned_jobs_are_requeued(self):
+        job = enqueue("test_orphan")
+        Job.objects.filter(pk=job.pk).update(
+            status=JobStatus.RUNNING,
+            locked_at=timezone.now() - timedelta(hours=1),
+        )
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(Job.objects.get().status, JobStatus.PENDING)
+
+    def test_orphaned_jobs_out_of_attempts_are_failed(self):
+        failed = []
+
+        def fail():
+            raise RuntimeError("kills the worker")
+
+        register("test_crash", on_failure=lambda: failed.append(True))(fail)
+        self.addCleanup(handlers.pop, "test_crash")
+        job = enqueue("test_crash")
+        Job.objects.filter(pk=job.pk).update(
+            status=JobStatus.RUNNING,
+            attempts=job.max_attempts,
+            locked_at=timezone.now() - timedelta(hours=1),
+        )
+
+        self.assertEqual(requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertIsNone(job.locked_at)
+        self.assertEqual(failed, [True])
+
+    def test_job_is_saved_when_on_failure_raises(self):
+        def on_failure():
+            raise RuntimeError("cannot mark the row failed")
+
+        def fail():
+            raise RuntimeError("boom")
+
+        register("test_broken_on_failure", on_failure=on_failure)(fail)
+        self.addCleanup(handlers.pop, "test_broken_on_failure")
+        enqueue("test_broken_on_failure")
+        Job.objects.update(max_attempts=1)
+
+        with self.assertLogs("event.jobs", "ERROR"):
+            work(once=True)
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertIsNone(job.locked_at)
+        self.assertIn("boom", job.last_error)
+
+
+class GeohashTests(TestCase):
+    def test_encode(self):
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(geohash.encode(-25.382708, -49.265506, 5), "6gkzw")
+
+    def test_covering_cells_contain_the_whole_circle(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            lat, lng = rng.uniform(-80, 80), rng.uniform(-180, 180)
+            radius = rng.choice([0.5, 5, 50, 500])
+            cells = geohash.covering_cells(lat, lng, radius)
+            bearing = rng.uniform(0, 2 * math.pi)
+            # A point on the circle's edge, a little inside.
+            angle = radius * 0.999 / geohash.EARTH_RADIUS_KM
+            lat1, lng1 = math.radians(lat), math.radians(lng)
+            lat2 = math.asin(
+                math.sin(lat1) * math.cos(angle)
+                + math.cos(lat1) * math.sin(angle) * math.cos(bearing)
+            )
+            lng2 = lng1 + math.atan2(
+                math.sin(bearing) * math.sin(angle) * math.cos(lat1),
+                math.cos(angle) - math.sin(lat1) * math.sin(lat2),
+            )
+            point_lat = math.degrees(lat2)
+            point_lng = (math.degrees(lng2) + 180) % 360 - 180
+            point_hash = geohash.encode(point_lat, point_lng)
+            self.assertTrue(
+                any(point_hash.startswith(cell) for cell in cells),
+                (lat, lng, radius, point_lat, point_lng),
+            )
+
+
+class NearbyEventsTests(TestCase):
+    # Kilometres east of the origin at roughly the equator's scale.
+    origin = (6.45, 3.40)
+
+    def make_onsite_event(self, km_east, **kwargs):
+        lat, lng = self.origin
+        lng_offset = km_east / (geohash.KM_PER_DEGREE * math.cos(math.radians(lat)))
+        return make_event(
+            event_location_type=EventLocationType.ONSITE,
+            event_url_link="",
+            event_address=f"{km_east} km east",
+            event_location_latitude=round(lat, 6),
+            event_location_lognitude=round(lng + lng_offset, 6),
+            **kwargs,
+        )
+
+    def get(self, **params):
+        lat, lng = self.origin
+        params = {"latitude": lat, "longitude": lng, **params}
+        return APIClient().get(reverse("event-nearby"), params)
+
+    def test_events_within_the_radius_nearest_first(self):
+        far = self.make_onsite_event(30)
+        near = self.make_onsite_event(1)
+        middle = self.make_onsite_event(8)
+        make_event()
+
+        response = self.get(radius=10)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(
+            [result["event_uuid"] for result in results],
+            [str(near.event_uuid), str(middle.event_uuid)],
+        )
+        self.assertAlmostEqual(results[0]["distance_km"], 1, places=1)
+        self.assertNotIn(str(far.event_uuid), response.content.decode())
+
+    def test_k_nearest_widens_the_search(self):
+        events = [self.make_onsite_event(km) for km in (300, 2, 40, 120)]
+
+        response = self.get(limit=3)
+
+        self.assertEqual(
+            [result["event_uuid"] for result in response.json()["results"]],
+            [str(events[index].event_uuid) for index in (1, 2, 3)],
+        )
+
+    def test_listing_filters_apply(self):
+        self.make_onsite_event(1, event_status=EventStatus.DRAFT)
+        now = timezone.now()
+        open_event = self.make_onsite_event(
+            2,
+            event_status=EventStatus.OPEN,
+            event_published_date=now,
+            event_publish_end_date=now + timedelta(days=7),
+        )
+
+        response = self.get(radius=10, event_status=EventStatus.OPEN)
+
+        self.assertEqual(
+            [result["event_uuid"] for result in response.json()["results"]],
+            [str(open_event.event_uuid)],
+        )
+
+    def test_geohash_follows_the_coordinates(self):
+        event = self.make_onsite_event(1)
+        self.assertEqual(
+            event.event_geohash,
+            geohash.encode(
+                event.event_location_latitude, event.event_location_lognitude
+            ),
+        )
+
+        event.event_location_latitude = event.event_location_lognitude = None
+        event.save()
+        self.assertEqual(event.event_geohash, "")
+
+    def test_coordinates_are_validated(self):
+        response = self.get(latitude=91)
+        self.assertEqual(response.status_code, 400)
+
+
+class EventUUIDTests(TestCase):
+    def test_uuid7_is_time_ordered(self):
+        uuids = [uuid7() for _ in range(10000)]
+
+        self.assertEqual(len(set(uuids)), len(uuids))
+        self.assertEqual(uuids, sorted(uuids))
+        self.assertTrue(all(value.version == 7 for value in uuids))
+        self.assertTrue(all(value.variant == uuid.RFC_4122 for value in uuids))
+
+    def test_every_event_gets_its_own_uuid(self):
+        first, second = make_event(), make_event()
+
+        self.assertNotEqual(first.event_uuid, second.event_uuid)
+        self.assertLess(first.event_uuid, second.event_uuid)
+
+    def test_uuids_are_unique(self):
+        event = make_event()
+
+        with self.assertRaises(IntegrityError):
+            make_event(event_uuid=event.event_uuid)
+
+    def test_detail_lookup_is_one_query(self):
+        event = make_event()
+        url = reverse("event-detail", args=[event.event_uuid])
+
+        # The event and its bookings.
+        with self.assertNumQueries(2):
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.event = make_open_event(event_max_participant_num=10)
+        self.detail_url = reverse("event-detail", args=[self.event.event_uuid])
+        self.list_url = reverse("event-list")
+
+    def test_detail_is_not_modified_for_the_current_etag(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        etag = response["ETag"]
+
+        with mock.patch.object(
+            EventReadSerializer, "to_representation"
+        ) as to_representation, self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        to_representation.assert_not_called()
+
+    def test_detail_is_not_modified_since_last_modified(self):
+        last_modified = self.client.get(self.detail_url)["Last-Modified"]
+
+        response = self.client.get(
+            self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_bookings_change_the_etag(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+
+        self.event.reserve_space("attendee@example.com")
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["event_seats_taken"], 1)
+
+    def test_the_owner_has_their_own_etag(self):
+        owner = User.objects.create_user("owner", "owner@example.com", "pass")
+        Event.objects.filter(pk=self.event.pk).update(event_owner=owner)
+        etag = self.client.get(self.detail_url)["ETag"]
+
+        self.client.force_authenticate(owner)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["event_attendees"], [])
+
+    def test_edits_change_the_etag(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+
+        self.event.close_event()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_event_is_not_found(self):
+        url = reverse("event-detail", args=[uuid7()])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"abc"')
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_is_not_modified_for_the_current_etag(self):
+        make_open_event()
+        etag = self.client.get(self.list_url)["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_is_never_not_modified_by_date(self):
+        other = make_open_event()
+        response = self.client.get(self.list_url)
+        self.assertNotIn("Last-Modified", response)
+        last_modified = self.client.get(self.detail_url)["Last-Modified"]
+
+        other.delete()
+        response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_list_etag_follows_the_page(self):
+        etag = self.client.get(self.list_url)["ETag"]
+
+        self.assertNotEqual(
+            self.client.get(self.list_url, {"event_status": "draft"})["ETag"], etag
+        )
+        make_event()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class EventRepresentationCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.events = [make_open_event(event_max_participant_num=10) for _ in range(3)]
+        self.list_url = reverse("event-list")
+
+    def test_list_is_assembled_from_cached_representations(self):
+        first = self.client.get(self.list_url).data["results"]
+
+        with mock.patch.object(
+            EventReadSerializer,
+            "build_representation",
+            wraps=EventReadSerializer().build_representation,
+        ) as build, self.assertNumQueries(1):
+            second = self.client.get(self.list_url).data["results"]
+
+        build.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_only_missing_events_are_serialized(self):
+        self.client.get(self.list_url)
+        self.events[1].close_event()
+
+        with mock.patch.object(
+            EventReadSerializer,
+            "build_representation",
+            wraps=EventReadSerializer().build_representation,
+        ) as build:
+            results = self.client.get(self.list_url).data["results"]
+
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(results[1]["event_status"], EventStatus.CLOSED)
+
+    def test_urls_use_the_requesting_host(self):
+        event = self.events[0]
+        url = reverse("event-detail", args=[event.event_uuid])
+        self.client.get(url)
+
+        response = self.client.get(url, HTTP_HOST="api.example.com")
+        self.assertEqual(response.data["event_url"], f"http://api.example.com{url}")
+
+    def test_reservations_replace_the_cached_representation(self):
+        event = self.events[0]
+        url = reverse("event-detail", args=[event.event_uuid])
+        self.client.get(url)
+        old_key = representation_key(event.pk, event.updated_at)
+        self.assertIsNotNone(cache.get(old_key))
+
+        event.reserve_space("attendee@example.com")
+
+        self.assertIsNone(cache.get(old_key))
+        response = self.client.get(url)
+        self.assertEqual(response.data["event_seats_taken"], 1)
+
+    def test_lifecycle_methods_replace_the_cached_representation(self):
+        event = self.events[0]
+        url = reverse("event-detail", args=[event.event_uuid])
+        self.client.get(url)
+        old_key = representation_key(event.pk, event.updated_at)
+
+        event.cancel_event()
+
+        self.assertIsNone(cache.get(old_key))
+        self.assertEqual(self.client.get(url).data["event_status"], EventStatus.CANCELD)
+
+
+class SeedEventsCommandTests(TestCase):
+    def test_seeds_events_with_bookings_matching_the_counters(self):
+        out = StringIO()
+        call_command(
+            "seed_events",
+            "--events",
+            "50",
+            "--attendees",
+            "3",
+            "--onsite-ratio",
+            "0.5",
+            "--batch-size",
+            "20",
+            stdout=out,
+        )
+
+        self.assertIn("Seeded 50 event(s)", out.getvalue())
+        self.assertEqual(Event.objects.count(), 50)
+        seats = sum(Event.objects.values_list("event_seats_taken", flat=True))
+        self.assertEqual(Booking.objects.count(), seats)
+        onsite = Event.objects.filter(event_location_type=EventLocationType.ONSITE)
+        self.assertTrue(onsite.exists())
+        self.assertFalse(onsite.filter(event_geohash="").exists())
+
+
+@override_settings(EVENT_METRICS_ENABLED=True)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.client = APIClient()
+
+    def server_timing(self, response):
+        return {
+            entry.split(";")[0]: entry
+            for entry in response["Server-Timing"].split(", ")
+        }
+
+    def test_server_timing_reports_queries_and_serialization(self):
+        make_event()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("event-list"))
+
+        timing = self.server_timing(response)
+        self.assertIn('desc="2"', timing["db"])
+        self.assertIn('desc="1"', timing["serialize"])
+        self.assertIn("total", timing)
+
+    def test_metrics_are_aggregated_per_view(self):
+        make_event()
+        self.client.get(reverse("event-list"))
+        self.client.get(reverse("event-list"))
+
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn(
+            'event_http_requests_total{view="event-list",method="GET",status="200"} 2',
+            body,
+        )
+        # The second request is served from the representation cache.
+        self.assertIn(
+            'event_calls_total{view="event-list",method="GET",call="db"} 3', body
+        )
+        self.assertIn(
+            'event_http_request_duration_seconds_count{view="event-list",method="GET"} 2',
+            body,
+        )
+
+    def test_google_maps_calls_are_recorded(self):
+        direction_cache.clear()
+        self.addCleanup(direction_cache.clear)
+        stub = GoogleMapsStub().start()
+        self.addCleanup(stub.stop)
+        reset_transport()
+        self.addCleanup(reset_transport)
+        event = make_event(
+            event_location_type=EventLocationType.ONSITE,
+            event_url_link="",
+            event_address="1 Marina Road, Lagos",
+            event_location_latitude="6.450000",
+            event_location_lognitude="3.400000",
+        )
+
+        with self.settings(GOOGLE_MAPS_API_URL=stub.url):
+            response = self.client.post(
+                reverse("event-direction", args=[event.event_uuid]),
+                {"start_location_latitude": 6.5, "start_location_lognitude": 3.37},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="1"', self.server_timing(response)["google_maps"])
+
+    async def test_async_views_stay_async(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(
+            asyncio.iscoroutinefunction(RequestMetricsMiddleware(get_response))
+        )
+        stub = GoogleMapsStub().start()
+        self.addCleanup(stub.stop)
+        event = await sync_to_async(make_event)(
+            event_location_type=EventLocationType.ONSITE,
+            event_url_link="",
+            event_address="1 Marina Road, Lagos",
+        )
+        # The test database connection was opened before any middleware was
+        # loaded, a server's request threads connect afterwards.
+        await sync_to_async(install_query_timer)(connection)
+
+        with self.settings(GOOGLE_MAPS_API_URL=stub.url):
+            response = await self.async_client.post(
+                reverse("async-event-direction", args=[event.event_uuid]),
+                {"start_address": "Yaba, Lagos"},
+                content_type="application/json",
+            )
+        await reset_async_transport()
+
+        self.assertEqual(response.status_code, 200)
+        timing = self.server_timing(response)
+        self.assertIn('desc="1"', timing["google_maps"])
+        self.assertIn("db", timing)
+        self.assertIn('view="async-event-direction"', registry.render())
+
+    @override_settings(EVENT_METRICS_ENABLED=False)
+    def test_disabled_by_default(self):
+        response = APIClient().get(reverse("event-list"))
+
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(APIClient().get(reverse("metrics")).status_code, 404)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse("event-list")
+        self.event = make_open_event(event_description="A long description")
+        self.event.reserve_space("ada@example.com")
+
+    def test_compact_view_counts_attendees_and_skips_the_description(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.url, {"view": "compact"})
+
+        data = response.data["results"][0]
+        self.assertEqual(data["event_seats_taken"], 1)
+        self.assertNotIn("event_attendees", data)
+        self.assertNotIn("event_description", data)
+        # One query for the page, none for the bookings.
+        self.assertEqual(len(captured), 1)
+        self.assertNotIn('"event_description"', captured[0]["sql"])
+
+    def test_fields_select_the_columns_read(self):
+        with self.assertNumQueries(1), CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.url, {"fields": "event_name,event_uuid"})
+
+        self.assertEqual(
+            response.data["results"],
+            [{"event_uuid": str(self.event.event_uuid), "event_name": "Test Event"}],
+        )
+        self.assertNotIn('"event_url_link"', captured[0]["sql"])
+
+    def test_fields_without_the_ordering_columns_take_one_query(self):
+        make_open_event()
+
+        # The next page cursor is built from the start date and id of the
+        # last row, which must not be loaded one by one.
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url, {"fields": "event_name", "page_size": 1}
+            )
+
+        self.assertEqual(response.data["results"], [{"event_name": "Test Event"}])
+        self.assertIsNotNone(response.data["next"])
+
+    def test_sparse_fieldsets_are_cut_from_cached_representations(self):
+        full = self.client.get(self.url).data["results"][0]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {"view": "compact"})
+
+        compact = response.data["results"][0]
+        self.assertEqual(
+            compact, {name: full[name] for name in full if name in compact}
+        )
+        self.assertEqual(set(full) - set(compact), {"event_description"})
+
+    def test_fieldsets_have_their_own_etag(self):
+        full = self.client.get(self.url)
+        compact = self.client.get(self.url, {"view": "compact"})
+
+        self.assertNotEqual(full["ETag"], compact["ETag"])
+        response = self.client.get(
+            self.url, {"view": "compact"}, HTTP_IF_NONE_MATCH=compact["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(self.url, {"fields": "event_name,password"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("password", str(response.data["fields"]))
+
+
+class EventExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse("event-export")
+        self.owner = User.objects.create_user("owner", "owner@example.com", "pass")
+        self.events = [
+            make_open_event(
+                event_owner=self.owner,
+                event_start_date=date(2022, 10, 1) + timedelta(days=i),
+            )
+            for i in range(5)
+        ]
+        self.events[0].reserve_space("ada@example.com")
+        self.events[0].reserve_space("bola@example.com")
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_export_streams_every_event_in_chunks(self):
+        with self.settings(EVENT_EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(self.url)
+
+        self.assertEqual(
+            response["Content-Type"], "application/x-ndjson; charset=utf-8"
+        )
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(
+            [row["event_uuid"] for row in rows],
+            [str(event.event_uuid) for event in self.events],
+        )
+        self.assertEqual(rows[0]["event_seats_taken"], 2)
+        self.assertTrue(rows[0]["event_url"].startswith("http://testserver/"))
+
+    def test_export_leaves_the_attendees_out(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.get(self.url, {"fields": "event_uuid,event_attendees"})
+
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(rows[0], {"event_uuid": str(self.events[0].event_uuid)})
+
+        response = self.client.get(self.url, HTTP_ACCEPT="text/csv")
+        self.assertNotIn("event_attendees", self.content(response).splitlines()[0])
+
+    def test_csv_export_uses_the_fieldset_as_columns(self):
+        response = self.client.get(
+            self.url, {"format": "csv", "fields": "event_uuid,event_seats_taken"}
+        )
+
+        lines = self.content(response).splitlines()
+        self.assertEqual(lines[0], "event_uuid,event_seats_taken")
+        self.assertEqual(lines[1], f"{self.events[0].event_uuid},2")
+        self.assertEqual(len(lines), 6)
+        self.assertIn('filename="events.csv"', response["Content-Disposition"])
+
+    def test_export_applies_the_listing_filters(self):
+        self.events[1].cancel_event()
+        response = self.client.get(
+            self.url, {"event_status": EventStatus.CANCELD}, HTTP_ACCEPT="text/csv"
+        )
+
+        lines = self.content(response).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn(str(self.events[1].event_uuid), lines[1])
+
+    def test_attendee_export_is_for_the_owner_only(self):
+        url = reverse("event-export-attendees", args=[self.events[0].event_uuid])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_authenticate(self.owner)
+        response = self.client.get(url, {"format": "csv"})
+
+        lines = self.content(response).splitlines()
+        self.assertEqual(lines[0], "attendee_email,created_at")
+        self.assertEqual(
+            [line.split(",")[0] for line in lines[1:]],
+            ["ada@example.com", "bola@example.com"],
+        )
+
+
+class BulkEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.clear()
+        self.addCleanup(geocode_cache.clear)
+        self.stub = GoogleMapsStub().start()
+        self.addCleanup(self.stub.stop)
+        reset_transport()
+        self.addCleanup(reset_transport)
+        settings_override = self.settings(GOOGLE_MAPS_API_URL=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create_user("owner", "owner@example.com", "pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def event_data(self, name, address=None):
+        now = timezone.now()
+        data = {
+            "event_name": name,
+            "event_published_date": now.isoformat(),
+            "event_publish_end_date": (now + timedelta(days=1)).isoformat(),
+        }
+        if address:
+            data.update(event_location_type="onsite", event_address=address)
+        else:
+            data.update(
+                event_location_type="virtual",
+                event_url_link="https://meet.google.com/abc",
+            )
+        return data
+
+    def bulk_create(self, events):
+        return self.client.post(reverse("event-bulk-create"), events, format="json")
+
+    def transition(self, transition, data=None, **filters):
+        url = reverse("event-bulk-transition", args=[transition])
+        if filters:
+            url = f"{url}?{urlencode(filters)}"
+        return self.client.post(url, data or {}, format="json")
+
+    def test_bulk_create_geocodes_each_address_once(self):
+        response = self.bulk_create(
+            [
+                self.event_data("One", "1 Marina Road, Lagos"),
+                self.event_data("Two", "1 marina road lagos"),
+                self.event_data("Three"),
+            ]
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 3)
+        events = Event.objects.order_by("id")
+        self.assertEqual([e.event_owner for e in events], [self.owner] * 3)
+        self.assertEqual(events[0].event_status, EventStatus.DRAFT)
+        job = Job.objects.get()
+        self.assertEqual(job.payload["event_ids"], [events[0].pk, events[1].pk])
+
+        self.assertEqual(work(once=True), 1)
+        self.assertEqual(len(self.stub.requests), 1)
+        located = Event.objects.filter(geocode_status=GeocodeStatus.DONE)
+        self.assertEqual(located.count(), 2)
+        self.assertEqual(located.first().event_geohash, geohash.encode(6.45, 3.4))
+
+    def test_bulk_create_queries_do_not_grow_with_the_batch(self):
+        with CaptureQueriesContext(connection) as small:
+            self.bulk_create([self.event_data(f"E{i}", f"{i} Road") for i in range(2)])
+        with CaptureQueriesContext(connection) as large:
+            self.bulk_create(
+                [self.event_data(f"E{i}", f"{i} Street") for i in range(20)]
+            )
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Event.objects.count(), 22)
+
+    def test_bulk_create_reports_every_invalid_event(self):
+        invalid = self.event_data("Bad")
+        invalid["event_address"] = "1 Marina Road"
+        response = self.bulk_create([self.event_data("Good"), invalid, {}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("error", response.data[1])
+        self.assertIn("event_name", response.data[2])
+        self.assertFalse(Event.objects.exists())
+
+    def test_bulk_create_needs_a_user(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.bulk_create([self.event_data("One")]).status_code, 403)
+
+    def test_transition_by_uuid_in_one_update(self):
+        events = [
+            make_open_event(event_owner=self.owner),
+            make_open_event(event_owner=self.owner),
+            make_event(event_owner=self.owner),
+        ]
+        other = make_open_event()
+        url = reverse("event-detail", args=[events[0].event_uuid])
+        self.client.get(url)
+        old_key = representation_key(events[0].pk, events[0].updated_at)
+        self.assertIsNotNone(cache.get(old_key))
+
+        uuids = [str(event.event_uuid) for event in events + [other]]
+        with CaptureQueriesContext(connection) as captured:
+            response = self.transition("close", {"event_uuids": uuids})
+
+        self.assertEqual(
+            [
+                query["sql"].split()[0]
+                for query in captured
+                if "event_event" in query["sql"]
+            ],
+            ["SELECT", "UPDATE"],
+        )
+        self.assertEqual(response.data["updated"], [e.event_uuid for e in events[:2]])
+        # Without publish dates the draft stays a draft, as with close_event.
+        self.assertEqual(response.data["skipped"], [events[2].event_uuid])
+        self.assertEqual(response.data["not_found"], [other.event_uuid])
+        self.assertIsNone(cache.get(old_key))
+        self.assertEqual(self.client.get(url).data["event_status"], EventStatus.CLOSED)
+        other.refresh_from_db()
+        self.assertEqual(other.event_status, EventStatus.OPEN)
+
+    def test_publish_by_filter(self):
+        now = timezone.now()
+        draft = make_event(
+            event_owner=self.owner, event_publish_end_date=now + timedelta(days=1)
+        )
+        make_event(event_owner=self.owner)
+
+        response = self.transition("publish", event_status=EventStatus.DRAFT)
+
+        self.assertEqual(response.data["updated"], [draft.event_uuid])
+        draft.refresh_from_db()
+        self.assertEqual(draft.event_status, EventStatus.OPEN)
+        self.assertIsNotNone(draft.event_published_date)
+
+    def test_transition_needs_uuids_or_filters(self):
+        make_open_event(event_owner=self.owner)
+
+        response = self.transition("cancel")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Event.objects.get().event_status, EventStatus.OPEN)
+
+
+class SchedulerTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.now = timezone.now()
+
+    def scheduled_event(self, status, published, publish_end):
+        event = make_event(
+            event_published_date=self.now + timedelta(hours=published),
+            event_publish_end_date=self.now + timedelta(hours=publish_end),
+        )
+        Event.objects.filter(pk=event.pk).update(event_status=status)
+        return event
+
+    def status(self, event):
+        event.refresh_from_db()
+        return event.event_status
+
+    def test_due_events_are_opened_and_closed(self):
+        to_open = self.scheduled_event(EventStatus.DRAFT, -1, 24)
+        to_close = self.scheduled_event(EventStatus.OPEN, -48, -1)
+        later = self.scheduled_event(EventStatus.DRAFT, 2, 24)
+        expired = self.scheduled_event(EventStatus.DRAFT, -48, -1)
+        undated = make_event()
+
+        counts = Scheduler().cycle()
+
+        self.assertEqual(counts, {"open": 1, "close": 1})
+        self.assertEqual(self.status(to_open), EventStatus.OPEN)
+        self.assertEqual(self.status(to_close), EventStatus.CLOSED)
+        self.assertEqual(self.status(later), EventStatus.DRAFT)
+        self.assertEqual(self.status(expired), EventStatus.DRAFT)
+        self.assertEqual(self.status(undated), EventStatus.DRAFT)
+
+    def test_due_events_are_closed_in_batches(self):
+        for _ in range(5):
+            self.scheduled_event(EventStatus.OPEN, -48, -1)
+
+        with CaptureQueriesContext(connection) as captured:
+            counts = Scheduler(batch_size=2).apply_due(self.now)
+
+        self.assertEqual(counts["close"], 5)
+        updates = [q for q in captured if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+        self.assertFalse(Event.objects.filter(event_status=EventStatus.OPEN).exists())
+
+    def test_sleeps_until_the_next_transition(self):
+        self.scheduled_event(EventStatus.OPEN, -1, 2)
+        self.scheduled_event(EventStatus.DRAFT, 1, 24)
+        scheduler = Scheduler(refresh_interval=24 * 60 * 60)
+
+        scheduler.cycle()
+
+        self.assertEqual(len(scheduler.heap), 2)
+        self.assertAlmostEqual(scheduler.seconds_until_next(), 60 * 60, delta=5)
+
+    def test_transitions_are_counted(self):
+        self.scheduled_event(EventStatus.OPEN, -48, -1)
+        out = StringIO()
+
+        call_command("run_scheduler", "--once", stdout=out)
+
+        self.assertIn("0 open, 1 close", out.getvalue())
+        metrics = registry.render()
+        self.assertIn(
+            'event_scheduler_transitions_total{transition="close"} 1', metrics
+        )
+        self.assertIn('event_scheduler_cycle_transitions{transition="open"} 0', metrics)
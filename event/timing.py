@@ -0,0 +1,30 @@
+"""Latency summaries for the benchmarks and ``benchmark_event_queries``."""
+import statistics
+import time
+from contextlib import contextmanager
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    millis = [sample * 1000 for sample in samples]
+    return {
+        "count": len(millis),
+        "mean_ms": round(statistics.fmean(millis), 4),
+        "p50_ms": round(percentile(millis, 50), 4),
+        "p99_ms": round(percentile(millis, 99), 4),
+    }
+
+
+@contextmanager
+def timer(samples):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        samples.append(time.perf_counter() - start)
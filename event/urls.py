@@ -1,11 +1,20 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import EventAPIViewSet, OuthCallBackView
+from . import async_views
+from .views import EventAPIViewSet, GoogleAPICacheStatsView, OuthCallBackView
 
 router = DefaultRouter()
 
 router.register(basename="event", viewset=EventAPIViewSet, prefix="events")
 router.register(basename="oauth", viewset=OuthCallBackView, prefix="")
-urlpatterns = []
+urlpatterns = [
+    path("cache-stats/", GoogleAPICacheStatsView.as_view(), name="cache-stats"),
+    path("async/events/", async_views.event_create, name="async-event-create"),
+    path(
+        "async/events/<uuid:event_uuid>/direction/",
+        async_views.event_direction,
+        name="async-event-direction",
+    ),
+]
 urlpatterns += router.urls
@@ -4,10 +4,9 @@ from urllib.parse import unquote, urlencode
 
 import requests
 from django.conf import settings
-from django.http import Http404
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import redirect
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from rest_framework import permissions, status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
@@ -15,48 +14,269 @@ from rest_framework.reverse import reverse
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ViewSet
 
-from event.googleapi.calendar import event_create_schema
+from event.calendar_sync import (
+    SYNC_TRANSITIONS,
+    record_synced,
+    request_sync,
+    request_sync_many,
+    sync_progress,
+)
+from event.googleapi.calendar import (
+    CALENDAR_FIELDS,
+    calendar_client,
+    event_create_schema,
+)
+from event.googleapi.direction import direction_cache, iter_directions
+from event.googleapi.geocoding import geocode_cache
+from event.googleapi.tokens import token_store
+from event.metrics import timed
+from event.mixins import ConditionalGetMixin
 from event.models import (
+    Booking,
     Event,
     EventLocationType,
     EventPaymentType,
     EventStatus,
-    OuthTokenModel,
 )
-from event.permissions import IsOwnerorReadonly
+from event.nearby import nearby_events
+from event.pagination import EventKeysetPagination
+from event.permissions import IsEventOwner, IsOwnerorReadonly
+from event.renderers import CSVRenderer, NDJSONRenderer
 from event.serializers import (
+    BatchDirectionSerializer,
     EventBookingSerializer,
+    EventBulkCreateSerializer,
     EventCreateSerializer,
+    EventFieldsetSerializer,
     EventReadSerializer,
+    EventTransitionSerializer,
+    NearbyEventsSerializer,
     OnSiteEventDirectionSerializer,
+    get_direction_destination,
 )
 from Event.settings import CLIENT_ID, CLIENT_SECRET
 
 
-class EventAPIViewSet(ModelViewSet):
+class EventAPIViewSet(ConditionalGetMixin, ModelViewSet):
     serializer_class = EventReadSerializer
     queryset = Event.objects.all()
     filterset_fields = ["event_status", "event_payment_type"]
+    pagination_class = EventKeysetPagination
 
     lookup_field = "event_uuid"
 
     def list(self, request, *args, **kwargs):
         # serializer_class = self.get_serializer_class(*args, **kwargs)
+        fieldset = EventFieldsetSerializer(data=self.request.query_params)
+        fieldset.is_valid(raise_exception=True)
+        fields = fieldset.get_fields_selection()
+
         queryset = self.filter_queryset(self.get_queryset())
+        if fields is not None:
+            # Leave unused columns, the description above all, in the database.
+            queryset = queryset.only(*EventReadSerializer.get_columns(fields))
+        # A page has no Last-Modified: deleting one of its events, or an
+        # older one moving into it, changes the page but not the latest
+        # updated_at. Its ETag covers which events are on it.
+        if self.is_conditional_request():
+            # Page through the versions only, and load the events if they
+            # changed since the client's copy.
+            versions = self.paginate_queryset(
+                queryset.only("id", "event_start_date", "updated_at")
+            )
+            etag, _ = self.get_validators(
+                [(event.pk, event.updated_at) for event in versions],
+                self.paginator.has_next,
+                self.paginator.has_previous,
+                fields,
+            )
+            not_modified = self.get_not_modified_response(etag, None)
+            if not_modified is not None:
+                return not_modified
+
+            events = queryset.in_bulk([event.pk for event in versions])
+            page = [events[event.pk] for event in versions if event.pk in events]
+        else:
+            page = self.paginate_queryset(queryset)
+            etag, _ = self.get_validators(
+                [(event.pk, event.updated_at) for event in page],
+                self.paginator.has_next,
+                self.paginator.has_previous,
+                fields,
+            )
 
         # __import__("ipdb").set_trace()
         serializer = EventReadSerializer(
-            queryset, many=True, context={"request": self.request}
+            page, many=True, fields=fields, context={"request": self.request}
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        response = self.get_paginated_response(serializer.data)
+        return self.set_validator_headers(response, etag, None)
 
     def retrieve(self, request, *args, **kwargs):
+        if self.is_conditional_request():
+            version = (
+                Event.objects.filter(event_uuid=self.kwargs.get("event_uuid"))
+                .values_list("pk", "updated_at")
+                .first()
+            )
+            if version is None:
+                raise Http404
+            not_modified = self.get_not_modified_response(
+                *self.get_validators([version])
+            )
+            if not_modified is not None:
+                return not_modified
+
         event_obj = self.get_object()
 
         serializer = EventReadSerializer(
             instance=event_obj, context={"request": self.request}
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        return self.set_validator_headers(
+            response, *self.get_validators([(event_obj.pk, event_obj.updated_at)])
+        )
+
+    @action(methods=["post"], detail=False, url_path="bulk", url_name="bulk-create")
+    def bulk_create(self, request, **kwargs):
+        """Create a JSON list of events in one go, owned by the caller."""
+        serializer = EventBulkCreateSerializer(
+            data=self.request.data, many=True, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save(event_owner=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(
+        methods=["post"],
+        detail=False,
+        url_path=r"bulk/(?P<transition>publish|open|close|cancel)",
+        url_name="bulk-transition",
+    )
+    def bulk_transition(self, request, transition, **kwargs):
+        """Publish, open, close or cancel many of the caller's events at once.
+
+        The events are picked by ``event_uuids`` in the body, or else by the
+        listing filters in the query string.
+        """
+        serializer = EventTransitionSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        event_uuids = serializer.validated_data.get("event_uuids")
+
+        queryset = Event.objects.filter(event_owner=request.user)
+        if event_uuids:
+            queryset = queryset.filter(event_uuid__in=event_uuids)
+        elif any(name in request.query_params for name in self.filterset_fields):
+            queryset = self.filter_queryset(queryset)
+        else:
+            return Response(
+                {"error": "Pass event_uuids or filter the events to change"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        updated, skipped = Event.bulk_transition(queryset, transition)
+        if updated and transition in SYNC_TRANSITIONS:
+            request_sync_many(Event.objects.filter(event_uuid__in=updated))
+        data = {"updated": updated, "skipped": skipped}
+        if event_uuids:
+            data["not_found"] = sorted(
+                set(event_uuids) - set(updated) - set(skipped), key=str
+            )
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(
+        methods=["get"], detail=False, renderer_classes=[NDJSONRenderer, CSVRenderer]
+    )
+    def export(self, request, **kwargs):
+        """Stream every event matching the listing filters as NDJSON or CSV.
+
+        Pick the format with ``?format=ndjson|csv`` or the Accept header.
+        ``?fields=`` and ``?view=`` select the fields as on the listing.
+        Attendee emails are left out: owners export them one event at a time
+        with ``export_attendees``.
+        """
+        fieldset = EventFieldsetSerializer(data=self.request.query_params)
+        fieldset.is_valid(raise_exception=True)
+        fields = fieldset.get_fields_selection()
+        columns = [
+            field
+            for field in EventReadSerializer.Meta.fields
+            if (fields is None or field in fields) and field != "event_attendees"
+        ]
+
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .order_by(F("event_start_date").asc(nulls_last=True), "id")
+            .only(*EventReadSerializer.get_columns(columns))
+        )
+        serializer = EventReadSerializer(fields=columns, context={"request": request})
+        return self.get_export_response(
+            serializer.iter_representations(queryset, settings.EVENT_EXPORT_CHUNK_SIZE),
+            columns,
+            "events",
+        )
+
+    @action(
+        methods=["get"],
+        detail=True,
+        url_path="attendees/export",
+        url_name="export-attendees",
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+    )
+    def export_attendees(self, request, **kwargs):
+        """Stream the bookings of this event, for its owner only."""
+        event = self.get_object()
+        self.check_object_permissions(request, event)
+        bookings = (
+            event.bookings.order_by("id")
+            .values("attendee_email", "created_at")
+            .iterator(chunk_size=settings.EVENT_EXPORT_CHUNK_SIZE)
+        )
+        return self.get_export_response(
+            bookings,
+            ["attendee_email", "created_at"],
+            f"event-{event.event_uuid}-attendees",
+        )
+
+    def get_export_response(self, rows, columns, filename):
+        renderer = self.request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(rows, columns),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="{filename}.{renderer.format}"'
+        return response
+
+    @action(methods=["get"], detail=False)
+    def nearby(self, request, **kwargs):
+        """Onsite events nearest to ``latitude``/``longitude``, nearest first.
+
+        ``radius`` (km) limits the search to a circle, otherwise the ``limit``
+        nearest events are returned. The listing filters apply.
+        """
+        params = NearbyEventsSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            event_location_type=EventLocationType.ONSITE
+        )
+        events = nearby_events(
+            queryset,
+            params.validated_data["latitude"],
+            params.validated_data["longitude"],
+            radius_km=params.validated_data.get("radius"),
+            limit=params.validated_data["limit"],
+        )
+        serializer = EventReadSerializer(
+            events, many=True, context={"request": self.request}
+        )
+        results = [
+            dict(data, distance_km=round(event.distance_km, 3))
+            for event, data in zip(events, serializer.data)
+        ]
+        return Response({"results": results}, status=status.HTTP_200_OK)
 
     @action(methods=["post"], detail=True)
     def reserve(self, request, event_uuid):
@@ -68,7 +288,10 @@ class EventAPIViewSet(ModelViewSet):
             and event_obj.event_status == EventStatus.OPEN
         ):
 
-            serializer = self.get_serializer(instance=event_obj, data=self.request.data)
+            serializer = self.get_serializer(
+                data=self.request.data,
+                context={**self.get_serializer_context(), "event": event_obj},
+            )
             serializer.is_valid(raise_exception=True)
             serializer.save()
             add_to_calendar = self.request.build_absolute_uri(
@@ -94,7 +317,8 @@ class EventAPIViewSet(ModelViewSet):
     @action(methods=["get"], detail=True)
     def publish_event(self, request, event_uuid=None):
         event = self.get_object()
-        event.publish_event()
+        if event.publish_event():
+            request_sync(event)
         serializer = self.get_serializer(instance=event)
         response = Response(
             {
@@ -106,6 +330,24 @@ class EventAPIViewSet(ModelViewSet):
         response["location"] = event.get_absolute_url()
         return response
 
+    @action(
+        methods=["get", "post"],
+        detail=True,
+        url_path="calendar-sync",
+        url_name="calendar-sync",
+    )
+    def calendar_sync(self, request, **kwargs):
+        """Progress of copying the event to its attendees' Google Calendars.
+
+        POST queues a sync of every attendee who granted calendar access.
+        """
+        event = self.get_object()
+        self.check_object_permissions(request, event)
+        if request.method == "POST":
+            request_sync(event)
+            return Response(sync_progress(event), status=status.HTTP_202_ACCEPTED)
+        return Response(sync_progress(event))
+
     @action(methods=["get"], detail=True)
     def cancel_event(self, request, event_uuid=None):
         event = self.get_object()
@@ -120,7 +362,8 @@ class EventAPIViewSet(ModelViewSet):
     @action(methods=["get"], detail=True)
     def open_event(self, request, **kwargs):
         event = self.get_object()
-        event.open_event()
+        if event.open_event():
+            request_sync(event)
         serializer = self.get_serializer(instance=event)
         # TODO send Email
         return Response(
@@ -156,14 +399,58 @@ class EventAPIViewSet(ModelViewSet):
                 }
             )
 
+    @action(
+        methods=["post"],
+        detail=True,
+        url_path="directions/batch",
+        url_name="batch-directions",
+    )
+    def batch_directions(self, request, **kwargs):
+        """Stream directions from many origins to this event as NDJSON.
+
+        One line is written per origin, in the order routes resolve, carrying
+        the origin's ``index`` in the request.
+        """
+        event = self.get_object()
+        self.check_object_permissions(request, event)
+        if event.event_location_type != EventLocationType.ONSITE:
+            return Response(
+                data={"error": "Directions can only be batched for onsite events"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = self.get_serializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        origins = serializer.get_origins()
+        routes = iter_directions(
+            origins,
+            get_direction_destination(event),
+            mode=serializer.validated_data["mode"],
+        )
+
+        def stream():
+            for indices, direction, error in routes:
+                for index in indices:
+                    line = {"index": index, "origin": origins[index]}
+                    if error is not None:
+                        line.update(error.detail)
+                    elif direction is None:
+                        line["error"] = "The address specified is not a valid address"
+                    else:
+                        line["direction"] = direction
+                    yield json.dumps(line) + "\n"
+
+        return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+
     @action(detail=True, methods=["get", "post"])
     def add_to_calendar(self, request, **kwargs):
         if self.request.method == "GET":
             email = unquote(self.request.query_params.get("email"))
             event_uuid = self.kwargs.get("event_uuid")
-            event = Event.objects.get(event_uuid=event_uuid)
-
-            if email not in event.event_attendees:
+            booked = Booking.objects.filter(
+                event__event_uuid=event_uuid, attendee_email=email
+            ).exists()
+            if not booked:
                 return Response(
                     {"error": "You have not reserved a sit in this event"},
                     status=status.HTTP_400_BAD_REQUEST,
@@ -172,19 +459,27 @@ class EventAPIViewSet(ModelViewSet):
             grant_end_point = f"{self.request.build_absolute_uri(reverse('oauth-grant'))}?{urlencode({'email':email, 'event_uuid':event_uuid})}"
             return redirect(grant_end_point)
 
-        token = OuthTokenModel.objects.last()
-        creds = Credentials(
-            token=token.access_token,
-            refresh_token=token.refresh_token,
-            client_id=settings.CLIENT_ID,
-            client_secret=settings.CLIENT_SECRET,
-            token_uri=settings.TOKEN_ENDPOINT,
-            scopes=token.scopes.split(" "),
-            expiry=token.expires_in,
+        # The calendar written to is the signed in user's, never one named in
+        # the request, and only for an event they booked.
+        email = request.user.email if request.user.is_authenticated else ""
+        event_obj = self.get_object()
+        booked = (
+            email
+            and Booking.objects.filter(event=event_obj, attendee_email=email).exists()
         )
-        service = build("calendar", "v3", credentials=creds)
-        event = event_create_schema(event_uuid)
-        event = service.events().insert(calendarId="primary", body=event).execute()
+        if not booked:
+            return Response(
+                {"error": "Sign in with the email you reserved a sit with"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        creds = token_store.credentials(email)
+        if creds is None:
+            return Response(
+                {"error": "Grant access to your Google Calendar first"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        event = calendar_client(creds).insert_event(event_create_schema(event_obj))
+        record_synced(event_obj, email, event)
         print("Event created: %s" % event)
 
         return Response(
@@ -195,6 +490,13 @@ class EventAPIViewSet(ModelViewSet):
             status=200,
         )
 
+    def perform_update(self, serializer):
+        previous = [getattr(serializer.instance, name) for name in CALENDAR_FIELDS]
+        event = serializer.save()
+        if previous != [getattr(event, name) for name in CALENDAR_FIELDS]:
+            # Rescheduled or renamed: bring attendees' calendars up to date.
+            request_sync(event)
+
     def get_object(self):
         event_uuid = self.kwargs.get("event_uuid")
         try:
@@ -216,6 +518,10 @@ class EventAPIViewSet(ModelViewSet):
             serializer = OnSiteEventDirectionSerializer
             kwargs.setdefault("context", self.get_serializer_context())
             return serializer(*args, **kwargs)
+        elif self.action == "batch_directions":
+            serializer = BatchDirectionSerializer
+            kwargs.setdefault("context", self.get_serializer_context())
+            return serializer(*args, **kwargs)
 
         return super().get_serializer(*args, **kwargs)
 
@@ -227,8 +533,19 @@ class EventAPIViewSet(ModelViewSet):
         return context
 
     def get_permissions(self):
-        if self.action in ["create", "retrieve", "update", "partial-update", "list"]:
+        if self.action in [
+            "create",
+            "retrieve",
+            "update",
+            "partial-update",
+            "list",
+            "batch_directions",
+        ]:
             self.permission_classes = [IsOwnerorReadonly]
+        elif self.action in ["export_attendees", "calendar_sync"]:
+            self.permission_classes = [IsEventOwner]
+        elif self.action in ["bulk_create", "bulk_transition"]:
+            self.permission_classes = [permissions.IsAuthenticated]
         else:
             self.permission_classes = [permissions.AllowAny]
 
@@ -269,7 +586,10 @@ class OuthCallBackView(ViewSet):
             "Content-Type": "application/json",  # "application/x-www-form-urlencoded;charset=UTF-8",
         }
         # __import__("ipdb").set_trace()
-        response = requests.post(full_url, data=token_endpoint_params, headers=headers)
+        with timed("google_oauth"):
+            response = requests.post(
+                full_url, data=token_endpoint_params, headers=headers
+            )
 
         self.request.data.update({"token": response.json()})
         token_data = dict(response.json())
@@ -278,21 +598,16 @@ class OuthCallBackView(ViewSet):
         # __import__("ipdb").set_trace()
 
         # email = unquote(email)
-        token = OuthTokenModel.objects.create(
-            token_provider="Google", token_owner=email, **token_data
-        )
-        creds = Credentials(
-            token=token.access_token,
-            refresh_token=token.refresh_token,
-            client_id=settings.CLIENT_ID,
-            client_secret=settings.CLIENT_SECRET,
-            token_uri=settings.TOKEN_ENDPOINT,
-            scopes=token.scope.split(" "),
-        )
-        service = build("calendar", "v3", credentials=creds)
-        event = event_create_schema(event_uuid)
+        creds = token_store.credentials_for(token_store.save(email, token_data))
+        try:
+            event_obj = Event.objects.get(event_uuid=event_uuid)
+        except Event.DoesNotExist:
+            raise Http404
         # __import__("ipdb").set_trace()
-        event = service.events().insert(calendarId=email, body=event).execute()
+        event = calendar_client(creds).insert_event(
+            event_create_schema(event_obj), calendar_id=email
+        )
+        record_synced(event_obj, email, event)
         print("Event created: %s" % event)
 
         return Response(
@@ -361,6 +676,21 @@ class OuthCallBackView(ViewSet):
         return tuple(values)
 
 
+class GoogleAPICacheStatsView(APIView):
+    """Hit/miss counters of this worker's Google Maps caches."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, **kwargs):
+        return Response(
+            data={
+                "direction": direction_cache.stats(),
+                "geocode": geocode_cache.stats(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class Home_View(APIView):
     def get(self, request, **kwargs):
         endpoint = self.request.build_absolute_uri(reverse("api-root"))